@@ -1,15 +1,19 @@
 import os
 import logging
 import json
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 import uuid
 from flask_login import LoginManager, current_user, login_required
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Level of the root logger configured by create_app; records below it cost
+# one level check (see log_pipeline.py)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# Let the browser stream slides from /create-slide-deck/stream while the
+# request generates them, instead of queueing the deck for a worker
+STREAM_SLIDES = os.environ.get("STREAM_SLIDES", "0").lower() in ("1", "true", "yes")
 
 # Set up database
 class Base(DeclarativeBase):
@@ -18,7 +22,8 @@ class Base(DeclarativeBase):
 db = SQLAlchemy(model_class=Base)
 
 # Create Flask app
-app = Flask(__name__)
+# Static files are served by serve_static below (see assets.py)
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.environ.get("SESSION_SECRET", "default_dev_key")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
@@ -30,6 +35,21 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 db.init_app(app)
 
+# Fingerprinted asset URLs for templates
+import assets
+assets.init_app(app)
+
+# Per-request query counts, DB time and N+1 detection (see query_stats.py)
+import query_stats
+query_stats.init_app(app)
+
+# Pipeline stage histograms and counters on /metrics, and Server-Timing (see metrics.py)
+import metrics
+import job_queue
+metrics.init_app(app)
+metrics.register_gauge('job_queue_depth', "Slide decks waiting for or being processed by a worker",
+                       ('status',), job_queue.queue_depth)
+
 # Setup login manager
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -56,29 +76,253 @@ def compare():
 
 @app.route('/video-to-slides')
 def video_to_slides():
-    return render_template('video_to_slides.html')
+    return render_template('video_to_slides.html', stream_slides=STREAM_SLIDES)
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    from models import SavedComparison, SlideDeck
+    import dashboard as dashboard_lists
     
-    # Get user's saved comparisons
-    saved_comparisons = SavedComparison.query.filter_by(user_id=current_user.id).order_by(
-        SavedComparison.created_at.desc()).all()
-    
-    # Get user's slide decks
-    slide_decks = SlideDeck.query.filter_by(user_id=current_user.id).order_by(
-        SlideDeck.created_at.desc()).all()
+    # First page of each list; later pages come from /api/dashboard/<kind>
+    comparisons, comparisons_cursor = dashboard_lists.list_comparisons(current_user.id)
+    decks, decks_cursor = dashboard_lists.list_slide_decks(current_user.id)
     
     return render_template('dashboard.html', 
-                           saved_comparisons=saved_comparisons,
-                           slide_decks=slide_decks)
+                           comparisons=comparisons,
+                           comparisons_cursor=comparisons_cursor,
+                           decks=decks,
+                           decks_cursor=decks_cursor)
+
+@app.route('/api/dashboard/<kind>', methods=['GET'])
+@login_required
+def dashboard_page(kind):
+    """Next page of dashboard items after a cursor"""
+    import dashboard as dashboard_lists
+    
+    listings = {
+        'comparisons': (dashboard_lists.list_comparisons, dashboard_lists.comparison_summary),
+        'slide-decks': (dashboard_lists.list_slide_decks, dashboard_lists.deck_summary)
+    }
+    if kind not in listings:
+        return jsonify({'success': False, 'error': 'Unknown list'}), 404
+    list_items, summarize = listings[kind]
+    
+    try:
+        limit = int(request.args.get('limit', dashboard_lists.PAGE_SIZE))
+        items, next_cursor = list_items(current_user.id, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'items': [summarize(item) for item in items],
+        'next_cursor': next_cursor
+    })
+
+def _remember_blob(sha256):
+    """Let this session read a document it uploaded"""
+    import blob_store
+    
+    hashes = [known for known in session.get('blob_hashes', []) if known != sha256] + [sha256]
+    session['blob_hashes'] = hashes[-blob_store.MAX_SESSION_BLOBS:]
+
+def _remember_anonymous(key, item_id):
+    """Let this session poll an item it created without an account"""
+    import job_queue
+    
+    # The session is a signed cookie, so keep only the newest IDs
+    ids = session.get(key, []) + [item_id]
+    session[key] = ids[-job_queue.MAX_SESSION_ITEMS:]
+
+def _can_read_blob(sha256):
+    """Whether the current visitor uploaded a stored document or saved a comparison of it"""
+    from models import BlobUpload, SavedComparison
+    
+    if sha256 in session.get('blob_hashes', []):
+        return True
+    if not current_user.is_authenticated:
+        return False
+    if BlobUpload.query.filter_by(user_id=current_user.id, sha256=sha256).first():
+        return True
+    return SavedComparison.query.filter(
+        SavedComparison.user_id == current_user.id,
+        db.or_(SavedComparison.document_a_hash == sha256, SavedComparison.document_b_hash == sha256)
+    ).first() is not None
+
+def _request_documents(stack):
+    """
+    The two documents of a comparison request.
+    
+    Each comes either as an uploaded file or as the hash of a stored document
+    (see blob_store.py); stored documents are memory-mapped, not read.
+    
+    Returns:
+        tuple: (document A, document B, hash of A, hash of B); hashes are None for files
+    """
+    import blob_store
+    
+    documents = []
+    for side in ('documentA', 'documentB'):
+        sha256 = request.form.get(f'{side}Hash')
+        if sha256:
+            if not blob_store.is_valid_hash(sha256) or not _can_read_blob(sha256):
+                raise blob_store.BlobError("Document not found", 404)
+            documents.append((stack.enter_context(blob_store.mapped(sha256)), sha256))
+        else:
+            upload = request.files.get(side)
+            documents.append((upload.read() if upload else None, None))
+    (data_a, hash_a), (data_b, hash_b) = documents
+    return data_a, data_b, hash_a, hash_b
+
+@app.route('/api/compare', methods=['POST'])
+def compare_documents():
+    """Compare two documents (PDF, image or text), uploaded or stored"""
+    import contextlib
+    import blob_store
+    import comparison_engine
+    
+    try:
+        with contextlib.ExitStack() as stack:
+            data_a, data_b, hash_a, hash_b = _request_documents(stack)
+            if not data_a or not data_b:
+                return jsonify({'success': False, 'error': 'Two documents are required'}), 400
+            # Stored documents are read by the extraction workers from their files
+            paths = [blob_store.blob_path(sha256) if sha256 else None for sha256 in (hash_a, hash_b)]
+            results = comparison_engine.compare_documents(data_a, data_b, hash_a, hash_b, *paths)
+    except (blob_store.BlobError, comparison_engine.ComparisonError) as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    
+    return jsonify({'success': True, 'results': results})
+
+@app.route('/api/compare/images', methods=['POST'])
+def compare_images():
+    """Compare the pixels of two images, uploaded or stored"""
+    import contextlib
+    import blob_store
+    import image_diff
+    
+    try:
+        with contextlib.ExitStack() as stack:
+            data_a, data_b, hash_a, hash_b = _request_documents(stack)
+            if not data_a or not data_b:
+                return jsonify({'success': False, 'error': 'Two images are required'}), 400
+            diff, cached = image_diff.compare(data_a, data_b, hash_a, hash_b)
+    except (blob_store.BlobError, image_diff.ImageDiffError) as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    
+    return jsonify({'success': True, 'diff': diff, 'cached': cached})
+
+def _get_accessible_upload(upload_id):
+    """Return the upload if the current visitor started it, else None"""
+    from models import BlobUpload
+    
+    upload = BlobUpload.query.get(upload_id)
+    if not upload:
+        return None
+    if upload.user_id is None:
+        # Anonymous uploads are addressed by their random 128-bit ID alone
+        return upload
+    return upload if current_user.is_authenticated and upload.user_id == current_user.id else None
+
+@app.route('/api/blobs/uploads', methods=['POST'])
+def create_blob_upload():
+    """Start a chunked document upload"""
+    import blob_store
+    
+    data = request.json or {}
+    try:
+        upload = blob_store.create_upload(
+            data.get('size'),
+            data.get('filename'),
+            user_id=current_user.id if current_user.is_authenticated else None
+        )
+    except blob_store.BlobError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    
+    return jsonify({
+        'success': True,
+        'id': upload.id,
+        'offset': 0,
+        'chunkSize': blob_store.UPLOAD_CHUNK_SIZE
+    }), 201
+
+@app.route('/api/blobs/uploads/<upload_id>', methods=['GET'])
+def get_blob_upload(upload_id):
+    """Report how much of an upload arrived, so an interrupted upload can resume"""
+    upload = _get_accessible_upload(upload_id)
+    if not upload:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'id': upload.id,
+        'size': upload.size,
+        'offset': upload.received,
+        'status': upload.status,
+        'sha256': upload.sha256
+    })
+
+@app.route('/api/blobs/uploads/<upload_id>', methods=['PUT'])
+def put_blob_chunk(upload_id):
+    """Write a chunk at the offset given in the Upload-Offset header"""
+    import blob_store
+    
+    if not _get_accessible_upload(upload_id):
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'error': 'Upload-Offset header is required'}), 400
+    
+    try:
+        received = blob_store.write_chunk(upload_id, offset, request.stream, request.content_length)
+    except blob_store.BlobError as e:
+        body = {'success': False, 'error': str(e)}
+        if hasattr(e, 'offset'):
+            body['offset'] = e.offset
+        return jsonify(body), e.status
+    
+    return jsonify({'success': True, 'offset': received})
+
+@app.route('/api/blobs/uploads/<upload_id>/complete', methods=['POST'])
+def complete_blob_upload(upload_id):
+    """Store a fully uploaded document under its hash"""
+    import blob_store
+    
+    if not _get_accessible_upload(upload_id):
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    
+    try:
+        blob = blob_store.complete_upload(upload_id)
+    except blob_store.BlobError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    
+    _remember_blob(blob.sha256)
+    return jsonify({
+        'success': True,
+        'sha256': blob.sha256,
+        'size': blob.size,
+        'contentType': blob.content_type,
+        'url': blob_store.blob_url(blob.sha256)
+    })
+
+@app.route('/api/blobs/<sha256>', methods=['GET'])
+def get_blob(sha256):
+    """Serve a stored document, with range support"""
+    import blob_store
+    from models import DocumentBlob
+    
+    if not blob_store.is_valid_hash(sha256) or not _can_read_blob(sha256):
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+    blob = DocumentBlob.query.get(sha256)
+    if not blob:
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+    
+    return blob_store.send_blob(blob)
 
 @app.route('/save-comparison', methods=['POST'])
 @login_required
 def save_comparison():
-    from models import SavedComparison
+    from models import DocumentBlob, SavedComparison
     
     data = request.json
     if not data:
@@ -95,7 +339,29 @@ def save_comparison():
     comparison.document_b_type = data.get('documentBType', 'image')
     comparison.document_a_url = data.get('documentAUrl', '')
     comparison.document_b_url = data.get('documentBUrl', '')
-    comparison.results_json = json.dumps(data.get('results', {}))
+    
+    # Stored documents are referenced by hash (see blob_store.py)
+    import blob_store
+    for field, key in (('document_a', 'documentAHash'), ('document_b', 'documentBHash')):
+        sha256 = data.get(key)
+        if not sha256:
+            continue
+        if not blob_store.is_valid_hash(sha256) or not _can_read_blob(sha256) or not DocumentBlob.query.get(sha256):
+            return jsonify({'success': False, 'error': 'Document not found'}), 400
+        setattr(comparison, f'{field}_hash', sha256)
+        setattr(comparison, f'{field}_url', blob_store.blob_url(sha256))
+    
+    results = data.get('results', {})
+    if isinstance(results, dict) and isinstance(results.get('imageDiff'), dict):
+        # Only store a pixel comparison the server computed itself
+        import image_diff
+        hashes = results['imageDiff'].get('hashes') or {}
+        diff = image_diff.get_cached(hashes.get('a'), hashes.get('b'))
+        if diff is not None:
+            results['imageDiff'] = diff
+        else:
+            results.pop('imageDiff')
+    comparison.results_json = json.dumps(results)
     
     db.session.add(comparison)
     db.session.commit()
@@ -106,20 +372,17 @@ def save_comparison():
 def create_slide_deck():
     from models import SlideDeck
     
-    # Log the incoming request
-    logging.info("Processing video request")
-    
     # Get request data
     data = request.json
     if not data:
         logging.error("No data provided in request")
         return jsonify({'success': False, 'error': 'No data provided'}), 400
     
-    # Log the data received (omitting API key for security)
-    logging.info(f"Received data: {str({k: v for k, v in data.items() if k != 'apiKey'})}")
+    # Rendered, with apiKey redacted, only if DEBUG is on (see log_pipeline.py)
+    logging.debug("Received data: %s", data)
     
-    # Get API key (optional now)
-    api_key = data.get('apiKey')
+    # The API key is never persisted with a queued job; the transcript
+    # pipeline doesn't need one
     
     # Get video URL
     video_url = data.get('videoUrl', '')
@@ -127,32 +390,162 @@ def create_slide_deck():
         logging.error("Video URL is missing")
         return jsonify({'success': False, 'error': 'Video URL is required'}), 400
     else:
-        logging.info(f"Processing video URL: {video_url}")
-        
-    try:
-        # Process video directly without database using transcript API
-        import transcript_utils
-        logging.info("Calling transcript_utils.process_video_transcript")
+        logging.info("Processing video URL: %s", video_url,
+                     extra={'event': 'slide_deck.requested', 'fields': {'video_url': video_url}})
         
+    import job_queue
+    import presentation_cache
+    
+    deck = SlideDeck()
+    deck.user_id = current_user.id if current_user.is_authenticated else None
+    deck.title = data.get('videoTitle') or 'YouTube Video Presentation'
+    deck.video_url = video_url
+    db.session.add(deck)
+    
+    # Someone already generated this video with the current generator
+    presentation_data = presentation_cache.get_cached(video_url)
+    if presentation_data is not None:
+        deck.slides_json = json.dumps(presentation_data)
+        deck.video_title = presentation_data.get('title')
+        deck.status = 'completed'
+        db.session.commit()
+    else:
+        # Queue the deck for a background worker instead of holding this
+        # request open for the whole pytube and transcript round trip
+        job_queue.enqueue_slide_deck(deck)
+    
+    if not current_user.is_authenticated:
+        # Remember anonymous decks so this browser can poll for the result
+        _remember_anonymous('anonymous_deck_ids', deck.id)
+    
+    response = {
+        'success': True,
+        'saved': current_user.is_authenticated,
+        'id': deck.id,
+        'status': deck.status
+    }
+    if presentation_data is not None:
+        response['presentation'] = presentation_data
+        return jsonify(response)
+    return jsonify(response), 202
+
+@app.route('/create-slide-deck/stream', methods=['POST'])
+def create_slide_deck_stream():
+    """Stream a presentation as NDJSON events while it is being generated"""
+    import presentation_cache
+    import transcript_utils
+    
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'No data provided'}), 400
+    
+    video_url = data.get('videoUrl', '')
+    if not video_url:
+        return jsonify({'success': False, 'error': 'Video URL is required'}), 400
+    
+    deck_title = data.get('videoTitle') or 'YouTube Video Presentation'
+    logging.info("Streaming video URL: %s", video_url,
+                 extra={'event': 'slide_deck.streamed', 'fields': {'video_url': video_url}})
+    
+    def generate():
+        presentation = {'slides': []}
         try:
-            # Process with YouTube transcript (API key not required)
-            presentation_data = transcript_utils.process_video_transcript(video_url, api_key)
-            
-            # Return the result
-            return jsonify({
-                'success': True,
-                'saved': False,
-                'presentation': presentation_data
-            })
-            
-        except Exception as processing_error:
-            error_message = str(processing_error)
-            logging.error(f"Error processing video: {error_message}")
-            return jsonify({'success': False, 'error': f"Error processing video: {error_message}"}), 500
-            
-    except Exception as e:
-        logging.error(f"Unexpected error in create_slide_deck: {str(e)}")
-        return jsonify({'success': False, 'error': f"Unexpected error: {str(e)}"}), 500
+            # Concurrent streams of one video share a single generation (see presentation_cache.py)
+            for event in presentation_cache.iter_events(video_url):
+                transcript_utils.add_presentation_event(presentation, event)
+                if event['event'] == 'end' and current_user.is_authenticated:
+                    event = dict(event, id=_save_completed_deck(deck_title, video_url, presentation))
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            logging.error("Error streaming video: %s", e, extra={'fields': {'video_url': video_url}})
+            yield json.dumps({'event': 'error', 'error': f"Error processing video: {str(e)}"}) + '\n'
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _save_completed_deck(title, video_url, presentation):
+    """Save a presentation generated in the request to the current user's account"""
+    from models import SlideDeck
+    
+    deck = SlideDeck()
+    deck.user_id = current_user.id
+    deck.title = title
+    deck.video_url = video_url
+    deck.video_title = presentation.get('title')
+    deck.slides_json = json.dumps(presentation)
+    deck.status = 'completed'
+    db.session.add(deck)
+    db.session.commit()
+    return deck.id
+
+def _can_access_deck(deck):
+    """Check whether the current visitor owns a slide deck"""
+    if deck.user_id is None:
+        return (deck.id in session.get('anonymous_deck_ids', [])
+                or deck.batch_id in session.get('anonymous_batch_ids', []))
+    return current_user.is_authenticated and deck.user_id == current_user.id
+
+@app.route('/api/slide-deck/<int:deck_id>', methods=['GET'])
+def get_slide_deck(deck_id):
+    from models import SlideDeck
+    
+    deck = SlideDeck.query.get(deck_id)
+    if not deck or not _can_access_deck(deck):
+        return jsonify({'success': False, 'error': 'Slide deck not found'}), 404
+    
+    response = {
+        'success': True,
+        'id': deck.id,
+        'title': deck.title,
+        'status': deck.status
+    }
+    if deck.status == 'completed':
+        response['slides_json'] = deck.slides_json
+    elif deck.status == 'failed':
+        response['error'] = deck.error_message or 'Processing failed'
+    
+    return jsonify(response)
+
+@app.route('/api/slide-deck/<int:deck_id>/export/<fmt>', methods=['GET'])
+def export_slide_deck(deck_id, fmt):
+    """Download a stored slide deck as PowerPoint or PDF"""
+    import export_engine
+    from models import SlideDeck
+    
+    deck = SlideDeck.query.get(deck_id)
+    if not deck or not _can_access_deck(deck):
+        return jsonify({'success': False, 'error': 'Slide deck not found'}), 404
+    if deck.status != 'completed':
+        return jsonify({'success': False, 'error': 'Slide deck is not ready yet'}), 409
+    
+    presentation = json.loads(deck.slides_json)
+    try:
+        path, key = export_engine.get_artifact(presentation, fmt)
+    except export_engine.ExportError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    
+    if not deck.slides_url:
+        deck.slides_url = export_engine.deck_export_url(deck.id, fmt)
+        db.session.commit()
+    
+    return export_engine.send_artifact(path, key, fmt, presentation.get('title') or deck.title)
+
+@app.route('/api/export/<fmt>', methods=['POST'])
+def export_presentation(fmt):
+    """Download a presentation posted as JSON as PowerPoint or PDF"""
+    import export_engine
+    
+    presentation = request.get_json(silent=True)
+    if not presentation:
+        return jsonify({'success': False, 'error': 'No presentation provided'}), 400
+    
+    try:
+        path, key = export_engine.get_artifact(presentation, fmt)
+    except export_engine.ExportError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    
+    return export_engine.send_artifact(path, key, fmt, str(presentation.get('title') or 'presentation'))
 
 @app.route('/api/user/theme', methods=['POST'])
 @login_required
@@ -224,50 +617,190 @@ def retry_processing(deck_id):
     if deck.user_id != current_user.id:
         return jsonify({'success': False, 'error': 'Unauthorized'}), 403
     
-    deck.status = 'pending'
-    db.session.commit()
-    
     # Queue the processing task
-    process_video_to_slides(deck_id)
+    import job_queue
+    job_queue.enqueue_slide_deck(deck)
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'id': deck.id, 'status': deck.status})
 
-# Serve static files
-@app.route('/static/<path:path>')
-def serve_static(path):
-    return send_from_directory('static', path)
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    """Queue slide decks for a list of video URLs and/or a playlist"""
+    import batch_processor
+    
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'No data provided'}), 400
+    
+    video_urls = data.get('videoUrls') or []
+    playlist_url = data.get('playlistUrl') or None
+    if not isinstance(video_urls, list):
+        return jsonify({'success': False, 'error': 'videoUrls must be a list'}), 400
+    if not video_urls and not playlist_url:
+        return jsonify({'success': False, 'error': 'Video URLs or a playlist URL are required'}), 400
+    
+    try:
+        concurrency = int(data['concurrency']) if data.get('concurrency') else None
+        videos, invalid, duplicates = batch_processor.collect_videos(video_urls, playlist_url)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    batch = batch_processor.create_batch(
+        videos,
+        user_id=current_user.id if current_user.is_authenticated else None,
+        title=data.get('title'),
+        playlist_url=playlist_url,
+        concurrency=concurrency
+    )
+    
+    if not current_user.is_authenticated:
+        # Remember anonymous batches so this browser can follow their progress
+        _remember_anonymous('anonymous_batch_ids', batch.id)
+    
+    return jsonify({
+        'success': True,
+        'id': batch.id,
+        'concurrency': batch.concurrency,
+        'decks': [batch_processor.deck_summary(deck) for deck in batch.decks],
+        'invalid_urls': invalid,
+        'duplicates': duplicates,
+        'progress': batch_processor.get_progress(batch.id)
+    }), 202
 
-# Video processing functions
-def process_video_to_slides(deck_id, api_key=None):
-    """Process a video to create slides and save to database (for logged-in users)"""
-    from models import SlideDeck
-    import youtube_processor
+def _get_accessible_batch(batch_id):
+    """Return the batch if the current visitor owns it, else None"""
+    from models import SlideBatch
     
-    # Get the slide deck
-    deck = SlideDeck.query.get(deck_id)
-    if not deck:
-        logging.error(f"Slide deck not found: {deck_id}")
-        return
+    batch = SlideBatch.query.get(batch_id)
+    if not batch:
+        return None
+    if batch.user_id is None:
+        return batch if batch.id in session.get('anonymous_batch_ids', []) else None
+    return batch if current_user.is_authenticated and batch.user_id == current_user.id else None
+
+@app.route('/api/batch/<int:batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    import batch_processor
+    
+    batch = _get_accessible_batch(batch_id)
+    if not batch:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'id': batch.id,
+        'title': batch.title,
+        'concurrency': batch.concurrency,
+        'progress': batch_processor.get_progress(batch.id),
+        'decks': [batch_processor.deck_summary(deck) for deck in batch.decks]
+    })
+
+@app.route('/api/batch/<int:batch_id>/stream', methods=['GET'])
+def stream_batch(batch_id):
+    """Stream a batch's results as NDJSON events as its decks finish, resuming from ?cursor="""
+    import batch_processor
+    
+    batch = _get_accessible_batch(batch_id)
+    if not batch:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
     
     try:
-        deck.status = 'processing'
-        db.session.commit()
-        
-        # Process the video with our YouTube processor - no API key needed!
-        presentation_data = youtube_processor.process_video(deck.video_url, api_key)
-        
-        # Update the slide deck
-        deck.slides_json = json.dumps(presentation_data)
-        deck.status = 'completed'
-        db.session.commit()
-        
-        return True
-    except Exception as e:
-        logging.error(f"Error processing video: {str(e)}")
-        deck.status = 'failed'
-        db.session.commit()
-        return False
+        reported = batch_processor.decode_stream_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    def generate():
+        try:
+            for event in batch_processor.iter_batch_events(batch_id, reported):
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            logging.error("Error streaming batch %s: %s", batch_id, e)
+            yield json.dumps({'event': 'error', 'error': f"Error streaming batch: {str(e)}"}) + '\n'
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
+@app.route('/api/batch/<int:batch_id>/retry', methods=['POST'])
+def retry_batch(batch_id):
+    """Queue the failed decks of a batch again"""
+    import batch_processor
+    
+    batch = _get_accessible_batch(batch_id)
+    if not batch:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    
+    retried = batch_processor.retry_failed(batch)
+    
+    return jsonify({
+        'success': True,
+        'id': batch.id,
+        'retried': retried,
+        'progress': batch_processor.get_progress(batch.id)
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    import blob_store
+    import llm_cache
+    import openai_clients
+    import video_metadata
+    
+    return jsonify({
+        'success': True,
+        'video_metadata': video_metadata.get_cache_stats(),
+        'openai_clients': openai_clients.get_stats(),
+        'llm_responses': llm_cache.get_savings_report(),
+        'document_blobs': blob_store.get_stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Metrics of every process on this host in the Prometheus text format"""
+    if not metrics.access_allowed(request):
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/debug/query-stats', methods=['GET', 'POST'])
+def debug_query_stats():
+    """Recent per-request query stats; POST {"enabled": bool} toggles recording"""
+    if not query_stats.debug_access_allowed(request, app):
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    
+    if request.method == 'POST':
+        data = request.json or {}
+        if 'enabled' not in data:
+            return jsonify({'success': False, 'error': 'enabled is required'}), 400
+        query_stats.set_enabled(data['enabled'])
+    
+    return jsonify({
+        'success': True,
+        'enabled': query_stats.is_enabled(),
+        'requests': query_stats.get_recent()
+    })
+
+@app.route('/api/image', methods=['GET'])
+def proxy_image():
+    """Serve a slide image from the local image cache"""
+    import image_proxy
+    
+    url = request.args.get('url', '')
+    width = request.args.get('w', type=int)
+    try:
+        return image_proxy.send_image(url, width)
+    except image_proxy.ImageProxyError as e:
+        logging.warning("Image proxy error for %s: %s", url, e,
+                        extra={'event': 'image_proxy.failed', 'fields': {'url': url, 'status': e.status}})
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+# Serve static files
+@app.route('/static/<path:path>')
+def serve_static(path):
+    # Built files get immutable caching and precompressed variants
+    return assets.send_asset(path)
+
+# Video processing functions
 def process_video_directly(video_url, api_key):
     """Process a video directly without saving to database (for non-logged-in users)"""
     import youtube_processor
@@ -280,7 +813,7 @@ def process_video_directly(video_url, api_key):
             'presentation': presentation_data
         }
     except Exception as e:
-        logging.error(f"Error processing video directly: {str(e)}")
+        logging.error("Error processing video directly: %s", e)
         return {
             'success': False,
             'error': str(e)
@@ -288,4 +821,42 @@ def process_video_directly(video_url, api_key):
 
 # Import routes
 from replit_auth import make_replit_blueprint
-app.register_blueprint(make_replit_blueprint(), url_prefix="/auth")
\ No newline at end of file
+app.register_blueprint(make_replit_blueprint(), url_prefix="/auth")
+
+_app_created = False
+
+def _dispose_inherited_connections():
+    """Drop database connections a forked process inherited from its parent"""
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False leaves the parent's connections open for the parent
+            engine.dispose(close=False)
+
+def create_app():
+    """
+    Finish setting up the application for serving and return it.
+    
+    Importing this module defines the app and its routes without touching
+    process-wide state; entry points (main.py, wsgi.py, worker.py) call this
+    to route logging through the background writer in log_pipeline.py, make
+    the app safe to fork after loading, as gunicorn --preload does, and
+    export how long startup took. Libraries
+    only some requests need are imported on first use (see startup.py).
+    Safe to call more than once.
+    
+    Returns:
+        Flask: The application
+    """
+    global _app_created
+    if _app_created:
+        return app
+    _app_created = True
+    
+    import log_pipeline
+    log_pipeline.configure(LOG_LEVEL.upper())
+    os.register_at_fork(after_in_child=_dispose_inherited_connections)
+    
+    import startup
+    metrics.register_gauge('app_startup_seconds', "Seconds this process spent starting the app, by step",
+                           ('step',), startup.step_seconds)
+    return app
\ No newline at end of file
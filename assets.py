@@ -0,0 +1,161 @@
+"""
+Fingerprinted static assets.
+
+build_assets.py copies the files under static/ into static/dist/ with a
+content hash in their names, writes gzip and brotli variants next to them and
+records everything in static/dist/manifest.json. Templates resolve asset URLs
+through asset_url(), which returns the fingerprinted URL when the asset has
+been built and the plain /static/ URL otherwise, so development works
+without a build.
+
+Large images also get resized variants; asset_url(name, width) picks one
+and asset_srcset(name) lists them for a srcset attribute.
+
+Fingerprinted files never change, so they are served with a year-long
+immutable Cache-Control, a strong ETag, and the smallest precompressed
+variant the client accepts.
+"""
+import os
+import json
+import logging
+import mimetypes
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Cache-Control for fingerprinted files
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Cache-Control for files served under their source names
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Content-Encoding, file suffix and ETag suffix, in order of preference
+ENCODINGS = (('br', '.br', '-br'), ('gzip', '.gz', '-gz'))
+
+_manifest = None
+_by_path = None
+
+
+def load_manifest(reload=False):
+    """Read the build manifest, or an empty one if assets haven't been built."""
+    global _manifest, _by_path
+    if _manifest is None or reload:
+        try:
+            with open(MANIFEST_PATH) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {'files': {}}
+        except (OSError, ValueError) as e:
+            logging.error("Error reading asset manifest: %s", e)
+            manifest = {'files': {}}
+        # Index every built file, including resized image variants, by its path
+        by_path = {}
+        for entry in manifest['files'].values():
+            by_path[entry['path']] = (entry['hash'], entry.get('encodings', []))
+            for variant in entry.get('variants', []):
+                by_path[variant['path']] = (variant['hash'], [])
+        _by_path = by_path
+        _manifest = manifest
+    return _manifest
+
+
+def _variants(entry, format):
+    if format is None:
+        # The format of the source image
+        format = os.path.splitext(entry['path'])[1].lower().lstrip('.').replace('jpg', 'jpeg')
+    return [variant for variant in entry.get('variants', ()) if variant['format'] == format]
+
+
+def asset_url(filename, width=None, format=None):
+    """
+    URL of a static file, fingerprinted if it has been built.
+
+    Args:
+        filename (str): Path relative to static/, e.g. 'js/main.js'
+        width (int, optional): For resized images, the largest variant no
+            wider than this
+        format (str, optional): Format of that variant, 'webp' or the
+            image's own format (the default)
+
+    Returns:
+        str: URL for the file
+    """
+    entry = load_manifest()['files'].get(filename)
+    if entry is None:
+        return f"/static/{filename}"
+
+    path = entry['path']
+    if width is not None:
+        fitting = [variant for variant in _variants(entry, format) if variant['width'] <= width]
+        if fitting:
+            path = max(fitting, key=lambda variant: variant['width'])['path']
+    return f"/static/dist/{path}"
+
+
+def asset_srcset(filename, format=None):
+    """
+    srcset attribute value listing the resized variants of an image in one format.
+
+    Args:
+        filename (str): Path relative to static/
+        format (str, optional): 'webp' or the image's own format (the default)
+
+    Returns:
+        str: The srcset, or '' if the image has no resized variants
+    """
+    entry = load_manifest()['files'].get(filename)
+    if not entry:
+        return ''
+    return ', '.join(f"/static/dist/{variant['path']} {variant['width']}w" for variant in _variants(entry, format))
+
+
+def send_asset(path):
+    """
+    Serve a file from static/, using the build's caching for fingerprinted files.
+
+    Must be called inside a request.
+    """
+    from flask import Response, abort, request, send_file, send_from_directory
+    from werkzeug.security import safe_join
+
+    if not path.startswith('dist/'):
+        response = send_from_directory(STATIC_DIR, path)
+        response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+        return response
+
+    built_path = path[len('dist/'):]
+    load_manifest()
+    built = _by_path.get(built_path)
+    full_path = safe_join(DIST_DIR, built_path)
+    if built is None or full_path is None or not os.path.isfile(full_path):
+        abort(404)
+    digest, encodings = built
+
+    content_encoding = None
+    etag = digest
+    for name, suffix, etag_suffix in ENCODINGS:
+        if name in encodings and request.accept_encodings.quality(name) > 0:
+            content_encoding = name
+            full_path += suffix
+            etag += etag_suffix
+            break
+
+    headers = {
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL,
+        'ETag': f'"{etag}"',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    mimetype = mimetypes.guess_type(built_path)[0] or 'application/octet-stream'
+    response = send_file(full_path, mimetype=mimetype, conditional=False, etag=False)
+    response.headers.update(headers)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    return response
+
+
+def init_app(app):
+    """Make asset_url and asset_srcset available to templates."""
+    app.jinja_env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
@@ -0,0 +1,276 @@
+"""
+Batch submission of slide decks.
+
+A batch is a list of YouTube URLs, or a playlist expanded through pytube, that
+is turned into one SlideDeck per distinct video. The decks go through the
+normal job queue (see job_queue.py), which never processes more of a batch's
+decks at once than the batch's concurrency limit. Progress is read back from
+the decks themselves, so it is the same whichever worker processed them.
+"""
+import os
+import json
+import logging
+import time
+
+from video_metadata import extract_video_id
+
+# Maximum number of distinct videos accepted in one batch
+MAX_BATCH_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "200"))
+# Decks of one batch processed at once when the request doesn't say
+DEFAULT_CONCURRENCY = int(os.environ.get("BATCH_DEFAULT_CONCURRENCY", "4"))
+# Upper bound on the concurrency a request may ask for
+MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "16"))
+# Seconds between database polls while streaming batch results
+STREAM_POLL_INTERVAL = float(os.environ.get("BATCH_STREAM_POLL_INTERVAL", "1.0"))
+# Seconds a batch stream stays open before it ends with a cursor to resume from
+STREAM_WINDOW = float(os.environ.get("BATCH_STREAM_WINDOW", "55"))
+
+FINISHED_STATUSES = ('completed', 'failed')
+# Finished status -> the letter a stream cursor records it as
+_CURSOR_STATUSES = {'completed': 'c', 'failed': 'f'}
+
+
+class BatchError(ValueError):
+    """Raised when a batch request can't be accepted."""
+
+
+def expand_playlist(playlist_url):
+    """
+    List the video URLs of a YouTube playlist.
+
+    Args:
+        playlist_url (str): URL of the playlist
+
+    Returns:
+        list: Watch URLs of the playlist's videos, in playlist order
+    """
+    try:
+        from pytube import Playlist
+    except ImportError:
+        raise BatchError("Playlist support requires pytube")
+
+    try:
+        return list(Playlist(playlist_url).video_urls)
+    except Exception as e:
+        logging.error("Error expanding playlist %s: %s", playlist_url, e)
+        raise BatchError(f"Could not read playlist: {str(e)}")
+
+
+def collect_videos(video_urls=None, playlist_url=None):
+    """
+    Build the de-duplicated list of videos for a batch.
+
+    Args:
+        video_urls (list, optional): YouTube video URLs
+        playlist_url (str, optional): Playlist whose videos are appended
+
+    Returns:
+        tuple: (list of (video_id, url) in submission order, list of invalid URLs,
+        number of duplicates dropped)
+    """
+    urls = list(video_urls or [])
+    if playlist_url:
+        urls.extend(expand_playlist(playlist_url))
+
+    videos = []
+    invalid = []
+    seen = set()
+    duplicates = 0
+    for url in urls:
+        video_id = extract_video_id(url) if isinstance(url, str) else None
+        if not video_id:
+            invalid.append(url)
+        elif video_id in seen:
+            duplicates += 1
+        else:
+            seen.add(video_id)
+            videos.append((video_id, url))
+
+    if not videos:
+        raise BatchError("No valid YouTube video URLs provided")
+    if len(videos) > MAX_BATCH_SIZE:
+        raise BatchError(f"A batch may contain at most {MAX_BATCH_SIZE} videos")
+    return videos, invalid, duplicates
+
+
+def create_batch(videos, user_id=None, title=None, playlist_url=None, concurrency=None):
+    """
+    Create a batch and queue a slide deck for each of its videos.
+
+    Videos whose presentation is already cached are completed immediately.
+
+    Args:
+        videos (list): (video_id, url) pairs from collect_videos
+        user_id (str, optional): Owner of the batch and its decks
+        title (str, optional): Batch title
+        playlist_url (str, optional): Playlist the videos came from
+        concurrency (int, optional): Decks of this batch processed at once
+
+    Returns:
+        SlideBatch: The new batch
+    """
+    from app import db
+    from models import SlideBatch, SlideDeck
+    import job_queue
+    import presentation_cache
+
+    batch = SlideBatch()
+    batch.user_id = user_id
+    batch.title = title or 'YouTube Video Batch'
+    batch.playlist_url = playlist_url
+    batch.concurrency = min(max(int(concurrency or DEFAULT_CONCURRENCY), 1), MAX_CONCURRENCY)
+    db.session.add(batch)
+
+    queued = []
+    for video_id, url in videos:
+        deck = SlideDeck()
+        deck.user_id = user_id
+        deck.title = 'YouTube Video Presentation'
+        deck.video_url = url
+        deck.batch = batch
+        db.session.add(deck)
+
+        presentation_data = presentation_cache.get_cached(url)
+        if presentation_data is not None:
+            deck.slides_json = json.dumps(presentation_data)
+            deck.video_title = presentation_data.get('title')
+            deck.status = 'completed'
+        else:
+            queued.append(deck)
+
+    # Commits the batch, its cached decks and the queued ones together
+    job_queue.enqueue_slide_decks(queued)
+    logging.info("Created batch %s with %d videos, %d queued", batch.id, len(videos), len(queued))
+    return batch
+
+
+def deck_summary(deck, include_slides=False):
+    """Describe one deck of a batch for API responses."""
+    summary = {
+        'id': deck.id,
+        'video_id': extract_video_id(deck.video_url),
+        'video_url': deck.video_url,
+        'title': deck.video_title or deck.title,
+        'status': deck.status
+    }
+    if deck.status == 'failed':
+        summary['error'] = deck.error_message or 'Processing failed'
+    elif deck.status == 'completed' and include_slides:
+        summary['presentation'] = json.loads(deck.slides_json) if deck.slides_json else None
+    return summary
+
+
+def get_progress(batch_id):
+    """
+    Count a batch's decks by status.
+
+    Returns:
+        dict: total, pending, processing, completed, failed and done (bool)
+    """
+    from app import db
+    from models import SlideDeck
+    from sqlalchemy import func
+
+    counts = dict(db.session.query(SlideDeck.status, func.count(SlideDeck.id))
+                  .filter(SlideDeck.batch_id == batch_id)
+                  .group_by(SlideDeck.status)
+                  .all())
+    progress = {status: counts.get(status, 0) for status in ('pending', 'processing', 'completed', 'failed')}
+    progress['total'] = sum(counts.values())
+    progress['done'] = progress['pending'] == 0 and progress['processing'] == 0
+    return progress
+
+
+def retry_failed(batch):
+    """
+    Queue the failed decks of a batch again, leaving completed ones alone.
+
+    Returns:
+        list: IDs of the re-queued decks
+    """
+    import job_queue
+
+    failed = [deck for deck in batch.decks if deck.status == 'failed']
+    if not failed:
+        return []
+    return job_queue.enqueue_slide_decks(failed)
+
+
+def encode_stream_cursor(reported):
+    """Encode the decks a stream has reported, {deck id: status}, as a cursor."""
+    return ','.join(f"{_CURSOR_STATUSES[status]}{deck_id}" for deck_id, status in reported.items())
+
+
+def decode_stream_cursor(cursor):
+    """
+    Decode a cursor from encode_stream_cursor.
+
+    Returns:
+        dict: {deck id: status} of the decks already reported; empty if
+        cursor is empty
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    statuses = {letter: status for status, letter in _CURSOR_STATUSES.items()}
+    reported = {}
+    for item in cursor.split(',') if cursor else ():
+        if item[:1] not in statuses or not item[1:].isdigit():
+            raise ValueError(f"Invalid cursor item: {item!r}")
+        reported[int(item[1:])] = statuses[item[0]]
+    return reported
+
+
+def iter_batch_events(batch_id, reported=None, poll_interval=STREAM_POLL_INTERVAL, window=STREAM_WINDOW):
+    """
+    Yield batch events as its decks finish, for at most window seconds.
+
+    Decks that already finished are reported first, except those in
+    reported. Events are dicts with an 'event' key: 'deck' for each finished
+    deck (completed ones include their presentation), 'progress' after each
+    poll that found new results, and a final 'end' once none are left to
+    process. If decks are still being processed when the window runs out,
+    the final event is 'resume' instead, with the progress so far and a
+    cursor; a stream opened with that cursor carries on without repeating
+    the decks already reported. Streams are bounded so they don't hold a web
+    server thread while a large batch is processed.
+
+    Args:
+        batch_id (int): The batch to stream
+        reported (dict, optional): {deck id: status} from decode_stream_cursor
+        poll_interval (float): Seconds between database polls
+        window (float): Seconds before the stream ends with a 'resume' event
+    """
+    from app import db
+    from models import SlideDeck
+
+    reported = dict(reported or {})
+    deadline = time.monotonic() + window
+    while True:
+        finished = (db.session.query(SlideDeck.id, SlideDeck.status)
+                    .filter(SlideDeck.batch_id == batch_id,
+                            SlideDeck.status.in_(FINISHED_STATUSES))
+                    .order_by(SlideDeck.updated_at, SlideDeck.id)
+                    .all())
+        # A deck is reported again if it was retried and finished differently
+        new_ids = [deck_id for deck_id, status in finished if reported.get(deck_id) != status]
+        new_decks = []
+        if new_ids:
+            new_decks = SlideDeck.query.filter(SlideDeck.id.in_(new_ids)).order_by(SlideDeck.updated_at, SlideDeck.id).all()
+        for deck in new_decks:
+            reported[deck.id] = deck.status
+            yield {'event': 'deck', 'deck': deck_summary(deck, include_slides=True)}
+
+        progress = get_progress(batch_id)
+        # Release the snapshot so the next poll sees the workers' commits
+        db.session.rollback()
+        if new_decks or progress['done']:
+            yield {'event': 'progress', 'progress': progress}
+        if progress['done']:
+            yield {'event': 'end', 'batch_id': batch_id}
+            return
+        if time.monotonic() + poll_interval > deadline:
+            yield {'event': 'resume', 'batch_id': batch_id, 'progress': progress,
+                   'cursor': encode_stream_cursor(reported)}
+            return
+        time.sleep(poll_interval)
@@ -0,0 +1,147 @@
+"""
+Offline video fixtures for the pipeline benchmarks.
+
+Usage:
+    python benchmarks/fixtures.py list
+    python benchmarks/fixtures.py record NAME VIDEO_URL
+
+Each fixture is a video's pytube metadata and its transcript entries, in the
+shapes pytube.YouTube and YouTubeTranscriptApi.get_transcript return. A
+fixture recorded from a real video is read from fixtures/<name>.json; until
+one is recorded, a synthetic fixture of the same length is generated from a
+fixed seed, so runs on any machine measure identical input.
+
+The three standard fixtures cover a short talk, a one-hour lecture and a
+five-hour stream.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# name -> (video ID, length in minutes)
+VIDEOS = {
+    'short': ('bnchShort01', 5),
+    'hour': ('bnchHour001', 60),
+    'five_hours': ('bnchFiveHr1', 300),
+}
+
+WORDS = ("so today we are going to talk about how the system handles requests under load "
+         "and what happens when the cache is cold versus warm then we look at the database "
+         "queries the queue workers and the latency of each upstream call in production").split()
+
+
+def synthesize(name):
+    """Build the synthetic stand-in for one of VIDEOS."""
+    video_id, minutes = VIDEOS[name]
+    return synthesize_video(video_id, minutes, seed=f"{name}:{video_id}",
+                            title=f"Benchmark video: {name.replace('_', ' ')}")
+
+
+def synthesize_video(video_id, minutes, seed=None, title=None):
+    """Build a fixture with roughly the words per minute and caption cadence of real speech."""
+    rng = random.Random(seed or video_id)
+
+    transcript = []
+    start = 0.0
+    while start < minutes * 60:
+        # Auto-generated captions: a few seconds and 5-12 words per entry
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 12)))
+        if rng.random() < 0.35:
+            text += '.'
+        duration = round(rng.uniform(2.0, 4.5), 2)
+        transcript.append({'text': text, 'start': round(start, 2), 'duration': duration})
+        start += duration
+
+    # Longer videos come with longer descriptions, usually a chapter list
+    chapters = [f"{index * minutes // 10:02d}:00 " + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 8)))
+                for index in range(10)]
+    paragraphs = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) + '.'
+                  for _ in range(2 + minutes // 60)]
+    metadata = {
+        'title': title or f"Video {video_id}",
+        'author': "Benchmark Channel",
+        'description': '\n\n'.join(paragraphs + ['\n'.join(chapters)]),
+        'length_seconds': minutes * 60,
+        'views': rng.randint(1000, 1000000),
+        'thumbnail_url': f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg"
+    }
+    return {'video_id': video_id, 'metadata': metadata, 'transcript': transcript}
+
+
+def load(name):
+    """Return the recorded fixture for name, or its synthetic stand-in."""
+    path = os.path.join(FIXTURE_DIR, f"{name}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return synthesize(name)
+
+
+def load_all(names=None):
+    return {name: load(name) for name in (names or VIDEOS)}
+
+
+def record(name, video_url):
+    """Fetch a real video's metadata and transcript into fixtures/<name>.json. Needs network access."""
+    from pytube import YouTube
+    from youtube_transcript_api import YouTubeTranscriptApi
+    from video_metadata import extract_video_id
+
+    video_id = extract_video_id(video_url)
+    if not video_id:
+        raise SystemExit(f"Not a YouTube URL: {video_url}")
+
+    yt = YouTube(f"https://www.youtube.com/watch?v={video_id}")
+    fixture = {
+        'video_id': video_id,
+        'metadata': {
+            'title': yt.title,
+            'author': yt.author,
+            'description': yt.description,
+            'length_seconds': yt.length,
+            'views': yt.views,
+            'thumbnail_url': yt.thumbnail_url
+        },
+        'transcript': [
+            {'text': entry['text'], 'start': entry.get('start', 0.0), 'duration': entry.get('duration', 0.0)}
+            for entry in YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
+        ]
+    }
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with open(os.path.join(FIXTURE_DIR, f"{name}.json"), 'w') as f:
+        json.dump(fixture, f)
+    return fixture
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage benchmark video fixtures")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('list', help="describe the fixtures")
+    record_parser = subcommands.add_parser('record', help="record a real video as a fixture")
+    record_parser.add_argument('name', help="fixture name, e.g. one of " + ', '.join(VIDEOS))
+    record_parser.add_argument('video_url')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        fixture = record(args.name, args.video_url)
+        print(f"recorded {args.name}: {len(fixture['transcript'])} transcript entries")
+        return
+
+    for name in VIDEOS:
+        fixture = load(name)
+        recorded = os.path.exists(os.path.join(FIXTURE_DIR, f"{name}.json"))
+        text_bytes = sum(len(entry['text']) + 1 for entry in fixture['transcript'])
+        print(f"{name:>11} {'recorded' if recorded else 'synthetic':>9} "
+              f"{len(fixture['transcript']):>6} entries {text_bytes / 1024:>8.1f} KB "
+              f"{fixture['metadata']['length_seconds'] // 60:>4} min")
+
+
+if __name__ == '__main__':
+    main()
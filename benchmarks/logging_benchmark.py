@@ -0,0 +1,162 @@
+"""
+Benchmark how long request threads spend logging.
+
+Usage:
+    python benchmarks/logging_benchmark.py [--requests 5000] [--threads 8]
+        [--sink-delay-ms 0.2] [--output PATH]
+
+Each scenario runs in a fresh interpreter: --threads threads each handle
+--requests requests, logging what /create-slide-deck logs, and the time
+spent in the logging calls of each request is measured on the request
+thread. Records go to a handler that writes JSON to /dev/null after
+sleeping --sink-delay-ms, standing in for a stderr that a container log
+driver or a full pipe slows down.
+
+    eager-sync   f-strings, written on the request thread, root at DEBUG
+                 (the logging before log_pipeline.py)
+    lazy-sync    %-style arguments through log_pipeline with LOG_QUEUE=0
+    lazy-queue   %-style arguments through log_pipeline's queue (the default)
+
+The report shows the median, p99 and mean logging time per request, the
+records written and discarded, and how much lazy-queue saves. Results are
+written as JSON to --output. For the effect on whole requests, run the load
+test (see loadtest/) once with LOG_QUEUE=0 and once without.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.join(REPO_DIR, 'benchmarks')
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results', 'logging.json')
+
+SCENARIOS = ('eager-sync', 'lazy-sync', 'lazy-queue')
+
+RUN_SCRIPT = """
+import json, logging, sys, threading, time
+scenario, requests_per_thread, threads, delay = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4])
+import log_pipeline
+
+written = []
+
+class SlowSink(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.stream = open('/dev/null', 'w')
+
+    def emit(self, record):
+        time.sleep(delay)
+        self.stream.write(self.format(record) + '\\n')
+        written.append(1)
+
+sink = SlowSink()
+sink.setFormatter(log_pipeline.JsonFormatter())
+data = {'videoUrl': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'videoTitle': 'A video', 'apiKey': 'sk-' + 'x' * 40}
+video_url = data['videoUrl']
+
+if scenario == 'eager-sync':
+    logging.getLogger().setLevel(logging.DEBUG)
+    logging.getLogger().addHandler(sink)
+
+    def handle():
+        logging.info("Processing video request")
+        logging.info(f"Received data: {str({k: v for k, v in data.items() if k != 'apiKey'})}")
+        logging.info(f"Processing video URL: {video_url}")
+else:
+    log_pipeline.configure(logging.INFO, [sink])
+
+    def handle():
+        logging.debug("Received data: %s", data)
+        logging.info("Processing video URL: %s", video_url,
+                     extra={'event': 'slide_deck.requested', 'fields': {'video_url': video_url}})
+
+durations = []
+
+def run():
+    times = []
+    for _ in range(requests_per_thread):
+        started = time.perf_counter()
+        handle()
+        times.append(time.perf_counter() - started)
+    durations.extend(times)
+
+workers = [threading.Thread(target=run) for _ in range(threads)]
+started = time.perf_counter()
+for worker in workers:
+    worker.start()
+for worker in workers:
+    worker.join()
+elapsed = time.perf_counter() - started
+log_pipeline.shutdown()
+print(json.dumps({'durations': durations, 'elapsed': elapsed, 'written': len(written),
+                  'discarded': sum(log_pipeline.LOG_RECORDS_DISCARDED.values.values())}))
+"""
+
+
+def run_scenario(scenario, requests, threads, sink_delay_ms):
+    env = dict(os.environ, LOG_QUEUE='0' if scenario == 'lazy-sync' else '1')
+    command = [sys.executable, '-c', RUN_SCRIPT, scenario, str(requests), str(threads), str(sink_delay_ms / 1000)]
+    result = subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, text=True, timeout=600)
+    if result.returncode != 0:
+        raise SystemExit(f"Scenario {scenario} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(run):
+    durations = sorted(run['durations'])
+    return {
+        'requests': len(durations),
+        'p50_us': round(statistics.median(durations) * 1e6, 1),
+        'p99_us': round(durations[int(len(durations) * 0.99) - 1] * 1e6, 1),
+        'mean_us': round(statistics.fmean(durations) * 1e6, 1),
+        'elapsed_s': round(run['elapsed'], 3),
+        'records_written': run['written'],
+        'records_discarded': run['discarded']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000, help="requests per thread")
+    parser.add_argument("--threads", type=int, default=8, help="request threads")
+    parser.add_argument("--sink-delay-ms", type=float, default=0.2, help="time the sink takes to write a record")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the results")
+    args = parser.parse_args()
+
+    results = {}
+    for scenario in SCENARIOS:
+        results[scenario] = summarize(run_scenario(scenario, args.requests, args.threads, args.sink_delay_ms))
+
+    print(f"logging time per request, {args.threads} threads, sink {args.sink_delay_ms}ms per record:")
+    print(f"  {'scenario':<12} {'p50':>10} {'p99':>10} {'mean':>10} {'written':>9} {'discarded':>10}")
+    for scenario, result in results.items():
+        print(f"  {scenario:<12} {result['p50_us']:>8.1f}us {result['p99_us']:>8.1f}us {result['mean_us']:>8.1f}us "
+              f"{result['records_written']:>9} {result['records_discarded']:>10}")
+    before, after = results['eager-sync'], results['lazy-queue']
+    if after['mean_us']:
+        print(f"lazy-queue spends {before['mean_us'] / after['mean_us']:.1f}x less time logging per request "
+              f"than eager-sync (p99 {before['p99_us']:.0f}us -> {after['p99_us']:.0f}us)")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'threads': args.threads,
+        'requests_per_thread': args.requests,
+        'sink_delay_ms': args.sink_delay_ms,
+        'results': results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
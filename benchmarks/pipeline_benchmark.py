@@ -0,0 +1,295 @@
+"""
+Benchmark the slide generation hot paths offline.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--fixtures short,hour,five_hours]
+        [--filter TEXT] [--min-time SECONDS] [--output PATH]
+        [--baseline PATH] [--save-baseline] [--threshold 0.25]
+        [--memory-threshold 0.10]
+
+Every stage runs on the fixtures in fixtures.py, with pytube and
+YouTubeTranscriptApi replaced by stubs that return them, so nothing touches
+the network or the database:
+
+* extract_video_id over a mix of URL formats
+* join_entries, segmentation (the slides workload, and the full transcript
+  both joined and read entry by entry), chunk_text and transcript compression for each fixture
+* generate_slides_from_transcript and generate_presentation_from_video end
+  to end for each fixture, with the in-process metadata cache cleared
+  before each run
+
+Each benchmark reports throughput, latency percentiles over its timed runs
+and the peak memory of one traced run. Results are written as JSON to
+--output. If the baseline file exists, every benchmark is compared with it,
+and the run fails (exit status 1) when a median latency grows by more than
+--threshold or peak memory by more than --memory-threshold. --save-baseline
+writes this run as the new baseline instead. Timings depend on the machine,
+so keep one baseline per machine that runs the suite.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+# Bumped when benchmarks change in ways that make older results incomparable
+SUITE_VERSION = 1
+
+URL_FORMATS = (
+    "https://www.youtube.com/watch?v={id}",
+    "https://www.youtube.com/watch?v={id}&t=42s&list=PL1234567890",
+    "https://youtu.be/{id}",
+    "https://youtu.be/{id}?si=abcdefgh",
+    "https://www.youtube.com/embed/{id}",
+    "https://m.youtube.com/watch?feature=share&v={id}",
+    "https://www.youtube.com/v/{id}",
+    "https://example.com/watch?v={id}",
+    "not a url at all",
+)
+
+
+def install_stubs(videos):
+    """Serve fixture metadata and transcripts in place of pytube and YouTubeTranscriptApi."""
+    import transcript_store
+
+    by_id = {video['video_id']: video for video in videos.values()}
+
+    class StubYouTube:
+        def __init__(self, url):
+            from video_metadata import extract_video_id
+            metadata = by_id[extract_video_id(url)]['metadata']
+            self.title = metadata['title']
+            self.author = metadata['author']
+            self.description = metadata['description']
+            self.length = metadata['length_seconds']
+            self.views = metadata['views']
+            self.thumbnail_url = metadata['thumbnail_url']
+
+    class StubTranscriptApi:
+        @staticmethod
+        def get_transcript(video_id, languages=None):
+            return by_id[video_id]['transcript']
+
+    pytube = types.ModuleType('pytube')
+    pytube.YouTube = StubYouTube
+    sys.modules['pytube'] = pytube
+    transcript_store.YouTubeTranscriptApi = StubTranscriptApi
+
+
+def video_url(video):
+    return f"https://www.youtube.com/watch?v={video['video_id']}"
+
+
+def build_benchmarks(videos):
+    """
+    Return the benchmarks as (name, items per run, callable).
+
+    Items is what throughput is counted in: URLs for extract_video_id, one
+    video for everything else.
+    """
+    import summarizer
+    import transcript_segmenter
+    import transcript_store
+    import transcript_utils
+    import video_metadata
+    import youtube_processor
+
+    urls = [template.format(id=video['video_id'])
+            for video in videos.values() for template in URL_FORMATS] * 50
+    benchmarks = [('extract_video_id', len(urls), lambda: [video_metadata.extract_video_id(url) for url in urls])]
+
+    for name, video in videos.items():
+        entries = video['transcript']
+        source, timing = transcript_segmenter.join_entries(entries)
+        compressed = transcript_store.compress_entries(entries)
+        url = video_url(video)
+
+        def slides(entries=entries):
+            return list(transcript_utils._iter_content_slides(entries))
+
+        def full(source=source, timing=timing):
+            return sum(len(paragraph.bullets) for paragraph in transcript_segmenter.iter_paragraphs(source, timing))
+
+        def full_entries(entries=entries):
+            return sum(len(paragraph.bullets) for _, paragraph in transcript_segmenter.iter_entry_paragraphs(entries))
+
+        def end_to_end(generate, url=url, video_id=video['video_id']):
+            def run():
+                # Measure the pipeline, not the in-process metadata cache
+                video_metadata.invalidate(video_id)
+                return generate(url)
+            return run
+
+        benchmarks += [
+            (f'join_entries/{name}', 1, lambda entries=entries: transcript_segmenter.join_entries(entries)),
+            (f'segment_slides/{name}', 1, slides),
+            (f'segment_full/{name}', 1, full),
+            (f'segment_entries_full/{name}', 1, full_entries),
+            (f'chunk_text/{name}', 1, lambda source=source: summarizer.chunk_text(source)),
+            (f'compress_entries/{name}', 1, lambda entries=entries: transcript_store.compress_entries(entries)),
+            (f'decompress_entries/{name}', 1, lambda data=compressed: transcript_store.decompress_entries(data)),
+            (f'generate_slides_from_transcript/{name}', 1, end_to_end(transcript_utils.generate_slides_from_transcript)),
+            (f'generate_presentation_from_video/{name}', 1, end_to_end(youtube_processor.generate_presentation_from_video)),
+        ]
+    return benchmarks
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(fn, items, min_time, min_runs=5, max_runs=10000):
+    """Time fn until min_time has passed and it ran at least min_runs times."""
+    fn()  # warm up caches, imports and the fetch pool
+    gc.collect()
+
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < min_runs or (time.perf_counter() - started < min_time and len(latencies) < max_runs):
+        run_started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - run_started)
+    total = sum(latencies)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'runs': len(latencies),
+        'items_per_run': items,
+        'throughput_per_s': round(items * len(latencies) / total, 2),
+        'mean_ms': round(total / len(latencies) * 1000, 4),
+        'min_ms': round(latencies[0] * 1000, 4),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'max_ms': round(latencies[-1] * 1000, 4),
+        'peak_memory_bytes': peak
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, threshold, memory_threshold):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        list: (benchmark name, description) of every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"  {name}: new benchmark, no baseline")
+            continue
+        time_change = result['p50_ms'] / base['p50_ms'] - 1 if base['p50_ms'] else 0.0
+        memory_change = (result['peak_memory_bytes'] / base['peak_memory_bytes'] - 1
+                         if base['peak_memory_bytes'] else 0.0)
+        flags = []
+        if time_change > threshold:
+            flags.append(f"p50 {base['p50_ms']:.3f}ms -> {result['p50_ms']:.3f}ms ({time_change:+.0%})")
+        if memory_change > memory_threshold:
+            flags.append(f"peak memory {base['peak_memory_bytes']} -> {result['peak_memory_bytes']} bytes "
+                         f"({memory_change:+.0%})")
+        status = 'REGRESSED' if flags else 'ok'
+        print(f"  {name:<50} p50 {time_change:+7.1%}  memory {memory_change:+7.1%}  {status}")
+        regressions += [(name, flag) for flag in flags]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", default=','.join(fixtures.VIDEOS), help="comma-separated fixture names")
+    parser.add_argument("--filter", default='', help="only run benchmarks whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend timing each benchmark")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write this run's results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="largest allowed growth of a median latency, as a fraction")
+    parser.add_argument("--memory-threshold", type=float, default=0.10,
+                        help="largest allowed growth of peak memory, as a fraction")
+    args = parser.parse_args()
+
+    videos = fixtures.load_all(args.fixtures.split(','))
+    install_stubs(videos)
+
+    results = {}
+    print(f"{'benchmark':<50} {'runs':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'per s':>12} {'peak MB':>9}")
+    for name, items, fn in build_benchmarks(videos):
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(fn, items, args.min_time)
+        print(f"{name:<50} {result['runs']:>6} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} "
+              f"{result['p99_ms']:>10.3f} {result['throughput_per_s']:>12.1f} "
+              f"{result['peak_memory_bytes'] / 1024 / 1024:>9.2f}")
+
+    report = {
+        'suite_version': SUITE_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'fixtures': {name: {'video_id': video['video_id'], 'entries': len(video['transcript'])}
+                     for name, video in videos.items()},
+        'results': results
+    }
+    output = args.baseline if args.save_baseline else args.output
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('suite_version') != SUITE_VERSION:
+        print(f"baseline {args.baseline} is from another suite version; record a new one with --save-baseline")
+        return 0
+    # Fixtures recorded since the baseline can't be compared with it
+    changed = {name for name, fixture in report['fixtures'].items()
+               if baseline.get('fixtures', {}).get(name, fixture) != fixture}
+    comparable = {name: result for name, result in results.items() if name.split('/')[-1] not in changed}
+    for name in sorted(changed):
+        print(f"fixture {name} changed since the baseline; its benchmarks are not compared")
+
+    print(f"\ncompared with {args.baseline} ({baseline.get('revision')}, {baseline.get('created_at')}):")
+    regressions = compare(comparable, baseline['results'], args.threshold, args.memory_threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for name, description in regressions:
+            print(f"  {name}: {description}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
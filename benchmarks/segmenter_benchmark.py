@@ -0,0 +1,137 @@
+"""
+Benchmark the transcript segmenter against the original string-building loop.
+
+Usage:
+    python benchmarks/segmenter_benchmark.py [--sizes 1,5] [--repeat 5]
+
+Sizes are transcript sizes in megabytes. Two workloads are measured:
+
+* deck: what generate_slides_from_transcript runs. The original loop
+  segmented the whole transcript, then kept the bullets of the first
+  MAX_CONTENT_SLIDES paragraphs and dropped the rest. The segmenter builds
+  at most MAX_CONTENT_SLIDES slides covering the whole transcript, splitting
+  out only the bullets those slides show.
+* full: every paragraph and all of its bullets.
+
+Three implementations are compared: legacy, the original loop; segmenter,
+join_entries followed by iter_paragraphs; and entries, iter_entry_paragraphs
+reading the entries a window at a time, which is what the slide generator
+runs. The report shows the best wall time of each implementation and the
+peak memory allocated while it ran.
+"""
+import argparse
+import os
+import itertools
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcript_segmenter  # noqa: E402
+import transcript_utils  # noqa: E402
+
+# Paragraphs the original loop turned into slides
+MAX_CONTENT_SLIDES = 8
+
+WORDS = ("so today we are going to talk about how the system handles requests "
+         "under load and what happens when the cache is cold versus warm").split()
+
+
+def make_entries(size_bytes, seed=42):
+    """Build synthetic transcript entries totalling roughly size_bytes of text."""
+    rng = random.Random(seed)
+    entries = []
+    total = 0
+    start = 0.0
+    while total < size_bytes:
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        if rng.random() < 0.4:
+            text += '.'
+        duration = round(rng.uniform(1.5, 5.0), 2)
+        entries.append({'text': text, 'start': start, 'duration': duration})
+        start += duration
+        total += len(text) + 1
+    return entries
+
+
+def legacy_segment(transcript):
+    """The paragraph and bullet loop generate_slides_from_transcript used to run."""
+    paragraphs = []
+    current_paragraph = ""
+    for sentence in transcript.split('. '):
+        current_paragraph += sentence + '. '
+        if len(current_paragraph) > 500:
+            paragraphs.append(current_paragraph.strip())
+            current_paragraph = ""
+    if current_paragraph:
+        paragraphs.append(current_paragraph.strip())
+
+    result = []
+    for paragraph in paragraphs:
+        bullet_points = []
+        sentences = paragraph.split('. ')
+        for j in range(0, len(sentences), 2):
+            combined = '. '.join([s for s in sentences[j:j+2] if s])
+            if combined:
+                bullet_points.append(combined)
+        result.append(bullet_points)
+    return result
+
+
+def legacy_run(entries, workload):
+    transcript = ' '.join([entry['text'] for entry in entries])
+    paragraphs = legacy_segment(transcript)
+    if workload == 'deck':
+        paragraphs = paragraphs[:MAX_CONTENT_SLIDES]
+    return sum(map(len, paragraphs))
+
+
+def segmenter_run(entries, workload):
+    source, timing = transcript_segmenter.join_entries(entries)
+    if workload == 'deck':
+        return sum(len(slide['content']) for slide in transcript_utils._iter_content_slides(source))
+    return sum(len(paragraph.bullets) for paragraph in transcript_segmenter.iter_paragraphs(source, timing))
+
+
+def entries_run(entries, workload):
+    if workload == 'deck':
+        return sum(len(slide['content']) for slide in transcript_utils._iter_content_slides(entries))
+    return sum(len(paragraph.bullets) for _, paragraph in transcript_segmenter.iter_entry_paragraphs(entries))
+
+
+def measure(fn, entries, workload, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(entries, workload)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn(entries, workload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1,5", help="comma-separated transcript sizes in MB")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per implementation")
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'workload':>9} {'impl':>10} {'best ms':>10} {'peak MB':>10}")
+    for size in args.sizes.split(','):
+        entries = make_entries(int(float(size) * 1024 * 1024))
+        # The segmenter drops at most a trailing whitespace-only paragraph
+        legacy_paragraphs = len(legacy_segment(' '.join([entry['text'] for entry in entries])))
+        assert 0 <= legacy_paragraphs - sum(1 for _ in transcript_segmenter.iter_entry_paragraphs(entries)) <= 1
+        assert entries_run(entries, 'full') == segmenter_run(entries, 'full')
+        for workload in ('deck', 'full'):
+            for name, fn in (("legacy", legacy_run), ("segmenter", segmenter_run), ("entries", entries_run)):
+                best, peak = measure(fn, entries, workload, args.repeat)
+                print(f"{size + 'MB':>6} {workload:>9} {name:>10} {best * 1000:>10.1f} {peak / 1024 / 1024:>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark how long the app takes to start, and which imports it spends that on.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 7] [--preload] [--top 15]
+        [--output PATH] [--baseline PATH] [--save-baseline]
+        [--threshold 0.20] [--min-ms 20]
+
+Each run starts a fresh interpreter that imports wsgi.py, the way a gunicorn
+worker starts without --preload; with --preload it also runs
+startup.preload(), as the gunicorn master does. The report shows the median
+over the runs of the total, of each step, of each package's import time and
+of the slowest modules (see startup.py).
+
+Results are written as JSON to --output. If the baseline file exists, the
+run fails (exit status 1) when the total or a package's import time grows by
+more than --threshold and by more than --min-ms, which also catches a new
+dependency being imported at startup. --save-baseline writes this run as the
+new baseline instead. Timings depend on the machine, so keep one baseline
+per machine.
+
+The app only creates its database engine at startup, so without
+DATABASE_URL the runs use an in-memory SQLite URL; the database driver's
+import then isn't measured.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.join(REPO_DIR, 'benchmarks')
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results', 'startup.json')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'startup_baseline.json')
+
+RUN_SCRIPT = """
+import json, sys
+import startup
+import wsgi
+if '--preload' in sys.argv:
+    startup.preload()
+print(json.dumps(startup.report(top=1000)))
+"""
+
+
+def run_once(preload):
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    command = [sys.executable, '-c', RUN_SCRIPT] + (['--preload'] if preload else [])
+    result = subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise SystemExit(f"Starting the app failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_of(reports, key):
+    """Median of each name under reports[*][key] over the runs; missing counts as 0."""
+    names = {name for report in reports for name in report[key]}
+    return {name: round(statistics.median(report[key].get(name, 0.0) for report in reports), 1)
+            for name in names}
+
+
+def summarize(reports, top):
+    modules = {}
+    for report in reports:
+        for module in report['modules']:
+            modules.setdefault(module['name'], []).append(module['self_ms'])
+    module_ms = {name: round(statistics.median(times + [0.0] * (len(reports) - len(times))), 1)
+                 for name, times in modules.items()}
+    packages = median_of(reports, 'packages')
+    return {
+        'total_ms': round(statistics.median(report['total_ms'] for report in reports), 1),
+        'steps': median_of(reports, 'steps'),
+        'packages': dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)),
+        'modules': dict(sorted(module_ms.items(), key=lambda item: item[1], reverse=True)[:top])
+    }
+
+
+def compare(result, baseline, threshold, min_ms):
+    """
+    Compare a summary with a baseline.
+
+    Returns:
+        list: Description of every regression
+    """
+    regressions = []
+
+    def check(label, current, base):
+        if current - base > min_ms and (not base or current / base - 1 > threshold):
+            change = f"{current / base - 1:+.0%}" if base else "new"
+            regressions.append(f"{label}: {base:.1f}ms -> {current:.1f}ms ({change})")
+
+    check("total", result['total_ms'], baseline['total_ms'])
+    for package, ms in result['packages'].items():
+        check(f"import {package}", ms, baseline['packages'].get(package, 0.0))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to start")
+    parser.add_argument("--preload", action="store_true", help="also preload, as the gunicorn master does")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to report")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write this run's results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="largest allowed growth of the total or a package, as a fraction")
+    parser.add_argument("--min-ms", type=float, default=20.0,
+                        help="growth below this many milliseconds is never a regression")
+    args = parser.parse_args()
+
+    reports = [run_once(args.preload) for _ in range(max(1, args.runs))]
+    result = summarize(reports, args.top)
+
+    print(f"startup {result['total_ms']:.1f}ms (median of {len(reports)} runs)")
+    for step, ms in result['steps'].items():
+        print(f"  {step:<30} {ms:>9.1f}ms")
+    print("imports by package:")
+    for package, ms in list(result['packages'].items())[:args.top]:
+        print(f"  {package:<30} {ms:>9.1f}ms")
+    print("slowest modules (self time):")
+    for module, ms in result['modules'].items():
+        print(f"  {module:<30} {ms:>9.1f}ms")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'preload': args.preload,
+        'runs': len(reports),
+        'result': result
+    }
+    output = args.baseline if args.save_baseline else args.output
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('preload') != args.preload:
+        print(f"baseline {args.baseline} was recorded with{'out' if not baseline.get('preload') else ''} "
+              f"--preload; record a new one with --save-baseline")
+        return 0
+
+    print(f"\ncompared with {args.baseline} ({baseline.get('revision')}, {baseline.get('created_at')}):")
+    regressions = compare(result, baseline['result'], args.threshold, args.min_ms)
+    if regressions:
+        print(f"{len(regressions)} regression(s):")
+        for description in regressions:
+            print(f"  {description}")
+        return 1
+    print("  no regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Content-addressed storage for uploaded documents.
+
+Uploaded PDFs and images are stored once per SHA-256 of their bytes, no
+matter how many users upload them:
+
+    objects/<first 2 hex digits>/<sha256>    complete documents
+    uploads/<upload id>                      uploads in progress
+
+Uploads are chunked and resumable. The client creates an upload with the
+total size, then PUTs chunks at an offset; each chunk is streamed from the
+request straight to the partial file, so a document is never held in
+memory. An interrupted upload resumes from the offset the server reports.
+Completing an upload hashes the file, checks it is a supported document
+and moves it into objects/, or discards it if the same document is
+already stored.
+
+Documents are served with range support and read for processing through
+read-only memory maps. Saved comparisons reference documents by hash, so
+comparison profiles (see comparison_engine.py) and pixel comparisons (see
+image_diff.py) are computed once per document, for everyone.
+"""
+import os
+import re
+import hashlib
+import logging
+import mmap
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# Directory holding stored documents and uploads in progress
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'blobs'))
+# Largest document accepted, in bytes
+MAX_BLOB_BYTES = int(os.environ.get("BLOB_MAX_BYTES", str(100 * 1024 * 1024)))
+# Chunk size suggested to clients
+UPLOAD_CHUNK_SIZE = int(os.environ.get("BLOB_UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+# Hours an unfinished upload is kept before purge_stale_uploads deletes it
+UPLOAD_TTL_HOURS = int(os.environ.get("BLOB_UPLOAD_TTL_HOURS", "24"))
+# Bytes copied from the request to disk at a time
+COPY_BUFFER_SIZE = 64 * 1024
+# Hashes of uploaded documents remembered in a visitor's session cookie
+MAX_SESSION_BLOBS = 20
+
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobError(Exception):
+    """Raised when an upload or read fails; status is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_valid_hash(sha256):
+    return isinstance(sha256, str) and bool(_SHA256.match(sha256))
+
+
+def blob_path(sha256):
+    if not is_valid_hash(sha256):
+        raise BlobError("Invalid document hash", 400)
+    return os.path.join(BLOB_STORE_DIR, 'objects', sha256[:2], sha256)
+
+
+def blob_url(sha256):
+    return f"/api/blobs/{sha256}"
+
+
+def _upload_path(upload_id):
+    return os.path.join(BLOB_STORE_DIR, 'uploads', upload_id)
+
+
+def sniff_content_type(head):
+    """
+    Content type of a document from its first bytes, or None if unsupported.
+
+    The type the browser claims is ignored; only what the bytes are counts.
+    """
+    if head.startswith(b'%PDF'):
+        return 'application/pdf'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    try:
+        # Allow a multi-byte character cut off at the end of the sample
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 3:
+            return None
+    return 'text/plain' if b'\x00' not in head else None
+
+
+def create_upload(size, filename, user_id=None):
+    """
+    Start a chunked upload.
+
+    Returns:
+        BlobUpload: The new upload
+
+    Raises:
+        BlobError: If the size is missing or too large
+    """
+    from app import db
+    from models import BlobUpload
+
+    if not isinstance(size, int) or size <= 0:
+        raise BlobError("A positive size is required", 400)
+    if size > MAX_BLOB_BYTES:
+        raise BlobError(f"Documents are limited to {MAX_BLOB_BYTES // (1024 * 1024)} MB", 413)
+
+    upload = BlobUpload(id=uuid.uuid4().hex, user_id=user_id, filename=(filename or '')[:255], size=size)
+    path = _upload_path(upload.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def write_chunk(upload_id, offset, stream, length):
+    """
+    Append a chunk streamed from a request to an upload.
+
+    Args:
+        upload_id (str): Upload to write to
+        offset (int): Byte offset the chunk starts at; must equal the bytes
+            received so far
+        stream: File-like object to read the chunk from
+        length (int): Bytes in the chunk
+
+    Returns:
+        int: Bytes received so far
+
+    Raises:
+        BlobError: With status 409 if offset isn't where the upload left
+            off; the error carries the current offset in .offset
+    """
+    from app import db
+    from models import BlobUpload
+
+    # Lock the upload so concurrent chunks for it are written one at a time
+    upload = BlobUpload.query.filter_by(id=upload_id).with_for_update().first()
+    if upload is None or upload.status != 'uploading':
+        db.session.rollback()
+        raise BlobError("Upload not found", 404)
+    if offset != upload.received:
+        received = upload.received
+        db.session.rollback()
+        error = BlobError(f"Upload is at offset {received}", 409)
+        error.offset = received
+        raise error
+    if length is None or length <= 0 or offset + length > upload.size:
+        db.session.rollback()
+        raise BlobError("Chunk is empty or runs past the end of the document", 400)
+
+    written = 0
+    try:
+        with open(_upload_path(upload.id), 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                buffer = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                if not buffer:
+                    break
+                f.write(buffer)
+                written += len(buffer)
+            # Drop anything an earlier, interrupted write left past this chunk
+            f.truncate(offset + written)
+    except OSError as e:
+        db.session.rollback()
+        logging.error("Error writing upload %s: %s", upload.id, e)
+        raise BlobError("Could not store chunk", 500)
+
+    # A chunk cut short by a dropped connection still counts; the client
+    # resumes from the new offset
+    upload.received = offset + written
+    db.session.commit()
+    return upload.received
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            digest.update(mapped)
+            head = mapped[:512]
+    return digest.hexdigest(), head
+
+
+def complete_upload(upload_id):
+    """
+    Finish an upload, storing the document under its hash.
+
+    Returns:
+        DocumentBlob: The stored document, which may have been uploaded before
+
+    Raises:
+        BlobError: If bytes are missing or the document type isn't supported
+    """
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from models import BlobUpload, DocumentBlob
+
+    upload = BlobUpload.query.filter_by(id=upload_id).with_for_update().first()
+    if upload is None:
+        db.session.rollback()
+        raise BlobError("Upload not found", 404)
+    if upload.status == 'complete':
+        db.session.rollback()
+        return DocumentBlob.query.get(upload.sha256)
+    if upload.received != upload.size:
+        received = upload.received
+        db.session.rollback()
+        raise BlobError(f"Upload is incomplete ({received} of {upload.size} bytes)", 409)
+
+    path = _upload_path(upload.id)
+    sha256, head = _hash_file(path)
+    content_type = sniff_content_type(head)
+    if content_type is None:
+        os.remove(path)
+        db.session.delete(upload)
+        db.session.commit()
+        raise BlobError("Only PDF, PNG, JPEG, GIF and text documents are supported", 415)
+
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        # Someone already stored this document
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    upload.status = 'complete'
+    upload.sha256 = sha256
+    blob = DocumentBlob.query.get(sha256)
+    if blob is None:
+        blob = DocumentBlob(sha256=sha256, size=upload.size, content_type=content_type)
+        db.session.add(blob)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another upload of the same document finished at the same moment
+        db.session.rollback()
+        upload = BlobUpload.query.get(upload_id)
+        upload.status = 'complete'
+        upload.sha256 = sha256
+        db.session.commit()
+        blob = DocumentBlob.query.get(sha256)
+    return blob
+
+
+@contextmanager
+def mapped(sha256):
+    """
+    Memory-map a stored document read-only.
+
+    The map supports len(), slicing and the buffer protocol, so it can be
+    hashed or parsed without reading the whole file into memory first.
+    """
+    path = blob_path(sha256)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        raise BlobError("Document not found", 404)
+    with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as document:
+        yield document
+
+
+def send_blob(blob):
+    """
+    Serve a stored document. Must be called inside a request.
+
+    Range requests are honored, so viewers can fetch only the pages they
+    show. The content never changes, so the hash is a strong ETag.
+    """
+    from flask import send_file
+
+    response = send_file(blob_path(blob.sha256), mimetype=blob.content_type,
+                         conditional=True, etag=blob.sha256, max_age=0)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+def purge_stale_uploads():
+    """Delete uploads that were never completed. Returns the number deleted."""
+    from app import db
+    from models import BlobUpload
+
+    cutoff = datetime.now() - timedelta(hours=UPLOAD_TTL_HOURS)
+    stale = BlobUpload.query.filter(BlobUpload.status == 'uploading', BlobUpload.updated_at < cutoff).all()
+    for upload in stale:
+        try:
+            os.remove(_upload_path(upload.id))
+        except FileNotFoundError:
+            pass
+        db.session.delete(upload)
+    db.session.commit()
+    return len(stale)
+
+
+def get_stats():
+    """Documents stored, bytes on disk and bytes saved by deduplication."""
+    from sqlalchemy import func
+    from app import db
+    from models import BlobUpload, DocumentBlob
+
+    stored, stored_bytes = db.session.query(func.count(), func.coalesce(func.sum(DocumentBlob.size), 0)).one()
+    uploaded, uploaded_bytes = db.session.query(func.count(), func.coalesce(func.sum(BlobUpload.size), 0)) \
+        .filter(BlobUpload.status == 'complete').one()
+    return {
+        'documents': stored,
+        'bytes_stored': int(stored_bytes),
+        'uploads': uploaded,
+        'bytes_uploaded': int(uploaded_bytes),
+        'bytes_saved': max(int(uploaded_bytes) - int(stored_bytes), 0)
+    }
+
+
+def ensure_columns(db):
+    """Add the document hash columns to saved_comparisons tables created before them."""
+    from sqlalchemy import text
+
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        for column in ('document_a_hash', 'document_b_hash'):
+            conn.execute(text(f'ALTER TABLE saved_comparisons ADD COLUMN IF NOT EXISTS {column} '
+                              f'VARCHAR(64) REFERENCES document_blobs (sha256)'))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the document blob store")
+    parser.add_argument("--report", action="store_true", help="Only print storage and deduplication stats")
+    args = parser.parse_args()
+
+    from app import app, db
+    import models  # noqa: F401  registers the tables
+
+    with app.app_context():
+        if not args.report:
+            ensure_columns(db)
+            print(f"purged {purge_stale_uploads()} stale uploads")
+        print(", ".join(f"{key}={value}" for key, value in get_stats().items()))
+
+
+if __name__ == '__main__':
+    main()
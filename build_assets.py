@@ -0,0 +1,190 @@
+"""
+Build fingerprinted static assets.
+
+Usage:
+    python build_assets.py [--clean]
+
+Copies every file under static/ (except static/dist/) into static/dist/ with
+a content hash in its name, writes .gz and .br variants of text assets, and
+re-encodes large images into resized variants. Files outside static/ listed
+in EXTRA_ASSETS are built the same way. The result is described in
+static/dist/manifest.json, which assets.asset_url reads.
+
+Brotli variants need the brotli package and image resizing needs Pillow;
+without them those steps are skipped.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+from io import BytesIO
+
+from assets import DIST_DIR, MANIFEST_PATH, STATIC_DIR
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Files outside static/ to build, as (source relative to the project, manifest name)
+EXTRA_ASSETS = (
+    ('generated-icon.png', 'images/app-icon.png'),
+)
+
+# Extensions worth precompressing
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.html', '.txt', '.map'}
+# Raster images larger than this many bytes are resized
+IMAGE_MAX_BYTES = int(os.environ.get("ASSET_IMAGE_MAX_BYTES", str(200 * 1024)))
+# Widths of the resized variants of large images
+IMAGE_WIDTHS = (192, 512, 1024)
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp'}
+# Characters of the content hash kept in file names
+HASH_LENGTH = 12
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _fingerprinted_name(name, digest):
+    root, extension = os.path.splitext(name)
+    return f"{root}.{digest[:HASH_LENGTH]}{extension}"
+
+
+def _write(relative_path, data):
+    path = os.path.join(DIST_DIR, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _precompress(relative_path, data):
+    """Write .gz and .br variants, keeping only those smaller than the original."""
+    encodings = []
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            _write(relative_path + '.br', compressed)
+            encodings.append('br')
+    # mtime=0 keeps the .gz output identical across builds
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        _write(relative_path + '.gz', compressed)
+        encodings.append('gzip')
+    return encodings
+
+
+def _resize_variants(name, source_path):
+    """Re-encode a large image at IMAGE_WIDTHS, returning variant manifest entries."""
+    variants = []
+    with Image.open(source_path) as image:
+        image.load()
+        root, extension = os.path.splitext(name)
+        for width in IMAGE_WIDTHS:
+            if width >= image.width:
+                continue
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            for format_name, variant_extension, options in (
+                ('WEBP', '.webp', {'quality': 85, 'method': 6}),
+                ('PNG' if extension == '.png' else 'JPEG', extension, {'optimize': True}),
+            ):
+                buffer = BytesIO()
+                image_to_save = resized
+                if format_name == 'JPEG' and resized.mode not in ('RGB', 'L'):
+                    image_to_save = resized.convert('RGB')
+                image_to_save.save(buffer, format_name, **options)
+                data = buffer.getvalue()
+                digest = _digest(data)
+                path = _fingerprinted_name(f"{root}-{width}w{variant_extension}", digest)
+                _write(path, data)
+                variants.append({'width': width, 'format': format_name.lower(), 'path': path, 'hash': digest[:HASH_LENGTH]})
+    return variants
+
+
+def build_file(name, source_path):
+    """Build one asset and return its manifest entry."""
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    digest = _digest(data)
+    path = _fingerprinted_name(name, digest)
+    _write(path, data)
+
+    entry = {'path': path, 'hash': digest[:HASH_LENGTH], 'size': len(data)}
+    extension = os.path.splitext(name)[1].lower()
+    if extension in COMPRESSIBLE_EXTENSIONS:
+        entry['encodings'] = _precompress(path, data)
+    elif extension in IMAGE_EXTENSIONS and len(data) > IMAGE_MAX_BYTES:
+        if Image is None:
+            logging.warning("%s is %s bytes but Pillow isn't installed; not resizing", name, len(data))
+        else:
+            entry['variants'] = _resize_variants(name, source_path)
+    return entry
+
+
+def iter_sources():
+    """Yield (manifest name, source path) for every asset to build."""
+    for directory, subdirectories, files in os.walk(STATIC_DIR):
+        # Never rebuild earlier build output
+        subdirectories[:] = sorted(d for d in subdirectories if os.path.join(directory, d) != DIST_DIR)
+        for filename in sorted(files):
+            source_path = os.path.join(directory, filename)
+            yield os.path.relpath(source_path, STATIC_DIR).replace(os.sep, '/'), source_path
+    for source, name in EXTRA_ASSETS:
+        source_path = os.path.join(ROOT_DIR, source)
+        if os.path.isfile(source_path):
+            yield name, source_path
+
+
+def build(clean=False):
+    """
+    Build every asset and write the manifest.
+
+    Returns:
+        dict: The manifest
+    """
+    if clean and os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    manifest = {'files': {}}
+    for name, source_path in iter_sources():
+        manifest['files'][name] = build_file(name, source_path)
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    # Write the manifest last, atomically, so a running app never sees a
+    # manifest that points at files that don't exist yet
+    temporary_path = MANIFEST_PATH + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporary_path, MANIFEST_PATH)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets")
+    parser.add_argument("--clean", action="store_true", help="Delete previous builds first")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    manifest = build(args.clean)
+    for name, entry in sorted(manifest['files'].items()):
+        details = [f"{entry['size']} bytes"]
+        if entry.get('encodings'):
+            details.append('+'.join(entry['encodings']))
+        if entry.get('variants'):
+            details.append(f"{len(entry['variants'])} resized variants")
+        print(f"{name} -> {entry['path']} ({', '.join(details)})")
+
+
+if __name__ == '__main__':
+    main()
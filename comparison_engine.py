@@ -0,0 +1,653 @@
+"""
+Server-side comparison of two documents.
+
+Each document is reduced to a profile: term counts plus a few structural
+features (numbers, citations, sentence length, vocabulary). Profiles are
+built on a pool of worker processes, page range by page range, each
+reading its pages from the document's file, and cached by the SHA-256 of
+the document's bytes, so comparing A against B, C and D reads A only
+once. Profiles are kept in each worker's memory and in the
+document_profiles table, shared by every worker.
+
+Criteria scores are computed from the two profiles with NumPy: a term
+matrix (documents x vocabulary) is multiplied by a lexicon matrix (criteria
+x vocabulary) and combined with a feature matrix (documents x features)
+weighted per criterion. The result has the shape static/js/main.js renders
+(overallScores, categoryScores, categories, recommendations, conclusions).
+
+Text extraction needs pypdf for PDFs and pytesseract with Pillow for
+images; plain text documents need neither.
+"""
+import os
+import re
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import metrics
+from video_metadata import TTLCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:
+    pytesseract = None
+
+# Worker processes extracting text, per web process
+COMPARE_WORKERS = int(os.environ.get("COMPARE_WORKERS", "2"))
+# PDF pages handled by one extraction task
+PAGES_PER_TASK = int(os.environ.get("COMPARE_PAGES_PER_TASK", "25"))
+# Largest document accepted, in bytes
+MAX_DOCUMENT_BYTES = int(os.environ.get("COMPARE_MAX_DOCUMENT_BYTES", str(50 * 1024 * 1024)))
+# Most pages read from a PDF
+MAX_PAGES = int(os.environ.get("COMPARE_MAX_PAGES", "500"))
+# Seconds a request waits for a document's text to be extracted; keep it
+# below the gunicorn worker timeout (see gunicorn.conf.py)
+EXTRACT_TIMEOUT = float(os.environ.get("COMPARE_EXTRACT_TIMEOUT", "60"))
+# Maximum number of profiles held in each worker's in-process cache
+LOCAL_CACHE_SIZE = int(os.environ.get("COMPARE_CACHE_SIZE", "128"))
+# Seconds a profile stays in the in-process cache
+LOCAL_CACHE_TTL = 3600
+# Most frequent terms kept in a profile
+MAX_PROFILE_TERMS = 5000
+# Bump when profiling changes so stored profiles are rebuilt
+PROFILE_VERSION = 1
+
+# Scores differing by less than this are reported as comparable
+COMPARABLE_GAP = 5
+
+# Criteria, grouped as the results page shows them. Each criterion is scored
+# on how densely the document uses its lexicon (word prefixes)
+CATEGORIES = (
+    ("Scientific Impact", (
+        ("novelty", "Scientific Novelty",
+         ("novel", "innovat", "breakthrough", "unprecedent", "original", "first", "pioneer")),
+        ("advancement", "Field Advancement",
+         ("advanc", "state-of-the-art", "outperform", "improv", "surpass", "progress", "exceed")),
+        ("foundation", "Foundational Science",
+         ("theor", "framework", "principl", "formal", "proof", "hypothes", "fundamental")),
+        ("verification", "Empirical Verification",
+         ("experiment", "evaluat", "benchmark", "dataset", "validat", "measur", "result", "trial")),
+    )),
+    ("Business Value", (
+        ("roi", "Return on Investment",
+         ("roi", "return", "revenue", "profit", "payback", "margin", "saving")),
+        ("competitive", "Competitive Advantage",
+         ("competit", "differentiat", "advantage", "leader", "unique", "patent", "moat")),
+        ("operational", "Operational Efficiency",
+         ("efficien", "automat", "streamlin", "productiv", "throughput", "latency", "optimi")),
+        ("marketability", "Commercial Marketability",
+         ("market", "customer", "user", "demand", "adopt", "commercial", "product")),
+        ("implementation", "Implementation Cost",
+         ("cost", "budget", "afford", "cheap", "inexpensive", "price", "invest")),
+        ("scalability", "Business Scalability",
+         ("scal", "grow", "expan", "global", "enterprise", "volume")),
+    )),
+    ("Humanitarian Value", (
+        ("accessibility", "Global Accessibility",
+         ("access", "availab", "open", "inclusi", "afford", "low-resource", "offline")),
+        ("equity", "Equitable Benefits",
+         ("equit", "fair", "bias", "divers", "communit", "underserved", "social")),
+        ("problems", "Critical Problem Solving",
+         ("health", "climate", "disease", "poverty", "education", "disaster", "crisis")),
+        ("risk", "Safety & Risk Mitigation",
+         ("safe", "risk", "secur", "privacy", "robust", "mitigat", "harm")),
+    )),
+    ("Technical Viability", (
+        ("feasibility", "Implementation Feasibility",
+         ("feasib", "implement", "deploy", "prototype", "practical", "production")),
+        ("tech-scalability", "Technical Scalability",
+         ("distribut", "parallel", "cluster", "throughput", "scal", "memory")),
+        ("integration", "Ecosystem Integration",
+         ("integrat", "compatib", "interoperab", "api", "standard", "plugin", "ecosystem")),
+        ("validation", "Validation Methodology",
+         ("method", "reproduc", "baseline", "ablation", "statistic", "significan", "peer")),
+    )),
+)
+
+# Structural features, each scaled by the value a typical document reaches
+FEATURES = (
+    ('numbers_per_1k_words', 20.0),
+    ('citations_per_page', 3.0),
+    ('words_per_sentence', 22.0),
+    ('vocabulary_ratio', 0.3),
+)
+
+# How much each feature adds to a criterion's signal
+FEATURE_WEIGHTS = {
+    'verification': {'numbers_per_1k_words': 0.6, 'citations_per_page': 0.2},
+    'foundation': {'citations_per_page': 0.4, 'vocabulary_ratio': 0.2},
+    'validation': {'numbers_per_1k_words': 0.3, 'citations_per_page': 0.3},
+    'roi': {'numbers_per_1k_words': 0.3},
+    'marketability': {'words_per_sentence': -0.3},
+    'accessibility': {'words_per_sentence': -0.2},
+    'novelty': {'vocabulary_ratio': 0.3},
+}
+
+# Criterion lexicon matches per 1,000 words at which a criterion's lexicon
+# signal reaches 1
+LEXICON_SCALE = 4.0
+
+STOP_WORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being between both but by can
+could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just more most no nor not now of off on once only or other our out over own same
+she should so some such than that the their them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your
+""".split())
+
+_WORD = re.compile(r"[a-z][a-z\-']*[a-z]|[a-z]")
+_NUMBER = re.compile(r"\b\d+(?:[.,]\d+)*%?")
+_CITATION = re.compile(r"\[\d+(?:[,–\-]\s*\d+)*\]|\(\w[^()]{0,60}?,? (?:19|20)\d{2}[a-z]?\)")
+_SENTENCE_END = re.compile(r"[.!?]+(?:\s|$)")
+
+_executor = None
+_executor_lock = threading.Lock()
+_local_cache = TTLCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+# Content hash -> Future of the profile being built for it
+_profile_builds = {}
+_profile_builds_lock = threading.Lock()
+
+
+class ComparisonError(Exception):
+    """Raised when documents can't be compared; status is the HTTP status to return."""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+def document_kind(data):
+    """Detect whether a document is a PDF, an image or plain text."""
+    if data.startswith(b'%PDF'):
+        return 'pdf'
+    if data.startswith((b'\x89PNG', b'\xff\xd8', b'GIF8')):
+        return 'image'
+    return 'text'
+
+
+def _get_executor():
+    """Return the extraction pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Spawned rather than forked, so workers don't inherit the
+                # web process's threads, sockets and database connections
+                _executor = ProcessPoolExecutor(max_workers=COMPARE_WORKERS,
+                                                mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def _reset_executor(broken):
+    """Drop a pool whose worker died so the next comparison starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _extract_pages(path, kind, start, stop):
+    """Text of pages [start, stop) of the document stored at path."""
+    if kind == 'pdf':
+        reader = PdfReader(path)
+        return [reader.pages[index].extract_text() or '' for index in range(start, stop)]
+    if kind == 'image':
+        with Image.open(path) as image:
+            return [pytesseract.image_to_string(image)]
+    with open(path, 'rb') as f:
+        return [f.read().decode('utf-8', errors='replace')]
+
+
+def profile_text(pages):
+    """
+    Count the terms and structural features of some pages of text.
+
+    Returns:
+        dict: Partial profile; partial profiles of page ranges are combined
+        with merge_profiles
+    """
+    terms = Counter()
+    words = sentences = numbers = citations = 0
+    for page in pages:
+        lowered = page.lower()
+        page_words = _WORD.findall(lowered)
+        words += len(page_words)
+        terms.update(word for word in page_words if word not in STOP_WORDS)
+        sentences += len(_SENTENCE_END.findall(page))
+        numbers += len(_NUMBER.findall(page))
+        citations += len(_CITATION.findall(page))
+    return {
+        'pages': len(pages),
+        'words': words,
+        'sentences': sentences,
+        'numbers': numbers,
+        'citations': citations,
+        'terms': terms
+    }
+
+
+def profile_range(path, kind, start, stop):
+    """
+    Extract and profile a page range. Runs in an extraction process.
+
+    Only the path is sent to the process, which reads the pages it needs
+    from the file, so a task costs the same however large the document is.
+    """
+    return profile_text(_extract_pages(path, kind, start, stop))
+
+
+def merge_profiles(partials):
+    """Combine page range profiles into a document profile."""
+    terms = Counter()
+    profile = {'version': PROFILE_VERSION, 'pages': 0, 'words': 0, 'sentences': 0, 'numbers': 0, 'citations': 0}
+    for partial in partials:
+        terms.update(partial['terms'])
+        for field in ('pages', 'words', 'sentences', 'numbers', 'citations'):
+            profile[field] += partial[field]
+    profile['unique_terms'] = len(terms)
+    profile['terms'] = dict(terms.most_common(MAX_PROFILE_TERMS))
+    return profile
+
+
+def _page_count(path, kind):
+    if kind != 'pdf':
+        return 1
+    try:
+        return min(len(PdfReader(path).pages), MAX_PAGES)
+    except Exception as e:
+        raise ComparisonError(f"Could not read PDF: {str(e)}")
+
+
+def _submit_ranges(path, kind, page_count):
+    """
+    Submit one profiling task per page range, replacing the pool once if
+    it is broken. Returns the pool and the tasks' futures.
+
+    A worker can die after every request waiting on it has timed out, so
+    the crash only surfaces on the next submit.
+
+    Raises:
+        ComparisonError: If a fresh pool cannot accept the tasks either
+    """
+    for _ in range(2):
+        executor = _get_executor()
+        futures = []
+        try:
+            for start in range(0, page_count, PAGES_PER_TASK):
+                futures.append(executor.submit(profile_range, path, kind, start,
+                                               min(start + PAGES_PER_TASK, page_count)))
+            return executor, futures
+        except BrokenProcessPool as e:
+            for future in futures:
+                future.cancel()
+            _reset_executor(executor)
+            logging.warning("Replacing broken extraction pool: %s", e)
+    raise ComparisonError("Text extraction worker crashed", 500)
+
+
+def _profile_file(path, kind):
+    """Profile the document at path on the extraction pool, page range by page range."""
+    page_count = _page_count(path, kind)
+    executor, futures = _submit_ranges(path, kind, page_count)
+    done, pending = wait(futures, timeout=EXTRACT_TIMEOUT)
+    if pending:
+        # Ranges already running finish in the background; the rest are dropped
+        for future in pending:
+            future.cancel()
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+            _reset_executor(executor)
+        logging.error("Timed out extracting %d page ranges of %s", len(pending), path)
+        raise ComparisonError("Text extraction timed out", 504)
+    try:
+        return merge_profiles([future.result() for future in futures])
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        raise ComparisonError("Text extraction worker crashed", 500)
+    except Exception as e:
+        logging.error("Error extracting document text: %s", e)
+        raise ComparisonError(f"Could not extract text: {str(e)}")
+
+
+def _build_profile(data, path=None):
+    kind = document_kind(data[:8])
+    if kind == 'pdf' and PdfReader is None:
+        raise ComparisonError("PDF comparison requires pypdf, which is not installed", 501)
+    if kind == 'image' and pytesseract is None:
+        raise ComparisonError("Image comparison requires pytesseract and Pillow, which are not installed", 501)
+
+    if kind == 'text':
+        return merge_profiles([profile_text([bytes(data).decode('utf-8', errors='replace')])])
+    if path is not None:
+        return _profile_file(path, kind)
+
+    # Uploaded documents are written to a file once for the workers to read
+    with tempfile.NamedTemporaryFile(prefix='compare-', suffix=f'.{kind}') as f:
+        f.write(data)
+        f.flush()
+        return _profile_file(f.name, kind)
+
+
+def _store_available():
+    try:
+        from flask import has_app_context
+        return has_app_context()
+    except ImportError:
+        return False
+
+
+def _load_shared(content_hash):
+    if not _store_available():
+        return None
+
+    from sqlalchemy import select
+    from app import db
+    from models import DocumentProfile
+    import json_codec
+
+    table = DocumentProfile.__table__
+    try:
+        with db.engine.connect() as conn:
+            blob = conn.execute(
+                select(table.c.profile).where(table.c.content_hash == content_hash,
+                                              table.c.profile_version == PROFILE_VERSION)
+            ).scalar()
+    except Exception as e:
+        logging.error("Error reading document profile cache: %s", e)
+        return None
+    return json_codec.decode(blob) if blob is not None else None
+
+
+def _store_shared(content_hash, profile):
+    if not _store_available():
+        return
+
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from models import DocumentProfile
+
+    table = DocumentProfile.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.content_hash == content_hash))
+            conn.execute(table.insert().values(
+                content_hash=content_hash,
+                profile_version=PROFILE_VERSION,
+                page_count=profile['pages'],
+                word_count=profile['words'],
+                profile=profile,
+                created_at=datetime.now()
+            ))
+    except IntegrityError:
+        pass
+    except Exception as e:
+        logging.error("Error writing document profile cache: %s", e)
+
+
+def get_profile(data, content_hash=None, path=None):
+    """
+    Return a document's profile, building it on first use.
+
+    Concurrent requests for the same document share one build: the first
+    builds the profile and the others wait for its result.
+
+    Args:
+        data (bytes): Document; a memory-mapped stored document works too
+            (see blob_store.py)
+        content_hash (str, optional): SHA-256 of data, if already known
+        path (str, optional): File holding data, such as a stored document,
+            for the extraction workers to read instead of a copy
+
+    Returns:
+        tuple: (profile, whether it came from a cache)
+
+    Raises:
+        ComparisonError: If the document is too large or unreadable
+    """
+    if not data:
+        raise ComparisonError("Document is empty", 400)
+    if len(data) > MAX_DOCUMENT_BYTES:
+        raise ComparisonError("Document too large", 413)
+
+    if content_hash is None:
+        content_hash = hashlib.sha256(data).hexdigest()
+    profile = _local_cache.get(content_hash)
+    if profile is not None:
+        metrics.count_cache('document_profiles', 'local_hits')
+        return profile, True
+
+    with _profile_builds_lock:
+        build = _profile_builds.get(content_hash)
+        is_leader = build is None
+        if is_leader:
+            build = _profile_builds[content_hash] = Future()
+    if not is_leader:
+        metrics.count_cache('document_profiles', 'coalesced')
+        try:
+            return build.result(timeout=EXTRACT_TIMEOUT), True
+        except FutureTimeoutError:
+            raise ComparisonError("Text extraction timed out", 504)
+
+    try:
+        profile = _load_shared(content_hash)
+        cached = profile is not None
+        metrics.count_cache('document_profiles', 'shared_hits' if cached else 'misses')
+        if profile is None:
+            with metrics.stage('comparison', 'extract'):
+                profile = _build_profile(data, path)
+            _store_shared(content_hash, profile)
+        _local_cache.set(content_hash, profile)
+        build.set_result(profile)
+        return profile, cached
+    except BaseException as e:
+        build.set_exception(e)
+        raise
+    finally:
+        # Requests arriving from now on find the profile in the local cache
+        with _profile_builds_lock:
+            _profile_builds.pop(content_hash, None)
+
+
+def _criteria():
+    return [criterion for _, criteria in CATEGORIES for criterion in criteria]
+
+
+def _lexicon_matrix(vocabulary):
+    """Criteria x vocabulary matrix, 1 where a term starts with a criterion's prefix."""
+    criteria = _criteria()
+    prefix_criteria = {}
+    for index, (_, _, prefixes) in enumerate(criteria):
+        for prefix in prefixes:
+            prefix_criteria.setdefault(prefix, []).append(index)
+    # Longest prefixes first so the most specific prefix wins
+    pattern = re.compile('|'.join(re.escape(prefix) for prefix in sorted(prefix_criteria, key=len, reverse=True)))
+
+    lexicon = np.zeros((len(criteria), len(vocabulary)))
+    for column, term in enumerate(vocabulary):
+        match = pattern.match(term)
+        if match:
+            lexicon[prefix_criteria[match.group(0)], column] = 1.0
+    return lexicon
+
+
+def _feature_matrix(profiles):
+    """Documents x features matrix, each feature scaled by its typical value."""
+    rows = []
+    for profile in profiles:
+        words = max(profile['words'], 1)
+        values = {
+            'numbers_per_1k_words': profile['numbers'] * 1000 / words,
+            'citations_per_page': profile['citations'] / max(profile['pages'], 1),
+            'words_per_sentence': words / max(profile['sentences'], 1),
+            'vocabulary_ratio': profile['unique_terms'] / words,
+        }
+        rows.append([values[name] / scale for name, scale in FEATURES])
+    return np.clip(np.array(rows), 0.0, 2.0)
+
+
+def _feature_weights():
+    """Criteria x features matrix of FEATURE_WEIGHTS."""
+    names = [name for name, _ in FEATURES]
+    weights = np.zeros((len(_criteria()), len(names)))
+    for row, (criterion_id, _, _) in enumerate(_criteria()):
+        for name, weight in FEATURE_WEIGHTS.get(criterion_id, {}).items():
+            weights[row, names.index(name)] = weight
+    return weights
+
+
+def score_profiles(profile_a, profile_b):
+    """
+    Score two document profiles on every criterion.
+
+    Returns:
+        dict: 'scores' (2 x criteria array of 0-100 scores), 'density'
+        (lexicon matches per 1,000 words), 'terms' (vocabulary), 'counts'
+        (2 x vocabulary term counts), 'lexicon' and 'similarity'
+    """
+    profiles = (profile_a, profile_b)
+    vocabulary = sorted(set(profile_a['terms']) | set(profile_b['terms']))
+    counts = np.array([[profile['terms'].get(term, 0) for term in vocabulary] for profile in profiles], dtype=float)
+    words = np.array([max(profile['words'], 1) for profile in profiles], dtype=float)
+
+    lexicon = _lexicon_matrix(vocabulary)
+    density = (counts @ lexicon.T) * 1000 / words[:, None]
+    signal = density / LEXICON_SCALE + _feature_matrix(profiles) @ _feature_weights().T
+    # Saturating curve: no signal scores 35, a strong signal approaches 95
+    scores = np.clip(35 + 60 * (1 - np.exp(-np.maximum(signal, 0))), 0, 100).round()
+
+    norms = np.linalg.norm(counts, axis=1)
+    similarity = float(counts[0] @ counts[1] / (norms[0] * norms[1])) if norms.all() else 0.0
+    return {
+        'scores': scores,
+        'density': density,
+        'terms': vocabulary,
+        'counts': counts,
+        'lexicon': lexicon,
+        'similarity': similarity
+    }
+
+
+def _describe(scored, document, criterion_index):
+    matches = scored['counts'][document] * scored['lexicon'][criterion_index]
+    top = [scored['terms'][column] for column in np.argsort(matches)[::-1][:3] if matches[column] > 0]
+    if not top:
+        return "Not discussed in this document"
+    density = scored['density'][document, criterion_index]
+    return f"Mentions {', '.join(top)} ({density:.1f} per 1,000 words)"
+
+
+def _recommendations(categories, names):
+    """Sentences about the criteria of the named categories with the largest score gaps."""
+    criteria = [criterion for category in categories if category['name'] in names for criterion in category['criteria']]
+    recommendations = []
+    for criterion in sorted(criteria, key=lambda c: abs(c['scoreA'] - c['scoreB']), reverse=True)[:3]:
+        gap = criterion['scoreA'] - criterion['scoreB']
+        if abs(gap) < COMPARABLE_GAP:
+            recommendations.append(f"Both documents are comparable on {criterion['name'].lower()}")
+        else:
+            leader, high, low = ('A', criterion['scoreA'], criterion['scoreB']) if gap > 0 else ('B', criterion['scoreB'], criterion['scoreA'])
+            recommendations.append(f"Document {leader} is stronger on {criterion['name'].lower()} ({high:.0f} vs {low:.0f})")
+
+    total_a = sum(criterion['scoreA'] for criterion in criteria)
+    total_b = sum(criterion['scoreB'] for criterion in criteria)
+    if criteria and abs(total_a - total_b) / len(criteria) >= COMPARABLE_GAP:
+        leader = 'A' if total_a > total_b else 'B'
+        recommendations.append(f"For {' and '.join(name.lower() for name in names)}, favor Document {leader}")
+    return recommendations
+
+
+def _conclusion(category_scores, key, profile):
+    ranked = sorted(category_scores, key=lambda category: category[key])
+    weakest, strongest = ranked[0], ranked[-1]
+    return (f"Strongest on {strongest['name'].lower()} ({strongest[key]}), weakest on "
+            f"{weakest['name'].lower()} ({weakest[key]}); {profile['pages']} page{'s' if profile['pages'] != 1 else ''} "
+            f"and {profile['words']:,} words analyzed")
+
+
+def compare_documents(data_a, data_b, hash_a=None, hash_b=None, path_a=None, path_b=None):
+    """
+    Compare two documents.
+
+    Args:
+        data_a (bytes): First document (PDF, image or text)
+        data_b (bytes): Second document
+        hash_a (str, optional): SHA-256 of data_a, if already known
+        hash_b (str, optional): SHA-256 of data_b, if already known
+        path_a (str, optional): File holding data_a, if it is stored
+        path_b (str, optional): File holding data_b, if it is stored
+
+    Returns:
+        dict: Comparison in the shape the results page renders, plus the
+        cosine similarity of the documents' vocabularies
+
+    Raises:
+        ComparisonError: If either document can't be read
+    """
+    if np is None:
+        raise ComparisonError("Document comparison requires numpy, which is not installed", 501)
+
+    profile_a, cached_a = get_profile(data_a, hash_a, path_a)
+    profile_b, cached_b = get_profile(data_b, hash_b, path_b)
+    if not profile_a['words'] or not profile_b['words']:
+        raise ComparisonError("No text could be extracted from one of the documents")
+
+    with metrics.stage('comparison', 'score'):
+        scored = score_profiles(profile_a, profile_b)
+    categories = []
+    index = 0
+    for category_name, criteria in CATEGORIES:
+        category = {'name': category_name, 'criteria': []}
+        for criterion_id, criterion_name, _ in criteria:
+            category['criteria'].append({
+                'id': criterion_id,
+                'name': criterion_name,
+                'descriptionA': _describe(scored, 0, index),
+                'descriptionB': _describe(scored, 1, index),
+                'scoreA': int(scored['scores'][0, index]),
+                'scoreB': int(scored['scores'][1, index])
+            })
+            index += 1
+        categories.append(category)
+
+    category_scores = [{
+        'name': category['name'],
+        'averageA': round(sum(c['scoreA'] for c in category['criteria']) / len(category['criteria'])),
+        'averageB': round(sum(c['scoreB'] for c in category['criteria']) / len(category['criteria']))
+    } for category in categories]
+
+    return {
+        'overallScores': {
+            'averageA': round(float(scored['scores'][0].mean())),
+            'averageB': round(float(scored['scores'][1].mean()))
+        },
+        'categoryScores': category_scores,
+        'categories': categories,
+        'businessRecommendations': _recommendations(categories, ("Business Value",)),
+        'scientificRecommendations': _recommendations(categories, ("Scientific Impact", "Technical Viability")),
+        'humanitarianRecommendations': _recommendations(categories, ("Humanitarian Value",)),
+        'conclusionA': _conclusion(category_scores, 'averageA', profile_a),
+        'conclusionB': _conclusion(category_scores, 'averageB', profile_b),
+        'similarity': round(scored['similarity'], 3),
+        'documents': [
+            {'pages': profile_a['pages'], 'words': profile_a['words'], 'cached': cached_a},
+            {'pages': profile_b['pages'], 'words': profile_b['words'], 'cached': cached_b}
+        ]
+    }
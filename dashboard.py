@@ -0,0 +1,137 @@
+"""
+Paginated dashboard listings.
+
+The dashboard lists a user's saved comparisons and slide decks newest first.
+List queries load only the columns the list shows, never the results_json
+and slides_json blobs, and paginate with a keyset on (created_at, id) so
+later pages cost the same as the first no matter how many rows a user has.
+The (user_id, created_at) indexes on both tables serve these queries.
+"""
+import os
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+
+# Items per dashboard page
+PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", "20"))
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 100
+
+
+def ensure_indexes(db):
+    """
+    Create the (user_id, created_at) indexes on tables created before them.
+
+    Safe to run more than once.
+    """
+    from sqlalchemy import text
+
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_saved_comparisons_user_id_created_at '
+                          'ON saved_comparisons (user_id, created_at)'))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_slide_decks_user_id_created_at '
+                          'ON slide_decks (user_id, created_at)'))
+
+
+def encode_cursor(item):
+    """Encode the position after item as an opaque cursor."""
+    raw = f"{item.created_at.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor.
+
+    Returns:
+        tuple: (created_at, id), or None if cursor is empty
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        created_at, item_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+
+def _page(model, columns, user_id, cursor=None, limit=PAGE_SIZE):
+    """Return (items, next cursor) for one page of a user's rows of model."""
+    limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+    query = (model.query
+             .options(load_only(*columns))
+             .filter(model.user_id == user_id))
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, item_id = position
+        query = query.filter(or_(model.created_at < created_at,
+                                 and_(model.created_at == created_at, model.id < item_id)))
+
+    # Fetch one extra row to learn whether there is another page
+    items = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(items) > limit:
+        return items[:limit], encode_cursor(items[limit - 1])
+    return items, None
+
+
+def list_comparisons(user_id, cursor=None, limit=PAGE_SIZE):
+    """One page of a user's saved comparisons, without their results."""
+    from models import SavedComparison
+
+    return _page(SavedComparison, (
+        SavedComparison.id,
+        SavedComparison.title,
+        SavedComparison.description,
+        SavedComparison.document_a_name,
+        SavedComparison.document_b_name,
+        SavedComparison.document_a_type,
+        SavedComparison.document_b_type,
+        SavedComparison.created_at
+    ), user_id, cursor, limit)
+
+
+def list_slide_decks(user_id, cursor=None, limit=PAGE_SIZE):
+    """One page of a user's slide decks, without their slides."""
+    from models import SlideDeck
+
+    return _page(SlideDeck, (
+        SlideDeck.id,
+        SlideDeck.title,
+        SlideDeck.description,
+        SlideDeck.video_title,
+        SlideDeck.status,
+        SlideDeck.created_at
+    ), user_id, cursor, limit)
+
+
+def comparison_summary(comparison):
+    return {
+        'id': comparison.id,
+        'title': comparison.title,
+        'description': comparison.description,
+        'document_a_name': comparison.document_a_name,
+        'document_b_name': comparison.document_b_name,
+        'document_a_type': comparison.document_a_type,
+        'document_b_type': comparison.document_b_type,
+        'created_at': comparison.created_at.isoformat()
+    }
+
+
+def deck_summary(deck):
+    return {
+        'id': deck.id,
+        'title': deck.title,
+        'description': deck.description,
+        'video_title': deck.video_title,
+        'status': deck.status,
+        'created_at': deck.created_at.isoformat()
+    }
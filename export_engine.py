@@ -0,0 +1,414 @@
+"""
+PowerPoint and PDF export of presentations.
+
+A presentation dict (title, slides with title/content/image_url) is rendered
+to a .pptx or .pdf file on a pool of worker processes, so rendering large
+decks never blocks a web worker. Artifacts are cached on disk under a hash
+of the slide content and the format:
+
+    <sha256 of format and presentation>.<format>
+
+so downloading the same deck again, by any user, just serves the cached
+file. Concurrent requests for an artifact that is still rendering wait for
+the same render. When the cache grows past EXPORT_CACHE_MAX_BYTES the least
+recently used artifacts are deleted.
+
+PowerPoint export needs python-pptx and PDF export needs reportlab; formats
+whose library isn't installed are reported by available_formats() and
+rejected with a 501. Slide images are read through the image proxy cache
+(see image_proxy.py), so only allowlisted hosts are ever fetched.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlparse
+
+import image_proxy
+import metrics
+
+try:
+    import pptx
+    from pptx.util import Inches, Pt
+except ImportError:
+    pptx = None
+
+try:
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas as pdf_canvas
+except ImportError:
+    pdf_canvas = None
+
+# Directory holding rendered artifacts
+EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "slide-export-cache"))
+# Total bytes of artifacts kept before least recently used ones are evicted
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Worker processes rendering artifacts, per web process
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", "2"))
+# Seconds a request waits for a render before giving up; keep it below the
+# gunicorn worker timeout (see gunicorn.conf.py)
+EXPORT_TIMEOUT = float(os.environ.get("EXPORT_TIMEOUT", "60"))
+# Largest presentation accepted for export
+MAX_EXPORT_SLIDES = int(os.environ.get("MAX_EXPORT_SLIDES", "200"))
+# Bump when rendering changes so cached artifacts are rebuilt
+RENDER_VERSION = 1
+
+# Format -> (MIME type, module needed to render it)
+FORMATS = {
+    'pptx': ('application/vnd.openxmlformats-officedocument.presentationml.presentation', 'python-pptx'),
+    'pdf': ('application/pdf', 'reportlab'),
+}
+
+# Width slide images are embedded at
+EXPORT_IMAGE_WIDTH = 640
+
+_executor = None
+_executor_lock = threading.Lock()
+# Renders in progress by artifact key, as (pool, future)
+_pending = {}
+_pending_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+class ExportError(Exception):
+    """Raised when a presentation can't be exported; status is the HTTP status to return."""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+def available_formats():
+    """Formats whose rendering library is installed."""
+    installed = {'pptx': pptx is not None, 'pdf': pdf_canvas is not None}
+    return [fmt for fmt in FORMATS if installed[fmt]]
+
+
+def normalize_presentation(presentation):
+    """
+    Validate a presentation and keep only the fields that are rendered.
+
+    Returns:
+        dict: {'title': str, 'slides': [{'title', 'content', 'image_url'}]}
+
+    Raises:
+        ExportError: If the presentation is malformed or too large
+    """
+    if not isinstance(presentation, dict) or not isinstance(presentation.get('slides'), list):
+        raise ExportError("Presentation must have a list of slides", 400)
+    if len(presentation['slides']) > MAX_EXPORT_SLIDES:
+        raise ExportError(f"Presentations are limited to {MAX_EXPORT_SLIDES} slides", 413)
+
+    slides = []
+    for slide in presentation['slides']:
+        if not isinstance(slide, dict):
+            raise ExportError("Each slide must be an object", 400)
+        content = slide.get('content') or []
+        if isinstance(content, str):
+            content = [content]
+        slides.append({
+            'title': str(slide.get('title') or ''),
+            'content': [str(item) for item in content],
+            'image_url': slide.get('image_url') if isinstance(slide.get('image_url'), str) else None
+        })
+    return {'title': str(presentation.get('title') or 'Presentation'), 'slides': slides}
+
+
+def artifact_key(presentation, fmt):
+    """Cache key of a normalized presentation rendered in a format."""
+    payload = json.dumps(presentation, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{RENDER_VERSION}:{fmt}:{payload}".encode('utf-8')).hexdigest()
+
+
+def download_name(title, fmt):
+    """File name offered to the browser for an artifact."""
+    name = re.sub(r'[^\w\-]+', '_', title).strip('_')[:80] or 'presentation'
+    return f"{name}.{fmt}"
+
+
+def _artifact_path(key, fmt):
+    return os.path.join(EXPORT_CACHE_DIR, f"{key}.{fmt}")
+
+
+def _get_executor():
+    """Return the render pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Spawned rather than forked, so renderers don't inherit the
+                # web process's threads, sockets and database connections
+                _executor = ProcessPoolExecutor(max_workers=EXPORT_WORKERS,
+                                                mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def _reset_executor(broken):
+    """Drop a pool whose worker died so the next export starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _submit(fn, *args):
+    """
+    Submit a render to the pool, replacing the pool once if it is broken.
+    Returns the pool and the render's future.
+
+    A worker can die after every request waiting on it has timed out, so
+    the crash only surfaces on the next submit.
+
+    Raises:
+        ExportError: If a fresh pool cannot accept the render either
+    """
+    executor = _get_executor()
+    try:
+        return executor, executor.submit(fn, *args)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+    executor = _get_executor()
+    try:
+        return executor, executor.submit(fn, *args)
+    except BrokenProcessPool as e:
+        logging.error("Export pool unavailable: %s", e)
+        raise ExportError("Export worker crashed")
+
+
+def _image_path(image_url):
+    """Local path of a slide image from the image proxy cache, or None."""
+    if not image_url:
+        return None
+    width = EXPORT_IMAGE_WIDTH
+    if image_url.startswith('/api/image?'):
+        query = parse_qs(urlparse(image_url).query)
+        image_url = query.get('url', [''])[0]
+        width = int(query['w'][0]) if query.get('w', [''])[0].isdigit() else width
+    try:
+        path, content_type, _ = image_proxy.get_image(image_url, width)
+    except image_proxy.ImageProxyError as e:
+        logging.warning("Skipping slide image %s: %s", image_url, e)
+        return None
+    # Neither renderer can embed vector images
+    return None if content_type == 'image/svg+xml' else path
+
+
+def _render_pptx(presentation, path):
+    deck = pptx.Presentation()
+    deck.slide_width = Inches(13.333)
+    deck.slide_height = Inches(7.5)
+
+    title_slide = deck.slides.add_slide(deck.slide_layouts[0])
+    title_slide.shapes.title.text = presentation['title']
+    title_slide.placeholders[1].text = f"{len(presentation['slides'])} slides"
+
+    for slide in presentation['slides']:
+        page = deck.slides.add_slide(deck.slide_layouts[1])
+        page.shapes.title.text = slide['title']
+        body = page.placeholders[1]
+        image_path = _image_path(slide['image_url'])
+        if image_path:
+            # Text on the left half, image on the right
+            body.left, body.top, body.width, body.height = Inches(0.6), Inches(1.6), Inches(6.4), Inches(5.4)
+            try:
+                page.shapes.add_picture(image_path, Inches(7.3), Inches(1.8), width=Inches(5.4))
+            except Exception as e:
+                logging.warning("Could not embed slide image: %s", e)
+        text_frame = body.text_frame
+        for index, item in enumerate(slide['content']):
+            paragraph = text_frame.paragraphs[0] if index == 0 else text_frame.add_paragraph()
+            paragraph.text = item
+            paragraph.font.size = Pt(20)
+    deck.save(path)
+
+
+def _render_pdf(presentation, path):
+    # 16:9 pages, in points
+    width, height = 960, 540
+    margin = 48
+    document = pdf_canvas.Canvas(path, pagesize=(width, height))
+    document.setTitle(presentation['title'])
+
+    document.setFont('Helvetica-Bold', 36)
+    lines = simpleSplit(presentation['title'], 'Helvetica-Bold', 36, width - 2 * margin)
+    y = height / 2 + len(lines) * 22
+    for line in lines:
+        document.drawCentredString(width / 2, y, line)
+        y -= 44
+    document.showPage()
+
+    for number, slide in enumerate(presentation['slides'], 1):
+        document.setFont('Helvetica-Bold', 26)
+        document.drawString(margin, height - margin - 26, slide['title'][:90])
+
+        text_width = width - 2 * margin
+        image_path = _image_path(slide['image_url'])
+        if image_path:
+            text_width = width / 2 - margin
+            try:
+                document.drawImage(image_path, width / 2 + margin / 2, margin, width=width / 2 - 1.5 * margin,
+                                   height=height - 3 * margin - 26, preserveAspectRatio=True, anchor='c')
+            except Exception as e:
+                logging.warning("Could not embed slide image: %s", e)
+
+        y = height - 2 * margin - 40
+        document.setFont('Helvetica', 16)
+        for item in slide['content']:
+            for index, line in enumerate(simpleSplit(item, 'Helvetica', 16, text_width - 18)):
+                if y < margin:
+                    break
+                if index == 0:
+                    document.drawString(margin, y, '•')
+                document.drawString(margin + 18, y, line)
+                y -= 22
+            y -= 8
+
+        document.setFont('Helvetica', 10)
+        document.drawRightString(width - margin / 2, margin / 2, str(number))
+        document.showPage()
+    document.save()
+
+
+def render_artifact(presentation, fmt, path):
+    """
+    Render a normalized presentation to path. Runs in a render process.
+
+    The file is written next to path and moved into place when complete, so
+    a partially rendered artifact is never served.
+
+    Returns:
+        int: Size of the artifact in bytes
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if fmt == 'pptx':
+            _render_pptx(presentation, temporary_path)
+        else:
+            _render_pdf(presentation, temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return os.path.getsize(path)
+
+
+def _evict():
+    """Delete least recently used artifacts until the cache is 90% of its limit."""
+    with _evict_lock:
+        try:
+            names = os.listdir(EXPORT_CACHE_DIR)
+        except OSError:
+            return
+        files = []
+        for name in names:
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(EXPORT_CACHE_DIR, name)
+            try:
+                files.append((path, os.stat(path)))
+            except OSError:
+                continue
+        total = sum(stat.st_size for _, stat in files)
+        if total <= EXPORT_CACHE_MAX_BYTES:
+            return
+        target = EXPORT_CACHE_MAX_BYTES * 0.9
+        for path, stat in sorted(files, key=lambda item: item[1].st_mtime):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= stat.st_size
+            logging.info("Evicted export %s", os.path.basename(path))
+
+
+def get_artifact(presentation, fmt):
+    """
+    Return the path and cache key of a presentation's artifact, rendering it if needed.
+
+    Args:
+        presentation (dict): Presentation with a title and slides
+        fmt (str): 'pptx' or 'pdf'
+
+    Returns:
+        tuple: (path, key)
+
+    Raises:
+        ExportError: If the format is unavailable, the presentation is
+            invalid, or rendering failed or timed out
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown export format: {fmt}", 404)
+    if fmt not in available_formats():
+        raise ExportError(f"{fmt.upper()} export requires {FORMATS[fmt][1]}, which is not installed", 501)
+
+    presentation = normalize_presentation(presentation)
+    key = artifact_key(presentation, fmt)
+    path = _artifact_path(key, fmt)
+    if os.path.exists(path):
+        try:
+            # Mark the artifact as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        metrics.count_cache('exports', 'hits')
+        return path, key
+    metrics.count_cache('exports', 'misses')
+
+    # Concurrent requests for the same artifact wait for a single render
+    with _pending_lock:
+        executor, future = _pending.get(key, (None, None))
+        if future is None:
+            executor, future = _submit(render_artifact, presentation, fmt, path)
+            future.add_done_callback(lambda _, key=key: _forget(key))
+            _pending[key] = executor, future
+
+    try:
+        with metrics.stage('export', fmt):
+            size = future.result(timeout=EXPORT_TIMEOUT)
+    except FutureTimeoutError:
+        raise ExportError("Export is taking too long; try again shortly", 504)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        raise ExportError("Export worker crashed")
+    except Exception as e:
+        logging.error("Error exporting presentation to %s: %s", fmt, e)
+        raise ExportError(f"Error exporting presentation: {str(e)}")
+
+    logging.info("Rendered %s export %s (%s bytes)", fmt, key[:12], size)
+    _evict()
+    return path, key
+
+
+def _forget(key):
+    with _pending_lock:
+        _pending.pop(key, None)
+
+
+def deck_export_url(deck_id, fmt='pptx'):
+    """URL that downloads a stored slide deck's artifact."""
+    return f"/api/slide-deck/{deck_id}/export/{fmt}"
+
+
+def send_artifact(path, key, fmt, title):
+    """
+    Stream an artifact to the browser as a download. Must be called inside a request.
+
+    The file is sent in chunks rather than read into memory, with an ETag
+    and range support so interrupted downloads of large decks can resume.
+    """
+    from flask import send_file
+
+    response = send_file(path, mimetype=FORMATS[fmt][0], as_attachment=True,
+                         download_name=download_name(title, fmt), etag=key, conditional=True, max_age=0)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,154 @@
+"""
+Shared, bounded thread pool for slow upstream fetches.
+
+The slide pipelines call several independent upstream services (the pytube
+metadata scrape, the transcript API, OpenAI). Running them on this pool lets a
+request wait on all of them at once instead of one after the other, while
+the pool size caps how many upstream calls a single process makes at a time.
+
+A call that misses its deadline is abandoned, but the thread running it
+can't be stopped, and pytube and youtube_transcript_api don't let callers set
+a socket timeout. Abandoned calls that are still running are therefore
+counted, and once FETCH_MAX_ABANDONED of them are stuck, new calls are
+refused at once instead of queueing behind them and waiting out their whole
+deadline. The pool recovers as the stuck calls finish.
+"""
+import os
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import metrics
+
+# Maximum number of upstream calls in flight per process
+FETCH_POOL_SIZE = int(os.environ.get("FETCH_POOL_SIZE", "8"))
+# Seconds to wait for a single upstream call before falling back
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "20"))
+# Abandoned calls still running at which new calls are refused
+FETCH_MAX_ABANDONED = int(os.environ.get("FETCH_MAX_ABANDONED", str(max(1, FETCH_POOL_SIZE // 2))))
+
+_executor = None
+_executor_lock = threading.Lock()
+# Calls that timed out and are still running
+_abandoned = set()
+_abandoned_lock = threading.Lock()
+
+
+class FetchRefused(Exception):
+    """Raised by a call submitted while too many abandoned calls are still running."""
+
+
+def get_executor():
+    """Return the process-wide executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FETCH_POOL_SIZE,
+                                               thread_name_prefix="upstream-fetch")
+    return _executor
+
+
+def in_app_context(fn):
+    """
+    Wrap fn so it runs inside the caller's Flask application context, if any.
+
+    Use this when handing work to another thread, so the database-backed
+    caches stay available to it.
+    """
+    try:
+        from flask import current_app, has_app_context
+    except ImportError:
+        return fn
+
+    if not has_app_context():
+        return fn
+
+    app = current_app._get_current_object()
+
+    def run_in_app_context(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    return run_in_app_context
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the shared pool.
+
+    If called inside a Flask application context, the call runs inside the
+    same application so the database-backed caches stay available to it.
+    It also sees the caller's context variables, so the stages it times are
+    reported with the caller's request (see metrics.py).
+
+    While FETCH_MAX_ABANDONED abandoned calls are still running, the call
+    isn't run and the returned future raises FetchRefused.
+    """
+    with _abandoned_lock:
+        stuck = len(_abandoned)
+    if stuck >= FETCH_MAX_ABANDONED:
+        future = Future()
+        future.set_exception(FetchRefused(f"{stuck} timed out upstream calls are still running"))
+        return future
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, in_app_context(fn), *args, **kwargs)
+
+
+def _abandon(future):
+    if future.cancel():
+        return
+    with _abandoned_lock:
+        _abandoned.add(future)
+
+    def finished(done):
+        with _abandoned_lock:
+            _abandoned.discard(done)
+
+    # Runs at once if the call finished in the meantime
+    future.add_done_callback(finished)
+
+
+def wait_for(future, timeout, default, description):
+    """
+    Wait for a submitted call, returning default if it doesn't finish in time
+    or was refused.
+
+    Args:
+        future (Future): Result of submit()
+        timeout (float): Seconds to wait; values below zero are treated as zero
+        default: Value returned when the call times out
+        description (str): What the call fetches, for logging
+
+    Returns:
+        The call's result, or default on timeout or refusal
+    """
+    try:
+        return future.result(timeout=max(timeout, 0))
+    except FutureTimeoutError:
+        _abandon(future)
+        metrics.FETCH_TIMEOUTS.inc(description)
+        logging.warning("Timed out after %.1fs waiting for %s", timeout, description)
+        return default
+    except FetchRefused as e:
+        metrics.FETCH_REFUSED.inc(description)
+        logging.warning("Not fetching %s: %s", description, e)
+        return default
+
+
+def cancel(*futures):
+    """Cancel calls whose results are no longer needed, if they haven't started."""
+    for future in futures:
+        future.cancel()
+
+
+class Deadline:
+    """Tracks the time left for a group of calls that share one budget."""
+
+    def __init__(self, seconds=FETCH_TIMEOUT):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0)
@@ -0,0 +1,43 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts in this directory.
+
+    gunicorn                    # serves wsgi:app with these settings
+    gunicorn -c gunicorn.conf.py --workers 8
+
+With preloading on (the default), the master process imports and creates the
+app once, imports the modules requests otherwise load on first use, and then
+forks the workers, which share all of it copy-on-write. Workers start in
+milliseconds instead of each importing the app, and a worker gunicorn
+replaces is serving again almost at once. Turn it off with
+GUNICORN_PRELOAD=0 to reload application code on a HUP without restarting
+the master.
+
+Workers are threaded. Some requests wait for a long time: exports wait for
+the renderer, streamed slide decks and batch streams stay open while decks
+are generated, and duplicate generations wait for the first one to finish.
+Each of those holds one thread rather than a whole worker. A threaded
+worker checks in with the master between requests, so the timeout restarts
+workers that hang, not ones serving a slow request; the waits are still
+bounded below it (EXPORT_TIMEOUT, PRESENTATION_COALESCE_TIMEOUT and
+BATCH_STREAM_WINDOW), so a sync worker, e.g. with --worker-class sync,
+isn't killed mid-response either.
+"""
+import os
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "gthread"
+# Requests each worker serves at once
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+# Seconds a worker may stop responding before it is restarted; keep it above
+# the longest wait a request makes
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").lower() not in ("0", "false", "no")
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    if server.cfg.preload_app:
+        import startup
+        startup.preload()
@@ -0,0 +1,399 @@
+"""
+Pixel comparison of two images.
+
+Both images are decoded straight to grayscale at a reduced size (JPEG
+scans are decoded at 1/2 to 1/8 scale by the decoder itself), then
+compared on a pyramid built by 2x2 averaging:
+
+1. Identical bytes are reported without decoding anything.
+2. The pyramid is compared from the coarsest level to the finest; if no
+   level differs by more than IDENTICAL_TOLERANCE the images are reported
+   identical and SSIM is skipped.
+3. Otherwise SSIM is computed per TILE_SIZE tile at the SSIM_SIZE level,
+   giving a heatmap of how much each tile changed. Connected changed tiles
+   are merged into regions.
+
+A perceptual hash (DCT of a 32x32 thumbnail) is reported alongside, to
+spot images that are the same picture re-encoded or resized.
+
+Results are cached per pair of content hashes, in each worker's memory and
+in the image_diffs table. Saving a comparison copies the cached result into
+SavedComparison.results_json (see app.save_comparison).
+
+Decoding needs Pillow and the comparison needs NumPy.
+"""
+import os
+import hashlib
+import logging
+import time
+from datetime import datetime
+from io import BytesIO
+
+import metrics
+from video_metadata import TTLCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Longest side, in pixels, images are compared at
+ANALYSIS_SIZE = int(os.environ.get("IMAGE_DIFF_ANALYSIS_SIZE", "1024"))
+# Longest side of the pyramid level SSIM is computed on; smaller is faster but
+# misses changes to small print
+SSIM_SIZE = int(os.environ.get("IMAGE_DIFF_SSIM_SIZE", "1024"))
+# Side of the square tiles SSIM and the heatmap are computed over
+TILE_SIZE = 16
+# Coarsest pyramid level, longest side in pixels
+MIN_LEVEL_SIZE = 32
+# Largest difference (0-255 gray levels) between pixels still considered equal
+IDENTICAL_TOLERANCE = 2.0
+# Tile dissimilarity, (1 - SSIM) / 2, above which a tile counts as changed
+CHANGE_THRESHOLD = float(os.environ.get("IMAGE_DIFF_CHANGE_THRESHOLD", "0.05"))
+# Most regions reported
+MAX_REGIONS = 20
+# Largest image accepted, in bytes and in pixels
+MAX_IMAGE_BYTES = int(os.environ.get("IMAGE_DIFF_MAX_BYTES", str(50 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = 80_000_000
+# Maximum number of results held in each worker's in-process cache
+LOCAL_CACHE_SIZE = int(os.environ.get("IMAGE_DIFF_CACHE_SIZE", "256"))
+# Seconds a result stays in the in-process cache
+LOCAL_CACHE_TTL = 3600
+# Bump when the comparison changes so stored results are recomputed
+DIFF_VERSION = 1
+
+# SSIM stabilizing constants for 8-bit images
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+_local_cache = TTLCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+_dct_matrix = None
+
+
+class ImageDiffError(Exception):
+    """Raised when images can't be compared; status is the HTTP status to return."""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _pair_key(hash_a, hash_b):
+    return f"{hash_a}:{hash_b}"
+
+
+def _decode(data, size=None):
+    """
+    Decode an image to a grayscale array whose longest side is at most ANALYSIS_SIZE.
+
+    Args:
+        data (bytes): Encoded image
+        size (tuple, optional): Exact (width, height) to resize to
+
+    Returns:
+        tuple: (array, original (width, height))
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            original_size = image.size
+            if original_size[0] * original_size[1] > MAX_IMAGE_PIXELS:
+                raise ImageDiffError("Image has too many pixels", 413)
+            target = size or _fit(original_size, ANALYSIS_SIZE)
+            # JPEG decodes straight to a smaller scale, skipping most of the work
+            image.draft('L', target)
+            image = image.convert('L')
+            # Cheap integer-factor reduction first, then an exact resize
+            factor = min(image.size[0] // target[0], image.size[1] // target[1])
+            if factor > 1:
+                image = image.reduce(factor)
+            if image.size != target:
+                image = image.resize(target, Image.BILINEAR)
+            return np.asarray(image, dtype=np.float32), original_size
+    except ImageDiffError:
+        raise
+    except Exception as e:
+        raise ImageDiffError(f"Could not read image: {str(e)}")
+
+
+def _fit(size, longest):
+    width, height = size
+    scale = min(1.0, longest / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _downsample(array):
+    """Halve an array by averaging 2x2 blocks, dropping an odd last row or column."""
+    height, width = array.shape[0] // 2 * 2, array.shape[1] // 2 * 2
+    return array[:height, :width].reshape(height // 2, 2, width // 2, 2).mean(axis=(1, 3))
+
+
+def _pyramid(array):
+    """Levels from the analysis size down to MIN_LEVEL_SIZE, finest first."""
+    levels = [array]
+    while max(levels[-1].shape) // 2 >= MIN_LEVEL_SIZE:
+        levels.append(_downsample(levels[-1]))
+    return levels
+
+
+def _phash(array):
+    """64-bit perceptual hash: signs of the 8x8 lowest DCT frequencies of a 32x32 thumbnail."""
+    global _dct_matrix
+    if _dct_matrix is None:
+        n = np.arange(32)
+        _dct_matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64)
+    thumbnail = np.asarray(Image.fromarray(array.astype(np.uint8)).resize((32, 32), Image.BOX), dtype=np.float64)
+    low = (_dct_matrix @ thumbnail @ _dct_matrix.T)[:8, :8].flatten()
+    # The DC term only reflects overall brightness
+    bits = low[1:] > np.median(low[1:])
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def _tiled_ssim(a, b):
+    """SSIM of each TILE_SIZE x TILE_SIZE tile, as a rows x columns array."""
+    rows, columns = a.shape[0] // TILE_SIZE, a.shape[1] // TILE_SIZE
+    shape = (rows, TILE_SIZE, columns, TILE_SIZE)
+    tiles_a = a[:rows * TILE_SIZE, :columns * TILE_SIZE].reshape(shape)
+    tiles_b = b[:rows * TILE_SIZE, :columns * TILE_SIZE].reshape(shape)
+
+    mean_a = tiles_a.mean(axis=(1, 3))
+    mean_b = tiles_b.mean(axis=(1, 3))
+    centered_a = tiles_a - mean_a[:, None, :, None]
+    centered_b = tiles_b - mean_b[:, None, :, None]
+    variance_a = (centered_a ** 2).mean(axis=(1, 3))
+    variance_b = (centered_b ** 2).mean(axis=(1, 3))
+    covariance = (centered_a * centered_b).mean(axis=(1, 3))
+
+    return (((2 * mean_a * mean_b + _C1) * (2 * covariance + _C2))
+            / ((mean_a ** 2 + mean_b ** 2 + _C1) * (variance_a + variance_b + _C2)))
+
+
+def _tiled_ssim_single(a, b):
+    """SSIM of a whole array as one tile, for arrays smaller than a tile."""
+    mean_a, mean_b = a.mean(), b.mean()
+    covariance = ((a - mean_a) * (b - mean_b)).mean()
+    value = (((2 * mean_a * mean_b + _C1) * (2 * covariance + _C2))
+             / ((mean_a ** 2 + mean_b ** 2 + _C1) * (a.var() + b.var() + _C2)))
+    return np.array([[value]])
+
+
+def _regions(changed, dissimilarity):
+    """Bounding boxes, as fractions of the tile grid, of connected changed tiles."""
+    rows, columns = changed.shape
+    seen = np.zeros_like(changed)
+    regions = []
+    for row, column in zip(*(indices.tolist() for indices in np.nonzero(changed))):
+        if seen[row, column]:
+            continue
+        seen[row, column] = True
+        stack = [(row, column)]
+        top, left, bottom, right = row, column, row, column
+        peak = 0.0
+        while stack:
+            r, c = stack.pop()
+            top, left, bottom, right = min(top, r), min(left, c), max(bottom, r), max(right, c)
+            peak = max(peak, float(dissimilarity[r, c]))
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < rows and 0 <= nc < columns and changed[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    stack.append((nr, nc))
+        regions.append({
+            'x': round(left / columns, 4),
+            'y': round(top / rows, 4),
+            'width': round((right - left + 1) / columns, 4),
+            'height': round((bottom - top + 1) / rows, 4),
+            'score': round(peak, 3)
+        })
+    regions.sort(key=lambda region: region['width'] * region['height'], reverse=True)
+    return regions[:MAX_REGIONS]
+
+
+def diff_images(data_a, data_b, hash_a=None, hash_b=None):
+    """
+    Compare two encoded images.
+
+    Returns:
+        dict: identical, ssim, changedFraction, regions, heatmap (tile grid of
+        dissimilarity from 0 to 1), phash, pyramid (mean difference per
+        level), sizes, and how long the comparison took
+
+    Raises:
+        ImageDiffError: If either image can't be decoded
+    """
+    started = time.perf_counter()
+    hash_a = hash_a or content_hash(data_a)
+    hash_b = hash_b or content_hash(data_b)
+    result = {
+        'version': DIFF_VERSION,
+        'hashes': {'a': hash_a, 'b': hash_b},
+        'identical': False,
+        'earlyExit': False,
+        'ssim': 1.0,
+        'changedFraction': 0.0,
+        'regions': [],
+        'heatmap': None,
+        'pyramid': []
+    }
+
+    if hash_a == hash_b:
+        result.update(identical=True, earlyExit=True)
+        result['elapsedMs'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    array_a, size_a = _decode(data_a)
+    # B is brought to A's analysis size so the pixel grids line up
+    array_b, size_b = _decode(data_b, (array_a.shape[1], array_a.shape[0]))
+    result['sizes'] = {'a': list(size_a), 'b': list(size_b)}
+    result['aspectMismatch'] = abs(size_a[0] / size_a[1] - size_b[0] / size_b[1]) > 0.01
+
+    phash_a, phash_b = _phash(array_a), _phash(array_b)
+    result['phash'] = {'a': f"{phash_a:016x}", 'b': f"{phash_b:016x}",
+                       'distance': bin(phash_a ^ phash_b).count('1')}
+
+    pyramid_a, pyramid_b = _pyramid(array_a), _pyramid(array_b)
+    differs = False
+    for level_a, level_b in zip(reversed(pyramid_a), reversed(pyramid_b)):
+        difference = np.abs(level_a - level_b)
+        result['pyramid'].append({'width': level_a.shape[1], 'height': level_a.shape[0],
+                                  'meanDifference': round(float(difference.mean()), 3)})
+        if difference.max() > IDENTICAL_TOLERANCE:
+            # Finer levels can only differ more; no need to keep scanning
+            differs = True
+            break
+
+    if not differs:
+        result.update(identical=True, earlyExit=True)
+        result['elapsedMs'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    level = next((index for index, level_a in enumerate(pyramid_a) if max(level_a.shape) <= SSIM_SIZE),
+                 len(pyramid_a) - 1)
+    ssim = _tiled_ssim(pyramid_a[level], pyramid_b[level])
+    if ssim.size == 0:
+        # Images too small to tile; fall back to a single tile over the whole level
+        ssim = _tiled_ssim_single(pyramid_a[level], pyramid_b[level])
+    dissimilarity = np.clip((1 - ssim.astype(np.float64)) / 2, 0, 1)
+    changed = dissimilarity > CHANGE_THRESHOLD
+
+    result['ssim'] = round(float(ssim.mean()), 4)
+    result['changedFraction'] = round(float(changed.mean()), 4)
+    result['regions'] = _regions(changed, dissimilarity)
+    result['heatmap'] = {
+        'rows': int(ssim.shape[0]),
+        'columns': int(ssim.shape[1]),
+        'values': np.round(dissimilarity, 3).tolist()
+    }
+    result['elapsedMs'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _store_available():
+    try:
+        from flask import has_app_context
+        return has_app_context()
+    except ImportError:
+        return False
+
+
+def _load_shared(key):
+    if not _store_available():
+        return None
+
+    from sqlalchemy import select
+    from app import db
+    from models import ImageDiff
+    import json_codec
+
+    table = ImageDiff.__table__
+    try:
+        with db.engine.connect() as conn:
+            blob = conn.execute(
+                select(table.c.result).where(table.c.pair_key == key, table.c.diff_version == DIFF_VERSION)
+            ).scalar()
+    except Exception as e:
+        logging.error("Error reading image diff cache: %s", e)
+        return None
+    return json_codec.decode(blob) if blob is not None else None
+
+
+def _store_shared(key, result):
+    if not _store_available():
+        return
+
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from models import ImageDiff
+
+    table = ImageDiff.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.pair_key == key))
+            conn.execute(table.insert().values(
+                pair_key=key,
+                diff_version=DIFF_VERSION,
+                result=result,
+                created_at=datetime.now()
+            ))
+    except IntegrityError:
+        pass
+    except Exception as e:
+        logging.error("Error writing image diff cache: %s", e)
+
+
+def get_cached(hash_a, hash_b):
+    """Return the stored result for a pair of content hashes, or None."""
+    key = _pair_key(hash_a, hash_b)
+    result = _local_cache.get(key)
+    if result is None:
+        result = _load_shared(key)
+        if result is not None:
+            _local_cache.set(key, result)
+    return result
+
+
+def compare(data_a, data_b, hash_a=None, hash_b=None):
+    """
+    Compare two encoded images, reusing the stored result for the same pair.
+
+    Args:
+        data_a (bytes): First image; a memory-mapped stored document works
+            too (see blob_store.py)
+        data_b (bytes): Second image
+        hash_a (str, optional): SHA-256 of data_a, if already known
+        hash_b (str, optional): SHA-256 of data_b, if already known
+
+    Returns:
+        tuple: (result, whether it came from a cache)
+
+    Raises:
+        ImageDiffError: If the images are missing, too large or unreadable,
+            or Pillow or NumPy isn't installed
+    """
+    if not data_a or not data_b:
+        raise ImageDiffError("Two images are required", 400)
+    if len(data_a) > MAX_IMAGE_BYTES or len(data_b) > MAX_IMAGE_BYTES:
+        raise ImageDiffError("Image too large", 413)
+    if np is None or Image is None:
+        raise ImageDiffError("Image comparison requires numpy and Pillow, which are not installed", 501)
+
+    hash_a = hash_a or content_hash(data_a)
+    hash_b = hash_b or content_hash(data_b)
+    result = get_cached(hash_a, hash_b)
+    metrics.count_cache('image_diffs', 'hits' if result is not None else 'misses')
+    if result is not None:
+        return result, True
+
+    with metrics.stage('comparison', 'image_diff'):
+        result = diff_images(data_a, data_b, hash_a, hash_b)
+    key = _pair_key(hash_a, hash_b)
+    _local_cache.set(key, result)
+    _store_shared(key, result)
+    return result, False
@@ -0,0 +1,358 @@
+"""
+Local proxy and resize cache for slide images.
+
+Slides reference thumbnails and placeholder images on third-party hosts.
+Presentations are rewritten to point at /api/image instead, which fetches
+each image once and keeps it in a content-addressed cache on disk:
+
+    objects/<sha256 of image>              original bytes
+    variants/<sha256 of image>-<width>     resized copies
+    urls/<sha256 of source URL>            content hash and type of the URL's image
+
+Identical images fetched from different URLs are stored once. When the cache
+grows past IMAGE_CACHE_MAX_BYTES the least recently used files are deleted.
+Only images from ALLOWED_HOSTS are proxied.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from io import BytesIO
+from urllib.parse import quote, urljoin, urlparse
+
+import metrics
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Directory holding the image cache
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "slide-image-cache"))
+# Total bytes the cache may hold before least recently used files are evicted
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Largest upstream image fetched, in bytes
+MAX_IMAGE_BYTES = int(os.environ.get("IMAGE_PROXY_MAX_BYTES", str(10 * 1024 * 1024)))
+# Seconds to wait for an upstream image
+FETCH_TIMEOUT = float(os.environ.get("IMAGE_PROXY_TIMEOUT", "10"))
+# Redirects followed when fetching an image
+MAX_REDIRECTS = 3
+# Seconds browsers may cache proxied images
+BROWSER_MAX_AGE = int(os.environ.get("IMAGE_PROXY_MAX_AGE", str(7 * 24 * 3600)))
+
+# Hosts whose images may be proxied
+ALLOWED_HOSTS = frozenset({
+    'img.youtube.com',
+    'i.ytimg.com',
+    'source.unsplash.com',
+    'images.unsplash.com',
+    'placehold.co',
+})
+
+# Widths served; requests are rounded up to the nearest so the variants stay bounded
+SLIDE_WIDTHS = (320, 640, 1280)
+# Width slide images are displayed at
+SLIDE_IMAGE_WIDTH = 640
+
+# URL hash -> Future of the fetch in progress for it
+_fetches = {}
+_fetches_lock = threading.Lock()
+_cache_bytes = None
+_cache_bytes_lock = threading.Lock()
+
+
+class ImageProxyError(Exception):
+    """Raised when an image can't be proxied; status is the HTTP status to return."""
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+def is_proxyable(url):
+    if not isinstance(url, str):
+        return False
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and parsed.hostname in ALLOWED_HOSTS
+
+
+def snap_width(width):
+    """Round a requested width up to a served width, or None for the original."""
+    if not width:
+        return None
+    for served in SLIDE_WIDTHS:
+        if width <= served:
+            return served
+    return None
+
+
+def proxy_url(url, width=None):
+    """
+    Return the proxy URL for an image, or url unchanged if it can't be proxied.
+
+    Args:
+        url (str): Upstream image URL
+        width (int, optional): Display width in pixels
+    """
+    if not is_proxyable(url):
+        return url
+    proxied = f"/api/image?url={quote(url, safe='')}"
+    width = snap_width(width)
+    if width:
+        proxied += f"&w={width}"
+    return proxied
+
+
+def rewrite_slide(slide, width=SLIDE_IMAGE_WIDTH):
+    """Point a slide's image at the proxy, sized for the slide."""
+    if slide.get("image_url"):
+        slide["image_url"] = proxy_url(slide["image_url"], width)
+    return slide
+
+
+def rewrite_presentation(presentation):
+    """Point every image in a presentation dict at the proxy, in place."""
+    for slide in presentation.get("slides", []):
+        rewrite_slide(slide)
+    metadata = presentation.get("video_metadata")
+    if metadata and metadata.get("thumbnail_url"):
+        metadata["thumbnail_url"] = proxy_url(metadata["thumbnail_url"])
+    return presentation
+
+
+def _path(*parts):
+    return os.path.join(IMAGE_CACHE_DIR, *parts)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+    _account(len(data))
+
+
+def _touch(path):
+    """Mark a cached file as recently used."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _iter_cache_files():
+    for directory, _, files in os.walk(IMAGE_CACHE_DIR):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat
+
+
+def _account(added):
+    """Track the cache size, evicting once it passes the limit."""
+    global _cache_bytes
+    with _cache_bytes_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(stat.st_size for _, stat in _iter_cache_files())
+        else:
+            _cache_bytes += added
+        if _cache_bytes > IMAGE_CACHE_MAX_BYTES:
+            _cache_bytes = _evict()
+
+
+def _evict():
+    """Delete least recently used files until the cache is 90% of its limit."""
+    files = sorted(_iter_cache_files(), key=lambda item: item[1].st_mtime)
+    total = sum(stat.st_size for _, stat in files)
+    target = IMAGE_CACHE_MAX_BYTES * 0.9
+    evicted = 0
+    for path, stat in files:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= stat.st_size
+        evicted += 1
+    logging.info("Evicted %s files from the image cache", evicted)
+    return total
+
+
+def _read_url_entry(url_key):
+    try:
+        with open(_path('urls', url_key)) as f:
+            digest, content_type = f.read().split('\n', 1)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(_path('objects', digest)):
+        return None
+    return digest, content_type
+
+
+def _fetch(url):
+    """Download an image, returning (bytes, content type)."""
+    import requests
+
+    # Follow redirects by hand so every hop is checked against ALLOWED_HOSTS
+    for _ in range(MAX_REDIRECTS + 1):
+        try:
+            response = requests.get(url, timeout=FETCH_TIMEOUT, stream=True, allow_redirects=False)
+        except requests.RequestException as e:
+            raise ImageProxyError(f"Error fetching image: {str(e)}")
+        if not response.is_redirect:
+            break
+        url = urljoin(url, response.headers.get('Location', ''))
+        response.close()
+        if not is_proxyable(url):
+            raise ImageProxyError("Image redirected to a host that isn't allowed", 403)
+    else:
+        raise ImageProxyError("Too many redirects")
+
+    with response:
+        if response.status_code != 200:
+            raise ImageProxyError(f"Upstream returned {response.status_code}", 502 if response.status_code >= 500 else 404)
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if not content_type.startswith('image/'):
+            raise ImageProxyError(f"Upstream returned {content_type or 'no content type'}, not an image")
+
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise ImageProxyError("Image too large", 413)
+            chunks.append(chunk)
+    return b''.join(chunks), content_type
+
+
+def get_original(url):
+    """
+    Return (content hash, content type) of a URL's image, fetching it on first use.
+
+    Raises:
+        ImageProxyError: If the URL isn't allowed or the fetch failed
+    """
+    if not is_proxyable(url):
+        raise ImageProxyError("Image host not allowed", 403)
+
+    url_key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    entry = _read_url_entry(url_key)
+    if entry is not None:
+        metrics.count_cache('images', 'hits')
+        return entry
+
+    # Concurrent requests for the same URL wait for a single fetch
+    with _fetches_lock:
+        fetch = _fetches.get(url_key)
+        is_leader = fetch is None
+        if is_leader:
+            fetch = _fetches[url_key] = Future()
+    if not is_leader:
+        try:
+            # Long enough for the leader to follow every redirect
+            return fetch.result(timeout=(MAX_REDIRECTS + 1) * FETCH_TIMEOUT)
+        except FutureTimeoutError:
+            raise ImageProxyError("Timed out fetching image", 504)
+
+    try:
+        entry = _read_url_entry(url_key)
+        if entry is not None:
+            metrics.count_cache('images', 'hits')
+        else:
+            metrics.count_cache('images', 'misses')
+            try:
+                with metrics.stage('image_proxy', 'fetch'):
+                    data, content_type = _fetch(url)
+            except ImageProxyError:
+                metrics.count_upstream_error('image_host')
+                raise
+            digest = hashlib.sha256(data).hexdigest()
+            if not os.path.exists(_path('objects', digest)):
+                _write_atomic(_path('objects', digest), data)
+            _write_atomic(_path('urls', url_key), f"{digest}\n{content_type}".encode('utf-8'))
+            entry = digest, content_type
+        fetch.set_result(entry)
+        return entry
+    except BaseException as e:
+        fetch.set_exception(e)
+        raise
+    finally:
+        # Requests arriving from now on find the entry on disk
+        with _fetches_lock:
+            _fetches.pop(url_key, None)
+
+
+def get_image(url, width=None):
+    """
+    Return the path, content type and ETag of a cached image at a served width.
+
+    Resizing needs Pillow; without it, or for images no wider than the
+    requested width, the original is returned.
+    """
+    digest, content_type = get_original(url)
+    original_path = _path('objects', digest)
+    width = snap_width(width)
+    if width is None or Image is None:
+        _touch(original_path)
+        return original_path, content_type, digest
+
+    variant_path = _path('variants', f"{digest}-{width}")
+    if os.path.exists(variant_path):
+        _touch(variant_path)
+        return variant_path, _variant_type(content_type), f"{digest}-{width}"
+
+    try:
+        with Image.open(original_path) as image:
+            if image.width <= width:
+                _touch(original_path)
+                return original_path, content_type, digest
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            if content_type == 'image/png':
+                resized.save(buffer, 'PNG', optimize=True)
+            else:
+                resized.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    except Exception as e:
+        logging.error("Error resizing image %s: %s", digest, e)
+        _touch(original_path)
+        return original_path, content_type, digest
+
+    _write_atomic(variant_path, buffer.getvalue())
+    return variant_path, _variant_type(content_type), f"{digest}-{width}"
+
+
+def _variant_type(content_type):
+    return 'image/png' if content_type == 'image/png' else 'image/jpeg'
+
+
+def send_image(url, width=None):
+    """
+    Serve a proxied image. Must be called inside a request.
+
+    Raises:
+        ImageProxyError: If the image can't be served
+    """
+    from flask import Response, request, send_file
+
+    path, content_type, etag = get_image(url, width)
+    headers = {
+        'Cache-Control': f'public, max-age={BROWSER_MAX_AGE}',
+        'ETag': f'"{etag}"',
+        # Upstream SVGs are served from our origin; never let them run scripts
+        'Content-Security-Policy': "default-src 'none'; style-src 'unsafe-inline'",
+        'X-Content-Type-Options': 'nosniff'
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    response = send_file(path, mimetype=content_type, conditional=False, etag=False)
+    response.headers.update(headers)
+    return response
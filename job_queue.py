@@ -0,0 +1,311 @@
+"""
+Database-backed job queue for slide deck generation.
+
+SlideDeck rows double as jobs and move through the existing status lifecycle:
+pending -> processing -> completed / failed. Web requests only enqueue a deck;
+separate worker processes (see worker.py) claim pending decks with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers on any number of
+nodes can drain the queue without processing the same deck twice.
+
+A deck that stays in 'processing' longer than the visibility timeout is
+assumed to belong to a crashed worker and becomes claimable again.
+
+Decks that belong to a SlideBatch are only claimed while fewer than the
+batch's concurrency limit are being processed, so one large batch can't
+occupy every worker while single requests wait behind it.
+"""
+import os
+import logging
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, and_, func
+
+import metrics
+
+# Seconds a claimed job may run before another worker is allowed to take it over
+VISIBILITY_TIMEOUT = int(os.environ.get("JOB_VISIBILITY_TIMEOUT", "600"))
+# Number of claims after which a deck is marked failed instead of retried
+MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# Seconds an idle worker sleeps between polls of the queue
+POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+# Anonymous decks and batches remembered in a visitor's session cookie
+MAX_SESSION_ITEMS = 50
+
+
+# Columns the queue added to slide_decks, as (name, PostgreSQL definition)
+JOB_COLUMNS = (
+    ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+    ('locked_by', 'VARCHAR'),
+    ('locked_at', 'TIMESTAMP WITHOUT TIME ZONE'),
+    ('error_message', 'TEXT'),
+    ('batch_id', 'INTEGER REFERENCES slide_batches (id)'),
+)
+
+
+def ensure_columns(db):
+    """
+    Add the job columns to slide_decks tables created before the queue.
+
+    Also lets user_id be NULL, for anonymous decks. slide_batches must exist
+    first (db.create_all() creates it). Safe to run more than once.
+    """
+    from sqlalchemy import text
+
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        for column, definition in JOB_COLUMNS:
+            conn.execute(text(f'ALTER TABLE slide_decks ADD COLUMN IF NOT EXISTS {column} {definition}'))
+        conn.execute(text('ALTER TABLE slide_decks ALTER COLUMN user_id DROP NOT NULL'))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_slide_decks_status_created_at '
+                          'ON slide_decks (status, created_at)'))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_slide_decks_batch_id ON slide_decks (batch_id)'))
+
+
+def make_worker_id():
+    """Build a worker ID that is unique across processes and nodes."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _reset_job(deck):
+    deck.status = 'pending'
+    deck.attempts = 0
+    deck.locked_by = None
+    deck.locked_at = None
+    deck.error_message = None
+
+
+def enqueue_slide_deck(deck):
+    """Mark a slide deck as pending so the next free worker picks it up."""
+    from app import db
+
+    _reset_job(deck)
+    db.session.commit()
+    logging.info("Enqueued slide deck %s", deck.id)
+    return deck.id
+
+
+def enqueue_slide_decks(decks):
+    """Mark several slide decks as pending in a single transaction."""
+    from app import db
+
+    for deck in decks:
+        _reset_job(deck)
+    db.session.commit()
+    logging.info("Enqueued %d slide decks", len(decks))
+    return [deck.id for deck in decks]
+
+
+def _busy_batches(stale_before):
+    """Subquery of batch IDs already processing as many decks as they allow."""
+    from app import db
+    from models import SlideBatch, SlideDeck
+
+    return (db.session.query(SlideDeck.batch_id)
+            .join(SlideBatch, SlideBatch.id == SlideDeck.batch_id)
+            .filter(SlideDeck.status == 'processing',
+                    SlideDeck.locked_at >= stale_before)
+            .group_by(SlideDeck.batch_id, SlideBatch.concurrency)
+            .having(func.count(SlideDeck.id) >= SlideBatch.concurrency)
+            .subquery())
+
+
+def _batch_has_capacity(batch_id, stale_before):
+    """Re-check a batch's limit while holding its row lock."""
+    from models import SlideBatch, SlideDeck
+
+    # Claims for the same batch queue up on this lock, so two workers can't
+    # both take the last free slot
+    batch = SlideBatch.query.filter_by(id=batch_id).with_for_update().first()
+    if batch is None:
+        return True
+    in_flight = (SlideDeck.query
+                 .filter(SlideDeck.batch_id == batch_id,
+                         SlideDeck.status == 'processing',
+                         SlideDeck.locked_at >= stale_before)
+                 .count())
+    return in_flight < batch.concurrency
+
+
+def claim_next_job(worker_id):
+    """
+    Claim the oldest claimable slide deck for this worker.
+
+    Args:
+        worker_id (str): ID recorded in SlideDeck.locked_by
+
+    Returns:
+        int: ID of the claimed deck, or None if the queue is empty
+    """
+    from app import db
+    from models import SlideDeck
+
+    while True:
+        stale_before = datetime.now() - timedelta(seconds=VISIBILITY_TIMEOUT)
+        busy_batches = _busy_batches(stale_before)
+        deck = (SlideDeck.query
+                .filter(or_(SlideDeck.status == 'pending',
+                            and_(SlideDeck.status == 'processing',
+                                 SlideDeck.locked_at < stale_before)))
+                .filter(or_(SlideDeck.batch_id.is_(None),
+                            SlideDeck.batch_id.notin_(db.session.query(busy_batches.c.batch_id))))
+                .order_by(SlideDeck.created_at, SlideDeck.id)
+                .with_for_update(skip_locked=True)
+                .first())
+
+        if deck is None:
+            # End the transaction so we don't sit on an open snapshot while idle
+            db.session.rollback()
+            return None
+
+        if deck.status == 'processing':
+            logging.warning("Reclaiming slide deck %s from unresponsive worker %s", deck.id, deck.locked_by)
+
+        if deck.attempts >= MAX_ATTEMPTS:
+            deck.status = 'failed'
+            deck.locked_by = None
+            deck.locked_at = None
+            deck.error_message = f"Giving up after {deck.attempts} attempts"
+            db.session.commit()
+            logging.error("Slide deck %s exceeded %d attempts", deck.id, MAX_ATTEMPTS)
+            continue
+
+        if deck.batch_id is not None and not _batch_has_capacity(deck.batch_id, stale_before):
+            # Another worker filled the batch's last slot after our scan
+            db.session.rollback()
+            continue
+
+        deck.status = 'processing'
+        deck.locked_by = worker_id
+        deck.locked_at = datetime.now()
+        deck.attempts = (deck.attempts or 0) + 1
+        db.session.commit()
+        return deck.id
+
+
+def queue_depth():
+    """Slide decks waiting for a worker and being processed, for the job_queue_depth gauge."""
+    from app import db
+    from models import SlideDeck
+
+    rows = (db.session.query(SlideDeck.status, func.count(SlideDeck.id))
+            .filter(SlideDeck.status.in_(('pending', 'processing')))
+            .group_by(SlideDeck.status)
+            .all())
+    depth = {('pending',): 0, ('processing',): 0}
+    depth.update({(status,): count for status, count in rows})
+    return depth
+
+
+def _finish_job(deck_id, worker_id, **values):
+    """Write the job outcome, but only if this worker still owns the deck."""
+    from app import db
+    from models import SlideDeck
+
+    values.update(locked_by=None, locked_at=None)
+    with metrics.stage('video', 'store'):
+        updated = (SlideDeck.query
+                   .filter_by(id=deck_id, locked_by=worker_id)
+                   .update(values, synchronize_session=False))
+        db.session.commit()
+    if not updated:
+        logging.warning("Worker %s lost ownership of slide deck %s; discarding result", worker_id, deck_id)
+    return bool(updated)
+
+
+def process_slide_deck(deck_id, worker_id):
+    """
+    Generate the slides for a claimed deck and store the result.
+
+    Args:
+        deck_id (int): ID of a deck previously returned by claim_next_job
+        worker_id (str): ID of the worker that claimed it
+
+    Returns:
+        bool: True if the deck was completed
+    """
+    with metrics.collect_timings() as timings:
+        with metrics.stage('video', 'job'):
+            completed = _process_slide_deck(deck_id, worker_id)
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        logging.info("Slide deck %s stages: %s", deck_id,
+                     ", ".join(f"{name}={ms:.0f}ms" for name, ms in metrics.summarize_timings(timings).items()))
+    return completed
+
+
+def _process_slide_deck(deck_id, worker_id):
+    from app import db
+    from models import SlideDeck
+    import json_codec
+    import presentation_cache
+    import transcript_utils
+
+    deck = SlideDeck.query.get(deck_id)
+    if not deck:
+        logging.error("Slide deck not found: %s", deck_id)
+        return False
+    video_url = deck.video_url
+    if deck.attempts == 1 and deck.created_at is not None:
+        metrics.record_stage('video', 'queue_wait', (datetime.now() - deck.created_at).total_seconds())
+    # Don't hold the row snapshot open during the slow upstream calls
+    db.session.rollback()
+
+    try:
+        # Identical videos queued together are generated once and shared
+        with metrics.stage('video', 'generate'):
+            presentation_data = presentation_cache.get_or_generate(
+                video_url, transcript_utils.process_video_transcript)
+    except Exception as e:
+        logging.error("Error processing slide deck %s: %s", deck_id, e)
+        _finish_job(deck_id, worker_id, status='failed', error_message=str(e))
+        return False
+
+    return _finish_job(deck_id, worker_id,
+                       status='completed',
+                       slides_blob=json_codec.encode(presentation_data),
+                       slides_json_legacy=None,
+                       video_title=presentation_data.get('title'),
+                       error_message=None)
+
+
+def run_worker(stop_event=None, worker_id=None):
+    """
+    Claim and process slide decks until stop_event is set.
+
+    Must be called inside an application context.
+    """
+    import presentation_cache
+
+    worker_id = worker_id or make_worker_id()
+    logging.info("Slide deck worker %s started", worker_id)
+
+    try:
+        purged = presentation_cache.purge_stale_versions()
+        if purged:
+            logging.info("Purged %d presentations from older generator versions", purged)
+    except Exception as e:
+        logging.error("Error purging presentation cache: %s", e)
+
+    while stop_event is None or not stop_event.is_set():
+        try:
+            deck_id = claim_next_job(worker_id)
+        except Exception as e:
+            logging.error("Error claiming job: %s", e)
+            from app import db
+            db.session.rollback()
+            deck_id = None
+
+        if deck_id is None:
+            if stop_event is not None:
+                stop_event.wait(POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+            continue
+
+        logging.info("Worker %s processing slide deck %s", worker_id, deck_id)
+        process_slide_deck(deck_id, worker_id)
+
+    logging.info("Slide deck worker %s stopped", worker_id)
@@ -0,0 +1,150 @@
+"""
+Compressed storage for large JSON payloads.
+
+Comparison results and slide decks are stored as compressed binary instead
+of JSON text. Each stored value starts with a one-byte codec version and the
+four-byte length of the uncompressed JSON, followed by the compressed JSON:
+
+    version 1: zlib
+    version 2: zstandard (only written when JSON_COMPRESSION=zstd)
+
+The version byte lets the codec change without rewriting old rows. Values are
+stored exactly as given when they are already JSON text, and encoded with
+orjson (or json) otherwise. Reading a column returns the raw bytes; models
+decode them only when the attribute is accessed (see models.py).
+"""
+import os
+import json
+import logging
+import struct
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+VERSION_ZLIB = 1
+VERSION_ZSTD = 2
+
+# Compression used for new values: zlib or zstd (requires the zstandard package)
+COMPRESSION = os.environ.get("JSON_COMPRESSION", "zlib")
+# zlib level for new values; 6 is zlib's default speed/size trade-off
+ZLIB_LEVEL = int(os.environ.get("JSON_ZLIB_LEVEL", "6"))
+# zstd level for new values
+ZSTD_LEVEL = int(os.environ.get("JSON_ZSTD_LEVEL", "3"))
+
+_HEADER = struct.Struct('>BI')
+
+if COMPRESSION == 'zstd' and zstandard is None:
+    logging.error("JSON_COMPRESSION=zstd but zstandard is not installed; using zlib")
+
+
+def dumps(value):
+    """Encode a value as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON text or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode(value):
+    """
+    Compress a JSON value for storage.
+
+    Args:
+        value: JSON text (str), or any JSON-serializable value
+
+    Returns:
+        bytes: Version byte, uncompressed length and compressed JSON
+    """
+    raw = value.encode('utf-8') if isinstance(value, str) else dumps(value)
+    if COMPRESSION == 'zstd' and zstandard is not None:
+        return _HEADER.pack(VERSION_ZSTD, len(raw)) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return _HEADER.pack(VERSION_ZLIB, len(raw)) + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decode_bytes(data):
+    """Return the uncompressed JSON bytes of a stored value."""
+    version, raw_length = _HEADER.unpack_from(data)
+    payload = memoryview(data)[_HEADER.size:]
+    if version == VERSION_ZLIB:
+        return zlib.decompress(payload)
+    if version == VERSION_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Stored JSON is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload, max_output_size=raw_length)
+    raise ValueError(f"Unknown JSON codec version {version}")
+
+
+def decode_text(data):
+    """Return a stored value as JSON text."""
+    return decode_bytes(data).decode('utf-8')
+
+
+def decode(data):
+    """Return a stored value parsed."""
+    return loads(decode_bytes(data))
+
+
+def raw_length(data):
+    """Uncompressed size in bytes of a stored value, read from its header."""
+    return _HEADER.unpack_from(data)[1]
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    Binary column holding a value produced by encode().
+
+    Accepts JSON text or JSON-serializable values on write and returns the
+    stored bytes on read, so rows are only decompressed when used.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        return encode(value)
+
+    def process_result_value(self, value, dialect):
+        return bytes(value) if value is not None else None
+
+
+class CompressedJSONAttribute:
+    """
+    Model attribute exposing a compressed column as JSON text.
+
+    Reads decode the compressed column, falling back to the legacy text
+    column for rows the migration hasn't reached yet. Writes always go to
+    the compressed column and clear the legacy one.
+    """
+
+    def __init__(self, blob_attr, legacy_attr):
+        self.blob_attr = blob_attr
+        self.legacy_attr = legacy_attr
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        blob = getattr(instance, self.blob_attr)
+        if blob is not None:
+            return decode_text(blob)
+        return getattr(instance, self.legacy_attr)
+
+    def __set__(self, instance, value):
+        setattr(instance, self.blob_attr, encode(value) if value is not None else None)
+        setattr(instance, self.legacy_attr, None)
@@ -0,0 +1,231 @@
+"""
+Persistent cache of LLM responses.
+
+Chat completions are cached in the llm_responses table under a hash of
+everything that determines the response: the model, the messages and the
+response format. Responses are stored already parsed, together with the
+token counts and wall-clock latency of the original call, so every hit can be
+credited with the tokens and time it saved.
+
+Entries expire after LLM_CACHE_TTL seconds, and once the table holds more
+than LLM_CACHE_MAX_ENTRIES rows the least recently used are deleted.
+"""
+import os
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import metrics
+
+# Seconds a cached response stays valid
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Maximum number of cached responses kept
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+_stats = {"hits": 0, "misses": 0, "bypasses": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+    metrics.count_cache('llm_responses', name)
+
+
+def cache_key(model, messages, response_format=None):
+    """Hash the inputs that determine a chat completion."""
+    payload = json.dumps({
+        "model": model,
+        "messages": messages,
+        "response_format": response_format
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _store_available():
+    try:
+        from flask import has_app_context
+        return has_app_context()
+    except ImportError:
+        return False
+
+
+def _load(key):
+    """Return the parsed response for a fresh entry and record the hit, or None."""
+    if not _store_available():
+        return None
+
+    from sqlalchemy import select
+    from app import db
+    from models import LLMResponse
+
+    table = LLMResponse.__table__
+    now = datetime.now()
+    try:
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                select(table.c.response, table.c.expires_at).where(table.c.cache_key == key)
+            ).first()
+            if row is None or row.expires_at < now:
+                return None
+            conn.execute(table.update().where(table.c.cache_key == key)
+                         .values(hit_count=table.c.hit_count + 1, last_hit_at=now))
+    except Exception as e:
+        logging.error("Error reading LLM cache: %s", e)
+        return None
+    return row.response
+
+
+def _save(key, model, response, prompt_tokens, completion_tokens, latency_ms):
+    if not _store_available():
+        return
+
+    from sqlalchemy import select
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from models import LLMResponse
+
+    table = LLMResponse.__table__
+    now = datetime.now()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.cache_key == key))
+            conn.execute(table.insert().values(
+                cache_key=key,
+                model=model,
+                response=response,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                latency_ms=latency_ms,
+                hit_count=0,
+                created_at=now,
+                last_hit_at=now,
+                expires_at=now + timedelta(seconds=LLM_CACHE_TTL)
+            ))
+            # Keep the table bounded: drop expired rows, then the least recently used
+            conn.execute(table.delete().where(table.c.expires_at < now))
+            cutoff = conn.execute(
+                select(table.c.last_hit_at)
+                .order_by(table.c.last_hit_at.desc())
+                .offset(LLM_CACHE_MAX_ENTRIES)
+                .limit(1)
+            ).scalar()
+            if cutoff is not None:
+                conn.execute(table.delete().where(table.c.last_hit_at <= cutoff))
+    except IntegrityError:
+        pass
+    except Exception as e:
+        logging.error("Error writing LLM cache: %s", e)
+
+
+def cached_chat_completion(client, model, messages, response_format=None, bypass=False):
+    """
+    Run a chat completion whose content is JSON, reusing a cached response if possible.
+
+    Args:
+        client (OpenAI): Client used on a cache miss
+        model (str): Model name
+        messages (list): Chat messages
+        response_format (dict, optional): Passed through to the API
+        bypass (bool): Skip the cache lookup and regenerate; the new
+            response replaces the cached one
+
+    Returns:
+        The parsed JSON content of the response
+
+    Raises:
+        ValueError: If the API returned no content
+        json.JSONDecodeError: If the content isn't valid JSON; it is not cached
+    """
+    key = cache_key(model, messages, response_format)
+    if bypass:
+        _count("bypasses")
+    else:
+        cached = _load(key)
+        if cached is not None:
+            _count("hits")
+            logging.info("LLM cache hit %s", key[:12])
+            return cached
+        _count("misses")
+
+    request = {"model": model, "messages": messages}
+    if response_format is not None:
+        request["response_format"] = response_format
+
+    started = time.perf_counter()
+    try:
+        with metrics.stage('video', 'openai'):
+            response = client.chat.completions.create(**request)
+    except Exception:
+        metrics.count_upstream_error('openai')
+        raise
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    content = response.choices[0].message.content
+    if not content:
+        raise ValueError("No content returned from OpenAI API")
+    parsed = json.loads(content)
+
+    usage = getattr(response, "usage", None)
+    _save(key, model, parsed,
+          getattr(usage, "prompt_tokens", 0) or 0,
+          getattr(usage, "completion_tokens", 0) or 0,
+          latency_ms)
+    return parsed
+
+
+def invalidate(key=None):
+    """Drop one cached response by key, or all of them."""
+    if not _store_available():
+        return
+
+    from app import db
+    from models import LLMResponse
+
+    table = LLMResponse.__table__
+    statement = table.delete()
+    if key is not None:
+        statement = statement.where(table.c.cache_key == key)
+    with db.engine.begin() as conn:
+        conn.execute(statement)
+
+
+def get_savings_report():
+    """
+    Summarize what the cache has saved.
+
+    Returns:
+        dict: Entry and hit counts, tokens and seconds of API time saved by
+        hits, plus this process's hit/miss/bypass counters
+    """
+    with _stats_lock:
+        report = {"process": dict(_stats)}
+    if not _store_available():
+        return report
+
+    from sqlalchemy import func, select
+    from app import db
+    from models import LLMResponse
+
+    table = LLMResponse.__table__
+    with db.engine.connect() as conn:
+        row = conn.execute(select(
+            func.count(),
+            func.coalesce(func.sum(table.c.hit_count), 0),
+            func.coalesce(func.sum(table.c.hit_count * table.c.prompt_tokens), 0),
+            func.coalesce(func.sum(table.c.hit_count * table.c.completion_tokens), 0),
+            func.coalesce(func.sum(table.c.hit_count * table.c.latency_ms), 0)
+        )).one()
+
+    entries, hits, prompt_tokens, completion_tokens, latency_ms = row
+    report.update(
+        entries=entries,
+        hits=int(hits),
+        prompt_tokens_saved=int(prompt_tokens),
+        completion_tokens_saved=int(completion_tokens),
+        seconds_saved=round(float(latency_ms) / 1000, 1)
+    )
+    return report
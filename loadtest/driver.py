@@ -0,0 +1,371 @@
+"""
+Replay a realistic request mix against the app at increasing concurrency.
+
+Usage:
+    python loadtest/driver.py [--url http://127.0.0.1:5000] [--fakes http://127.0.0.1:8081]
+        [--concurrency 1,2,4,8,16,32] [--duration 30] [--think-time 0]
+        [--mix create=30,dashboard=40,save=15,delete=10,retry=5]
+        [--videos 200] [--output PATH]
+    python loadtest/driver.py --app-workers 1,2,4,8 [--job-workers 2] [...]
+
+Each virtual user logs in as its own load test user (see serve.py) and then,
+until the level ends, picks an action from the mix and waits for the
+response before the next one:
+
+* create: POST /create-slide-deck for a video drawn from a pool of --videos
+  IDs, popular ones more often, so the presentation cache sees real reuse
+* dashboard: GET /dashboard
+* save: POST /save-comparison with a typical results payload
+* delete: POST /api/comparison/delete/<id> or /api/slide-deck/delete/<id>
+  for one of the user's own comparisons or decks
+* retry: POST /api/slide-deck/retry/<id> for one of the user's decks
+
+Levels run one after another, each with the number of users given in
+--concurrency, and report throughput, p50/p95/p99 latency and the error
+rate, overall and per action. With --fakes, the upstream calls made by the
+app during each level are reported as well.
+
+With --app-workers, the driver launches the fake services and serve.py
+itself and repeats the run for each gunicorn worker count, for capacity
+planning. DATABASE_URL must then point at a scratch database.
+
+Results are written as JSON to --output. The driver is a thread per user;
+above a few hundred users, run several drivers or one on another machine so
+it doesn't become the bottleneck.
+"""
+import argparse
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(LOADTEST_DIR, 'results', 'latest.json')
+DEFAULT_MIX = 'create=30,dashboard=40,save=15,delete=10,retry=5'
+ACTIONS = ('create', 'dashboard', 'save', 'delete', 'retry')
+REQUEST_TIMEOUT = 120
+
+COMPARISON_RESULTS = {
+    'similarity': 0.82,
+    'textSimilarity': 0.79,
+    'structureSimilarity': 0.88,
+    'differences': [{'page': page, 'type': 'text', 'summary': 'Paragraph reworded'} for page in range(1, 9)]
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        action, _, weight = part.partition('=')
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action {action!r}; expected one of {', '.join(ACTIONS)}")
+        weights[action] = float(weight)
+    if not any(weights.values()):
+        raise ValueError("The mix needs at least one action with a positive weight")
+    return weights
+
+
+class VideoPool:
+    """Video URLs whose popularity follows a Zipf distribution."""
+
+    def __init__(self, size, prefix):
+        # IDs are 11 characters, like real ones
+        self.urls = [f"https://www.youtube.com/watch?v={prefix}{index:0{11 - len(prefix)}d}" for index in range(size)]
+        self.weights = [1 / (rank + 1) for rank in range(size)]
+
+    def pick(self, rng):
+        return rng.choices(self.urls, self.weights)[0]
+
+
+class VirtualUser:
+    """One browser session, logged in as a load test user."""
+
+    def __init__(self, base_url, index, videos, seed):
+        self.base_url = base_url
+        self.index = index
+        self.videos = videos
+        self.rng = random.Random(f"{seed}:{index}")
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+        self.decks = []
+        self.comparisons = []
+
+    def request(self, method, path, payload=None):
+        """Return (status, parsed JSON body or None). Connection errors give status 0."""
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = Request(self.base_url + path, data=data, method=method,
+                          headers={'Content-Type': 'application/json', 'Accept': 'application/json'})
+        try:
+            with self.opener.open(request, timeout=REQUEST_TIMEOUT) as response:
+                status, body, content_type = response.status, response.read(), response.headers.get('Content-Type', '')
+        except HTTPError as e:
+            status, body, content_type = e.code, e.read(), e.headers.get('Content-Type', '')
+        except (URLError, OSError):
+            return 0, None
+        if 'json' not in content_type:
+            return status, None
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, None
+
+    def login(self):
+        status, _ = self.request('GET', f'/loadtest/login/{self.index}')
+        if status != 200:
+            raise RuntimeError(f"Could not log in as load test user {self.index} (status {status}); "
+                               f"is the app running under serve.py with enough --users?")
+
+    def create(self):
+        status, body = self.request('POST', '/create-slide-deck', {'videoUrl': self.videos.pick(self.rng)})
+        if body and body.get('id'):
+            self.decks.append(body['id'])
+        return 'create', status
+
+    def dashboard(self):
+        return 'dashboard', self.request('GET', '/dashboard')[0]
+
+    def save(self):
+        status, body = self.request('POST', '/save-comparison', {
+            'title': f"Load test comparison {self.rng.randrange(10 ** 6)}",
+            'description': 'Compared during a load test',
+            'documentAName': 'report-v1.pdf',
+            'documentBName': 'report-v2.pdf',
+            'documentAType': 'pdf',
+            'documentBType': 'pdf',
+            'results': COMPARISON_RESULTS
+        })
+        if body and body.get('id'):
+            self.comparisons.append(body['id'])
+        return 'save', status
+
+    def delete(self):
+        if self.comparisons and (not self.decks or self.rng.random() < 0.5):
+            comparison_id = self.comparisons.pop(self.rng.randrange(len(self.comparisons)))
+            return 'delete_comparison', self.request('POST', f'/api/comparison/delete/{comparison_id}')[0]
+        if self.decks:
+            deck_id = self.decks.pop(self.rng.randrange(len(self.decks)))
+            return 'delete_deck', self.request('POST', f'/api/slide-deck/delete/{deck_id}')[0]
+        # Nothing to delete yet
+        return self.save()
+
+    def retry(self):
+        if not self.decks:
+            return self.create()
+        deck_id = self.rng.choice(self.decks)
+        return 'retry', self.request('POST', f'/api/slide-deck/retry/{deck_id}')[0]
+
+    def run(self, mix, stop_at, think_time, samples):
+        actions = list(mix)
+        weights = [mix[action] for action in actions]
+        while time.monotonic() < stop_at:
+            action = self.rng.choices(actions, weights)[0]
+            started = time.perf_counter()
+            name, status = getattr(self, action)()
+            samples.append((name, time.perf_counter() - started, status))
+            if think_time:
+                time.sleep(self.rng.expovariate(1 / think_time))
+
+
+def summarize(samples, duration):
+    """Throughput, latency percentiles and error rate of (action, seconds, status) samples."""
+    if not samples:
+        return {'requests': 0, 'errors': 0, 'error_rate': 0.0, 'throughput_per_s': 0.0}
+    latencies = sorted(latency for _, latency, _ in samples)
+    errors = sum(1 for _, _, status in samples if not 200 <= status < 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4),
+        'throughput_per_s': round((len(samples) - errors) / duration, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2)
+    }
+
+
+def fake_service_counts(fakes_url):
+    if not fakes_url:
+        return None
+    try:
+        with build_opener().open(f"{fakes_url}/stats", timeout=10) as response:
+            return json.loads(response.read())['counts']
+    except (URLError, OSError, ValueError, KeyError):
+        return None
+
+
+def run_level(users, mix, duration, think_time, fakes_url):
+    samples = []
+    before = fake_service_counts(fakes_url)
+    stop_at = time.monotonic() + duration
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user.run, args=(mix, stop_at, think_time, samples), daemon=True)
+               for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requests in flight when the level ended still count, so measure until they finished
+    elapsed = time.perf_counter() - started
+
+    level = dict(summarize(samples, elapsed), concurrency=len(users), duration_s=round(elapsed, 2))
+    level['actions'] = {name: summarize([sample for sample in samples if sample[0] == name], elapsed)
+                        for name in sorted({sample[0] for sample in samples})}
+    after = fake_service_counts(fakes_url)
+    if before is not None and after is not None:
+        level['upstream'] = {key: count - before.get(key, 0) for key, count in sorted(after.items())
+                             if count != before.get(key, 0)}
+    return level
+
+
+def print_level(level):
+    print(f"{level['concurrency']:>6} {level['requests']:>8} {level['throughput_per_s']:>9.1f} "
+          f"{level.get('p50_ms', 0):>9.1f} {level.get('p95_ms', 0):>9.1f} {level.get('p99_ms', 0):>9.1f} "
+          f"{level['error_rate']:>7.1%}")
+    for name, action in level['actions'].items():
+        print(f"{'':>6} {name:<22} {action['requests']:>6} req {action.get('p50_ms', 0):>9.1f} "
+              f"{action.get('p95_ms', 0):>9.1f} {action.get('p99_ms', 0):>9.1f} {action['error_rate']:>7.1%}")
+    if level.get('upstream'):
+        print(f"{'':>6} upstream: " + ", ".join(f"{key}={count}" for key, count in level['upstream'].items()))
+
+
+def run_ramp(args, mix, label=None):
+    """Run every concurrency level against args.url. Returns the level results."""
+    videos = VideoPool(args.videos, args.video_prefix)
+    users = [VirtualUser(args.url, index, videos, args.seed) for index in range(max(args.concurrency))]
+    for user in users:
+        user.login()
+
+    if label:
+        print(f"\n{label}")
+    print(f"{'users':>6} {'requests':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    levels = []
+    for concurrency in args.concurrency:
+        level = run_level(users[:concurrency], mix, args.duration, args.think_time, args.fakes)
+        print_level(level)
+        levels.append(level)
+    return levels
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} during startup")
+        try:
+            with build_opener().open(url, timeout=5):
+                return
+        except HTTPError:
+            # Any HTTP answer means the server is up
+            return
+        except (URLError, OSError):
+            time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout} seconds")
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_sweep(args, mix):
+    """Launch the fake services and the app for each gunicorn worker count and run the ramp."""
+    if not os.environ.get("DATABASE_URL"):
+        raise SystemExit("DATABASE_URL must point at a scratch database")
+
+    fakes = None
+    if not args.fakes:
+        args.fakes = 'http://127.0.0.1:8081'
+        fakes = subprocess.Popen([sys.executable, os.path.join(LOADTEST_DIR, 'fake_services.py'),
+                                  '--bind', '127.0.0.1:8081'])
+    runs = []
+    try:
+        if fakes:
+            wait_until_up(f"{args.fakes}/stats", fakes)
+        bind = args.url.split('://', 1)[-1].rstrip('/')
+        for workers in args.app_workers:
+            app = subprocess.Popen([sys.executable, os.path.join(LOADTEST_DIR, 'serve.py'),
+                                    '--fakes', args.fakes, '--bind', bind, '--workers', str(workers),
+                                    '--threads', str(args.threads), '--job-workers', str(args.job_workers),
+                                    '--users', str(max(args.concurrency))])
+            try:
+                wait_until_up(f"{args.url}/loadtest/login/0", app)
+                levels = run_ramp(args, mix, label=f"gunicorn workers: {workers}")
+                runs.append({'app_workers': workers, 'threads': args.threads,
+                             'job_workers': args.job_workers, 'levels': levels})
+            finally:
+                stop(app)
+    finally:
+        if fakes:
+            stop(fakes)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a request mix against the app at increasing concurrency")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="app started by serve.py")
+    parser.add_argument("--fakes", default=None, help="URL of fake_services.py, to report upstream calls")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="comma-separated numbers of users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds each level runs")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds a user waits between requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated action=weight pairs")
+    parser.add_argument("--videos", type=int, default=200, help="distinct videos users request")
+    parser.add_argument("--video-prefix", default=None,
+                        help="video ID prefix; random by default, so each run starts with cold caches")
+    parser.add_argument("--seed", default="loadtest", help="seed for the users' choices")
+    parser.add_argument("--app-workers", default=None,
+                        help="comma-separated gunicorn worker counts to launch and test in turn")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker, with --app-workers")
+    parser.add_argument("--job-workers", type=int, default=2, help="slide deck workers, with --app-workers")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the results")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+        args.concurrency = [int(level) for level in args.concurrency.split(',')]
+        args.app_workers = [int(count) for count in args.app_workers.split(',')] if args.app_workers else None
+    except ValueError as e:
+        parser.error(str(e))
+    args.url = args.url.rstrip('/')
+    args.fakes = args.fakes.rstrip('/') if args.fakes else None
+    args.video_prefix = args.video_prefix or ''.join(random.choices(string.ascii_lowercase, k=3))
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'url': args.url,
+        'mix': mix,
+        'duration_s': args.duration,
+        'think_time_s': args.think_time,
+        'videos': args.videos,
+    }
+    if args.app_workers:
+        report['runs'] = run_sweep(args, mix)
+    else:
+        report['runs'] = [{'app_workers': None, 'levels': run_ramp(args, mix)}]
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+Local stand-ins for YouTube and OpenAI, for load testing.
+
+Usage:
+    python loadtest/fake_services.py [--bind 127.0.0.1:8081]
+        [--watch-latency lognormal:400:0.5] [--watch-error-rate 0.01]
+        [--transcript-latency lognormal:250:0.5] [--transcript-error-rate 0.01]
+        [--openai-latency lognormal:3000:0.6] [--openai-error-rate 0.02]
+        [--no-captions-rate 0.05] [--seed 1]
+
+One server answers the requests the app's upstream libraries make:
+
+* watch: GET /watch?v=ID, the page pytube and youtube_transcript_api
+  scrape, and POST /youtubei/v1/player, the innertube call both use for
+  video details and caption tracks
+* transcript: GET /api/timedtext?v=ID, the caption XML
+* openai: POST /v1/chat/completions, answering transcript summary prompts
+  with a summary and anything else with a presentation, as JSON
+
+Any 11-character video ID exists. Its transcript is synthetic (see
+benchmarks/fixtures.py) and derived from the ID, so every run and every
+app worker sees the same video: most are 5 minutes long, about a third an
+hour and a few five hours, and --no-captions-rate of them have captions
+disabled.
+
+Each service waits for a delay drawn from its latency distribution before
+answering, and fails --*-error-rate of its requests: YouTube with 429 Too
+Many Requests, OpenAI with a 429 rate limit or a 500 server error.
+Distributions are fixed:MS, uniform:MIN_MS:MAX_MS or
+lognormal:MEDIAN_MS:SIGMA.
+
+GET /stats returns the requests answered per service and status.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape, quoteattr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import fixtures  # noqa: E402
+
+INNERTUBE_API_KEY = "loadtestInnertubeKey"
+VIDEO_ID = re.compile(r'^[a-zA-Z0-9_-]{11}$')
+# Video lengths in minutes and how often each occurs
+VIDEO_LENGTHS = ((5, 0.60), (60, 0.35), (300, 0.05))
+# A 1x1 transparent GIF served for every thumbnail
+THUMBNAIL = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+             b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+class Profile:
+    """Latency distribution and error rate of one fake service."""
+
+    def __init__(self, latency, error_rate):
+        kind, *params = latency.split(':')
+        try:
+            params = [float(param) for param in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency distribution: {latency}")
+        if (kind, len(params)) not in (('fixed', 1), ('uniform', 2), ('lognormal', 2)):
+            raise ValueError(f"Invalid latency distribution: {latency}")
+        self.latency = latency
+        self.kind = kind
+        self.params = params
+        self.error_rate = error_rate
+
+    def delay(self, rng):
+        """Seconds to wait before answering."""
+        if self.kind == 'fixed':
+            ms = self.params[0]
+        elif self.kind == 'uniform':
+            ms = rng.uniform(*self.params)
+        else:
+            median, sigma = self.params
+            ms = rng.lognormvariate(math.log(median), sigma)
+        return max(ms, 0.0) / 1000
+
+    def fails(self, rng):
+        return rng.random() < self.error_rate
+
+
+def _fraction(video_id, salt):
+    """A stable number in [0, 1) for a video."""
+    digest = hashlib.sha256(f"{salt}:{video_id}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+@lru_cache(maxsize=512)
+def get_video(video_id):
+    """The synthetic fixture served for a video ID."""
+    fraction = _fraction(video_id, 'length')
+    for minutes, share in VIDEO_LENGTHS:
+        if fraction < share:
+            break
+        fraction -= share
+    return fixtures.synthesize_video(video_id, minutes)
+
+
+@lru_cache(maxsize=512)
+def _transcript_xml(video_id):
+    lines = [f'<text start="{entry["start"]}" dur="{entry["duration"]}">{escape(entry["text"])}</text>'
+             for entry in get_video(video_id)['transcript']]
+    return ('<?xml version="1.0" encoding="utf-8" ?><transcript>' + ''.join(lines) + '</transcript>').encode('utf-8')
+
+
+def player_response(video_id, base_url, no_captions_rate):
+    """The innertube player response pytube and youtube_transcript_api read."""
+    video = get_video(video_id)
+    metadata = video['metadata']
+    response = {
+        'playabilityStatus': {'status': 'OK', 'playableInEmbed': True},
+        'videoDetails': {
+            'videoId': video_id,
+            'title': metadata['title'],
+            'lengthSeconds': str(metadata['length_seconds']),
+            'author': metadata['author'],
+            'shortDescription': metadata['description'],
+            'viewCount': str(metadata['views']),
+            'thumbnail': {'thumbnails': [
+                {'url': f"{base_url}/vi/{video_id}/maxresdefault.jpg", 'width': 1280, 'height': 720}
+            ]}
+        }
+    }
+    if _fraction(video_id, 'captions') >= no_captions_rate:
+        response['captions'] = {'playerCaptionsTracklistRenderer': {
+            'captionTracks': [{
+                'baseUrl': f"{base_url}/api/timedtext?v={video_id}&lang=en",
+                'name': {'runs': [{'text': 'English (auto-generated)'}]},
+                'vssId': 'a.en',
+                'languageCode': 'en',
+                'kind': 'asr',
+                'isTranslatable': False
+            }],
+            'translationLanguages': []
+        }}
+    return response
+
+
+def watch_page(video_id, base_url, no_captions_rate):
+    player = json.dumps(player_response(video_id, base_url, no_captions_rate))
+    title = escape(get_video(video_id)['metadata']['title'])
+    return (f'<!DOCTYPE html><html><head><title>{title} - YouTube</title></head><body>'
+            f'<script>ytcfg.set({{"INNERTUBE_API_KEY":"{INNERTUBE_API_KEY}","INNERTUBE_CONTEXT_CLIENT_NAME":1}});</script>'
+            f'<script>var ytInitialPlayerResponse = {player};</script>'
+            f'<div id="player" data-video-id={quoteattr(video_id)}></div></body></html>').encode('utf-8')
+
+
+def chat_completion(request):
+    """Answer a chat completion the way the summarizer expects."""
+    messages = request.get('messages') or [{}]
+    prompt = str(messages[-1].get('content', ''))
+    words = re.findall(r'[a-z]+', prompt.lower())[-200:] or ['video']
+    rng = random.Random(prompt)
+
+    def sentence(count):
+        return ' '.join(rng.choice(words) for _ in range(count)).capitalize()
+
+    if 'Summarize part' in prompt:
+        content = {'summary': sentence(40) + '.', 'key_points': [sentence(10) for _ in range(rng.randint(3, 6))]}
+    else:
+        content = {
+            'title': sentence(6),
+            'slides': [{'title': sentence(4),
+                        'content': [sentence(10) for _ in range(rng.randint(2, 5))],
+                        'image_description': sentence(15)}
+                       for _ in range(rng.randint(8, 10))]
+        }
+    content = json.dumps(content)
+    prompt_tokens = sum(len(str(message.get('content', ''))) for message in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        'id': f"chatcmpl-loadtest{rng.getrandbits(48):012x}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'gpt-4o'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens}
+    }
+
+
+class FakeServices(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, profiles, no_captions_rate=0.05, seed=None):
+        super().__init__(address, Handler)
+        self.profiles = profiles
+        self.no_captions_rate = no_captions_rate
+        self.counts = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self, service):
+        """
+        Decide how one request to a service goes.
+
+        Returns:
+            tuple: Seconds to wait, and the error status to answer with or None
+        """
+        profile = self.profiles[service]
+        with self._lock:
+            delay = profile.delay(self._rng)
+            if not profile.fails(self._rng):
+                return delay, None
+            if service == 'openai':
+                return delay, self._rng.choice((429, 500))
+            return delay, 429
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def count(self, service, status):
+        with self._lock:
+            self.counts[f"{service} {status}"] += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeServices/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{self.headers.get('Host') or f'{host}:{port}'}"
+
+    def send_body(self, status, body, content_type, service=None, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if service:
+            self.server.count(service, status)
+
+    def send_json(self, status, data, service=None, headers=None):
+        self.send_body(status, json.dumps(data).encode('utf-8'), 'application/json', service, headers)
+
+    def upstream(self, service):
+        """Wait like the real service would; return False after sending an error."""
+        delay, error = self.server.draw(service)
+        time.sleep(delay)
+        if error is None:
+            return True
+        if service != 'openai':
+            self.send_body(error, b'Too Many Requests', 'text/plain', service)
+        elif error == 429:
+            self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests',
+                                           'code': 'rate_limit_exceeded'}}, service, {'Retry-After': '1'})
+        else:
+            self.send_json(500, {'error': {'message': 'The server had an error while processing your request',
+                                           'type': 'server_error', 'code': None}}, service)
+        return False
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return {}
+
+    def video_id(self, query, body=None):
+        video_id = (query.get('v') or query.get('videoId') or [None])[0] or (body or {}).get('videoId')
+        return video_id if video_id and VIDEO_ID.match(video_id) else None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/watch':
+            video_id = self.video_id(query)
+            if video_id is None:
+                return self.send_body(404, b'Not Found', 'text/plain', 'watch')
+            if self.upstream('watch'):
+                self.send_body(200, watch_page(video_id, self.base_url, self.server.no_captions_rate),
+                               'text/html; charset=utf-8', 'watch')
+        elif url.path == '/api/timedtext':
+            video_id = self.video_id(query)
+            if video_id is None:
+                return self.send_body(404, b'', 'text/xml', 'transcript')
+            if self.upstream('transcript'):
+                self.send_body(200, _transcript_xml(video_id), 'text/xml; charset=utf-8', 'transcript')
+        elif url.path.startswith('/vi/'):
+            self.send_body(200, THUMBNAIL, 'image/gif', 'thumbnail', {'Cache-Control': 'public, max-age=86400'})
+        elif url.path == '/stats':
+            self.send_json(200, {'counts': self.server.snapshot(),
+                                 'profiles': {service: {'latency': profile.latency, 'error_rate': profile.error_rate}
+                                              for service, profile in self.server.profiles.items()}})
+        else:
+            self.send_body(404, b'Not Found', 'text/plain')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.read_json()
+        if url.path == '/youtubei/v1/player':
+            video_id = self.video_id(parse_qs(url.query), body)
+            if video_id is None:
+                return self.send_json(400, {'error': {'code': 400, 'message': 'Invalid video ID'}}, 'watch')
+            if self.upstream('watch'):
+                self.send_json(200, player_response(video_id, self.base_url, self.server.no_captions_rate), 'watch')
+        elif url.path.rstrip('/').endswith('/chat/completions'):
+            if self.upstream('openai'):
+                self.send_json(200, chat_completion(body), 'openai')
+        else:
+            self.send_body(404, b'Not Found', 'text/plain')
+
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def make_server(bind='127.0.0.1:8081', watch_latency='lognormal:400:0.5', watch_error_rate=0.01,
+                transcript_latency='lognormal:250:0.5', transcript_error_rate=0.01,
+                openai_latency='lognormal:3000:0.6', openai_error_rate=0.02,
+                no_captions_rate=0.05, seed=None):
+    profiles = {
+        'watch': Profile(watch_latency, watch_error_rate),
+        'transcript': Profile(transcript_latency, transcript_error_rate),
+        'openai': Profile(openai_latency, openai_error_rate),
+    }
+    return FakeServices(parse_bind(bind), profiles, no_captions_rate, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake YouTube and OpenAI endpoints for load tests")
+    parser.add_argument("--bind", default="127.0.0.1:8081", help="host:port to listen on")
+    for service, latency, error_rate in (('watch', 'lognormal:400:0.5', 0.01),
+                                         ('transcript', 'lognormal:250:0.5', 0.01),
+                                         ('openai', 'lognormal:3000:0.6', 0.02)):
+        parser.add_argument(f"--{service}-latency", default=latency, help=f"{service} latency distribution")
+        parser.add_argument(f"--{service}-error-rate", type=float, default=error_rate,
+                            help=f"fraction of {service} requests that fail")
+    parser.add_argument("--no-captions-rate", type=float, default=0.05, help="fraction of videos without captions")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latencies and errors")
+    args = parser.parse_args()
+
+    try:
+        server = make_server(**vars(args))
+    except ValueError as e:
+        parser.error(str(e))
+    host, port = server.server_address[:2]
+    print(f"fake services listening on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
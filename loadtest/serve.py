@@ -0,0 +1,186 @@
+"""
+Run the app against the fake services, for load testing.
+
+Usage:
+    python loadtest/serve.py [--fakes http://127.0.0.1:8081] [--bind 127.0.0.1:5000]
+        [--workers 4] [--threads 1] [--job-workers 2] [--users 64]
+
+Starts gunicorn with --workers workers serving the real app, and
+--job-workers slide deck workers, as in production except that:
+
+* every request to YouTube, from pytube and youtube_transcript_api alike,
+  goes to the fake services (see fake_services.py) instead
+* OpenAI requests go to the fake services through OPENAI_BASE_URL
+* GET /loadtest/login/<n> logs the caller in as load test user n, one of
+  --users users created at startup, so the driver can use the pages that
+  need an account
+
+DATABASE_URL must point at a scratch database. Missing tables are created,
+and the load test fills it with decks and comparisons.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+from urllib.parse import urlsplit, urlunsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+YOUTUBE_HOSTS = ('www.youtube.com', 'youtube.com', 'm.youtube.com', 'i.ytimg.com', 'img.youtube.com')
+
+
+def rewrite_url(url, fakes_url):
+    """Point a YouTube URL at the fake services, leaving other URLs alone."""
+    parts = urlsplit(url)
+    if parts.hostname not in YOUTUBE_HOSTS:
+        return url
+    fakes = urlsplit(fakes_url)
+    return urlunsplit((fakes.scheme, fakes.netloc, parts.path, parts.query, parts.fragment))
+
+
+def redirect_youtube(fakes_url):
+    """
+    Send this process's YouTube requests to the fake services.
+
+    pytube fetches through urllib.request.urlopen and youtube_transcript_api
+    through a requests session, so both are redirected where the request is
+    sent and the libraries themselves run unchanged.
+    """
+    import urllib.request
+    import requests
+
+    class RedirectHandler(urllib.request.BaseHandler):
+        # Runs before the handlers that open connections
+        handler_order = 100
+
+        def http_request(self, request):
+            request.full_url = rewrite_url(request.full_url, fakes_url)
+            return request
+
+        https_request = http_request
+
+    class RedirectAdapter(requests.adapters.HTTPAdapter):
+        def send(self, request, **kwargs):
+            request.url = rewrite_url(request.url, fakes_url)
+            return super().send(request, **kwargs)
+
+    urllib.request.install_opener(urllib.request.build_opener(RedirectHandler()))
+
+    session_init = requests.Session.__init__
+
+    def init(session, *args, **kwargs):
+        session_init(session, *args, **kwargs)
+        adapter = RedirectAdapter()
+        for host in YOUTUBE_HOSTS:
+            session.mount(f"https://{host}/", adapter)
+
+    requests.Session.__init__ = init
+
+
+def create_users(count):
+    """Create the load test users. Returns their IDs."""
+    from app import app, db
+    from models import User
+
+    with app.app_context():
+        db.create_all()
+        for n in range(count):
+            db.session.merge(User(id=f"loadtest-{n}", email=f"loadtest-{n}@example.com",
+                                  first_name="Load", last_name=f"Test {n}"))
+        db.session.commit()
+        # Forked workers must not share the parent's connections
+        db.engine.dispose()
+    return [f"loadtest-{n}" for n in range(count)]
+
+
+def add_login_route(app):
+    """Let the driver log in as a load test user without going through Replit."""
+    from flask import jsonify
+    from flask_login import login_user
+    from models import User
+
+    def loadtest_login(n):
+        user = User.query.get(f"loadtest-{n}")
+        if not user:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+        login_user(user)
+        return jsonify({'success': True, 'id': user.id})
+
+    app.add_url_rule('/loadtest/login/<int:n>', 'loadtest_login', loadtest_login)
+
+
+def _job_worker_main(stop_event, fakes_url):
+    # Spawned processes start from scratch, so redirect YouTube again
+    import worker
+
+    redirect_youtube(fakes_url)
+    worker._worker_main(stop_event)
+
+
+def start_job_workers(count, fakes_url):
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    processes = [ctx.Process(target=_job_worker_main, args=(stop_event, fakes_url), name=f"loadtest-worker-{i}")
+                 for i in range(count)]
+    for process in processes:
+        process.start()
+    return stop_event, processes
+
+
+def serve(options):
+    from gunicorn.app.base import BaseApplication
+
+    class LoadTestApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import create_app
+            app = create_app()
+            add_login_route(app)
+            return app
+
+    LoadTestApplication().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the app against the fake services")
+    parser.add_argument("--fakes", default="http://127.0.0.1:8081", help="URL of fake_services.py")
+    parser.add_argument("--bind", default="127.0.0.1:5000", help="host:port for gunicorn")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--job-workers", type=int, default=2, help="slide deck worker processes")
+    parser.add_argument("--users", type=int, default=64, help="load test users to create")
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        parser.error("DATABASE_URL must point at a scratch database")
+    fakes_url = args.fakes.rstrip('/')
+    os.environ["OPENAI_BASE_URL"] = f"{fakes_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+
+    redirect_youtube(fakes_url)
+    create_users(args.users)
+
+    stop_event, processes = start_job_workers(args.job_workers, fakes_url)
+    try:
+        serve({
+            'bind': args.bind,
+            'workers': args.workers,
+            'threads': args.threads,
+            'worker_class': 'gthread',
+            'timeout': 120,
+            'loglevel': 'warning',
+        })
+    finally:
+        logging.info("Stopping slide deck workers")
+        stop_event.set()
+        for process in processes:
+            process.join()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
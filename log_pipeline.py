@@ -0,0 +1,298 @@
+"""
+Non-blocking, structured logging.
+
+Request threads only put log records on a queue; a background thread
+formats them and writes them to the real handlers, so a slow stderr (a
+full pipe, a container log driver) never holds up a response. Records are
+written as one JSON object per line:
+
+    {"time": "...", "level": "INFO", "logger": "root", "message": "...",
+     "event": "slide_deck.requested", "video_url": "...", "process": 12, ...}
+
+Log with %-style arguments rather than f-strings,
+
+    logging.info("Processing video URL: %s", video_url,
+                 extra={'event': 'slide_deck.requested', 'fields': {'video_url': video_url}})
+
+so a record below LOG_LEVEL costs one level check, and the message of one
+above it is only rendered on the background thread. `event` names the kind
+of record, and `fields` adds keys to its JSON object.
+
+High-volume events can be sampled: LOG_SAMPLE_RATES keeps the given
+fraction of the records of each event below ERROR, and the records kept
+carry their sample_rate so counts can be scaled back up. Records sampled
+out, and records dropped because the queue is full, are counted in
+log_records_discarded_total on /metrics; the request thread never waits for
+room in the queue.
+
+Secrets never reach a handler: before a record is written, values under
+keys such as apiKey, password or token are replaced, in the message
+arguments and fields alike, and API keys, bearer tokens and key=value
+secrets are scrubbed from the rendered message and traceback.
+
+Arguments are rendered after the call returns, so don't log an object that
+is about to be modified.
+"""
+import os
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+import metrics
+
+# Record format: json (one object per line) or text
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+# Set to 0 to write records on the logging thread, e.g. to compare latency
+LOG_QUEUE = os.environ.get("LOG_QUEUE", "1").lower() not in ("0", "false", "no")
+# Records waiting to be written before new ones are dropped
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Fraction of records kept per event, as event=rate pairs separated by commas
+LOG_SAMPLE_RATES = os.environ.get(
+    "LOG_SAMPLE_RATES", "slide_deck.requested=0.1,slide_deck.streamed=0.1,image_proxy.failed=0.1")
+# Extra keys whose values are redacted, separated by commas
+LOG_REDACT_KEYS = os.environ.get("LOG_REDACT_KEYS", "")
+
+REDACTED = '[REDACTED]'
+
+LOG_RECORDS_DISCARDED = metrics.counter('log_records_discarded_total', "Log records not written, by reason",
+                                        ('reason',))
+
+
+def _normalize_key(key):
+    return re.sub(r'[^a-z0-9]', '', key.lower())
+
+
+def _parse_sample_rates(value):
+    rates = {}
+    for pair in value.split(','):
+        if '=' not in pair:
+            continue
+        event, rate = pair.split('=', 1)
+        try:
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            logging.error("Ignoring invalid log sample rate %r", pair.strip())
+    return rates
+
+
+# Keys compared case-insensitively and ignoring punctuation, so apiKey,
+# api_key and API-KEY all match
+_REDACT_KEYS = {'apikey', 'password', 'passwd', 'secret', 'secretkey', 'clientsecret', 'token',
+                'accesstoken', 'refreshtoken', 'idtoken', 'authorization', 'cookie', 'sessionid'}
+_REDACT_KEYS.update(_normalize_key(key) for key in LOG_REDACT_KEYS.split(',') if key.strip())
+
+_SECRET_PATTERNS = (
+    # OpenAI-style API keys
+    (re.compile(r'\bsk-[A-Za-z0-9_\-]{16,}'), 'sk-' + REDACTED),
+    (re.compile(r'\b(Bearer|Basic)\s+[A-Za-z0-9._~+/=\-]+', re.IGNORECASE), r'\1 ' + REDACTED),
+    # key=value, key: value and 'key': 'value' for secret-looking keys
+    (re.compile(r'''(['"]?[A-Za-z_\-]*(?:api[_\-]?key|password|passwd|secret|token|authorization)['"]?\s*[:=]\s*)'''
+                r'''(['"]?)(?!(?:Bearer|Basic)\s)[^\s'",}&]+''', re.IGNORECASE), r'\1\2' + REDACTED),
+)
+
+_sample_rates = _parse_sample_rates(LOG_SAMPLE_RATES)
+_queue = None
+_handler = None
+_listener = None
+_sinks = []
+_configured = False
+
+
+def scrub(text):
+    """Replace secrets that appear in free text."""
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def redact(value):
+    """
+    Copy a value with the secrets in it replaced.
+
+    Args:
+        value: A log argument or field; dicts, lists and tuples are copied
+            recursively, strings are scrubbed, anything else is kept
+
+    Returns:
+        The redacted copy
+    """
+    if isinstance(value, dict):
+        return {key: REDACTED if isinstance(key, str) and _normalize_key(key) in _REDACT_KEYS else redact(item)
+                for key, item in value.items()}
+    if type(value) in (list, tuple):
+        return type(value)(redact(item) for item in value)
+    if isinstance(value, str):
+        return scrub(value)
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of the records of sampled events. Runs in the thread that logs, so stays cheap."""
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if event is None or record.levelno >= logging.ERROR:
+            return True
+        rate = _sample_rates.get(event)
+        if rate is None or rate >= 1.0:
+            return True
+        if random.random() >= rate:
+            LOG_RECORDS_DISCARDED.inc('sampled')
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class RedactingFilter(logging.Filter):
+    """Render a record's message with its secrets removed, before any handler sees it."""
+
+    def filter(self, record):
+        if getattr(record, 'redacted', False):
+            return True
+        if isinstance(record.args, (dict, tuple)):
+            record.args = redact(record.args)
+        if not isinstance(record.msg, str):
+            record.msg = redact(record.msg)
+        try:
+            record.msg = scrub(record.getMessage())
+        except Exception:
+            # Leave a bad format string for the handler to report
+            return True
+        record.args = None
+        fields = getattr(record, 'fields', None)
+        if isinstance(fields, dict):
+            record.fields = redact(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = scrub(record.exc_text)
+        if record.stack_info:
+            record.stack_info = scrub(record.stack_info)
+        record.redacted = True
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one line of JSON."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        event = getattr(record, 'event', None)
+        if event is not None:
+            entry['event'] = event
+        sample_rate = getattr(record, 'sample_rate', None)
+        if sample_rate is not None:
+            entry['sample_rate'] = sample_rate
+        fields = getattr(record, 'fields', None)
+        if isinstance(fields, dict):
+            for key, value in fields.items():
+                entry.setdefault(key, value)
+        entry['process'] = record.process
+        entry['thread'] = record.threadName
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The queue stays in this process, so the record is passed as is
+        # and formatted on the listener thread instead of this one
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DISCARDED.inc('queue_full')
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room so stopping always flushes the queue
+        self.queue.put(self._sentinel)
+
+
+def _default_handler():
+    handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    return handler
+
+
+def _start_listener():
+    global _queue, _listener
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler.queue = _queue
+    _listener = _QueueListener(_queue, *_sinks, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread doesn't survive a fork, and the parent writes
+    # whatever was still queued
+    if _listener is not None:
+        _start_listener()
+
+
+def configure(level=logging.INFO, handlers=None):
+    """
+    Route the root logger's records through the queue to handlers.
+
+    Args:
+        level: Root logger level
+        handlers (list, optional): Handlers that write the records. Defaults
+            to the root logger's current handlers, or one writing LOG_FORMAT
+            records to stderr if it has none.
+    """
+    global _handler, _sinks, _configured
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _configured:
+        return
+    _configured = True
+
+    _sinks = list(handlers) if handlers is not None else root.handlers[:] or [_default_handler()]
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    redactor = RedactingFilter()
+    for handler in _sinks:
+        handler.addFilter(redactor)
+
+    if not LOG_QUEUE:
+        for handler in _sinks:
+            handler.addFilter(SamplingFilter())
+            root.addHandler(handler)
+        return
+
+    _handler = _QueueHandler(None)
+    _handler.addFilter(SamplingFilter())
+    _start_listener()
+    root.addHandler(_handler)
+    os.register_at_fork(after_in_child=_restart_after_fork)
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """Write the records still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
@@ -0,0 +1,460 @@
+"""
+Latency histograms and counters for the slide and comparison pipelines.
+
+Pipeline code times its stages with
+
+    with metrics.stage('video', 'transcript'):
+        ...
+
+(or the same call as a decorator), which records into the
+pipeline_stage_seconds histogram. Stages timed while a request or a slide
+deck job is being handled are also collected for it: requests return them
+in a Server-Timing header, and jobs log them when they finish. Caches count
+their hits and misses in cache_events_total, and upstream services their
+failures in upstream_errors_total. Recording is a bisect and a few additions
+under a lock, cheap enough for every call.
+
+Everything is exported in the Prometheus text format on /metrics. Gunicorn
+serves requests from several processes, and slide decks are generated in
+others (see worker.py), so one process only sees part of the traffic. When
+METRICS_DIR is set, every process writes a snapshot of its metrics to
+<METRICS_DIR>/<pid>.json every METRICS_FLUSH_INTERVAL seconds and when it
+exits, and /metrics adds up the snapshots of every process. Snapshots of
+processes that have exited are folded into archive.json, so counters never
+go backwards when gunicorn replaces a worker. Gauges such as the job queue
+depth are sampled when /metrics is scraped rather than summed.
+"""
+import os
+import atexit
+import bisect
+import contextvars
+import glob
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Directory shared by the processes on this host for metric snapshots; unset
+# exports only the scraped process's own metrics
+METRICS_DIR = os.environ.get("METRICS_DIR")
+# Seconds between snapshots of this process's metrics
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+# Bearer token required by /metrics; unset leaves it open
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_ARCHIVE = 'archive.json'
+
+_lock = threading.Lock()
+_registry = {}
+_gauges = {}
+# Stage timings of the request or job being handled, if one is
+_timings = contextvars.ContextVar('metrics_timings', default=None)
+_owner_pid = os.getpid()
+_flusher = None
+
+
+def _labels_key(values):
+    return json.dumps([str(value) for value in values])
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        key = _labels_key(labels)
+        with _lock:
+            _check_owner()
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        return dict(self.values)
+
+    @staticmethod
+    def merge(into, values):
+        for key, value in values.items():
+            into[key] = into.get(key, 0) + value
+
+
+class Histogram:
+    """Observations counted into fixed buckets per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label key -> [count per bucket..., count above the last bucket, sum]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        key = _labels_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            _check_owner()
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def snapshot(self):
+        return {key: list(counts) for key, counts in self.values.items()}
+
+    @staticmethod
+    def merge(into, values):
+        for key, counts in values.items():
+            existing = into.get(key)
+            if existing is None or len(existing) != len(counts):
+                # Buckets changed between deploys; keep the newest layout
+                into[key] = list(counts)
+            else:
+                into[key] = [a + b for a, b in zip(existing, counts)]
+
+
+def _register(metric):
+    _registry[metric.name] = metric
+    return metric
+
+
+def counter(name, description, labelnames=()):
+    return _register(Counter(name, description, labelnames))
+
+
+def histogram(name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, description, labelnames, buckets))
+
+
+def register_gauge(name, description, labelnames, collect):
+    """
+    Register a gauge sampled when /metrics is scraped.
+
+    Args:
+        collect (callable): Returns {label values tuple: value}; called
+            inside the scraping request, so it may use the database
+    """
+    _gauges[name] = (description, tuple(labelnames), collect)
+
+
+STAGE_SECONDS = histogram('pipeline_stage_seconds', "Time spent in each stage of a pipeline", ('pipeline', 'stage'))
+REQUEST_SECONDS = histogram('http_request_duration_seconds', "Time to produce a response, up to its headers",
+                            ('method', 'endpoint', 'status'))
+CACHE_EVENTS = counter('cache_events_total', "Cache lookups by outcome", ('cache', 'event'))
+UPSTREAM_ERRORS = counter('upstream_errors_total', "Failed calls to upstream services", ('service',))
+FETCH_TIMEOUTS = counter('fetch_timeouts_total', "Upstream calls abandoned after their deadline", ('call',))
+FETCH_REFUSED = counter('fetch_refused_total', "Upstream calls refused while too many abandoned calls still ran",
+                        ('call',))
+
+
+def record_stage(pipeline, name, seconds):
+    """Record a stage timed by the caller."""
+    STAGE_SECONDS.observe(seconds, pipeline, name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(pipeline, name):
+    """Time a pipeline stage. Also usable as a decorator."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(pipeline, name, time.perf_counter() - started)
+
+
+def count_cache(cache, event):
+    CACHE_EVENTS.inc(cache, event)
+
+
+def count_upstream_error(service):
+    UPSTREAM_ERRORS.inc(service)
+
+
+@contextmanager
+def collect_timings():
+    """Collect the stages timed in this context, and in calls it hands to fetch_pool, into the yielded list."""
+    timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def summarize_timings(timings):
+    """Total milliseconds per stage name, in the order the stages first ran."""
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds * 1000
+    return totals
+
+
+def server_timing(timings, total_ms=None, db_ms=None):
+    """Format stage timings as a Server-Timing header value."""
+    entries = [f"{name};dur={ms:.1f}" for name, ms in summarize_timings(timings).items()]
+    if db_ms is not None:
+        entries.append(f"db;dur={db_ms:.1f}")
+    if total_ms is not None:
+        entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
+def _check_owner():
+    """
+    Start over in a forked child, and start flushing this process's metrics.
+
+    Must be called with _lock held.
+    """
+    global _owner_pid, _flusher
+    pid = os.getpid()
+    if pid != _owner_pid:
+        # Counts inherited from the parent are the parent's to report
+        for metric in _registry.values():
+            metric.values.clear()
+        _owner_pid = pid
+        _flusher = None
+    if METRICS_DIR and _flusher is None:
+        _claim_snapshot_path()
+        _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+        _flusher.start()
+
+
+def _snapshot():
+    with _lock:
+        _check_owner()
+        return {name: {'kind': metric.kind, 'values': metric.snapshot()} for name, metric in _registry.items()}
+
+
+def _merge_snapshot(into, snapshot):
+    for name, data in snapshot.items():
+        metric = _registry.get(name)
+        if metric is None or metric.kind != data.get('kind'):
+            continue
+        metric.merge(into.setdefault(name, {}), data['values'])
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error("Error reading metrics snapshot %s: %s", path, e)
+        return None
+
+
+@contextmanager
+def _directory_lock():
+    import fcntl
+
+    with open(os.path.join(METRICS_DIR, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _archive(paths):
+    """Fold the snapshots of exited processes into the archive. Must hold the directory lock."""
+    archive_path = os.path.join(METRICS_DIR, _ARCHIVE)
+    archive = {}
+    if os.path.exists(archive_path):
+        _merge_snapshot(archive, _read_json(archive_path) or {})
+    for path in paths:
+        _merge_snapshot(archive, _read_json(path) or {})
+    _write_json(archive_path, {name: {'kind': _registry[name].kind, 'values': values}
+                               for name, values in archive.items()})
+    for path in paths:
+        os.remove(path)
+
+
+def _snapshot_path():
+    return os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+
+
+def _claim_snapshot_path():
+    """Archive a snapshot left by an exited process that had this process's PID."""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        if os.path.exists(_snapshot_path()):
+            with _directory_lock():
+                if os.path.exists(_snapshot_path()):
+                    _archive([_snapshot_path()])
+    except OSError as e:
+        logging.error("Error preparing metrics directory: %s", e)
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR."""
+    if not METRICS_DIR:
+        return
+    try:
+        _write_json(_snapshot_path(), _snapshot())
+    except OSError as e:
+        logging.error("Error writing metrics snapshot: %s", e)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+atexit.register(flush)
+
+
+def _collect():
+    """Metrics of every process on this host, or of this process without METRICS_DIR."""
+    if not METRICS_DIR:
+        return {name: data['values'] for name, data in _snapshot().items()}
+
+    flush()
+    combined = {}
+    with _directory_lock():
+        snapshots = []
+        exited = []
+        for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+            name = os.path.basename(path)[:-len('.json')]
+            if name.isdigit() and not _process_alive(int(name)):
+                exited.append(path)
+            else:
+                snapshots.append(path)
+        if exited:
+            _archive(exited)
+            archive_path = os.path.join(METRICS_DIR, _ARCHIVE)
+            if archive_path not in snapshots:
+                snapshots.append(archive_path)
+    for path in snapshots:
+        data = _read_json(path)
+        if data:
+            _merge_snapshot(combined, data)
+    return combined
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, values in sorted(_collect().items()):
+        metric = _registry[name]
+        lines.append(f"# HELP {name} {metric.description}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, value in sorted(values.items()):
+            labels = json.loads(key)
+            if metric.kind == 'counter':
+                lines.append(f"{name}{_format_labels(metric.labelnames, labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_format_labels(metric.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(metric.labelnames, labels)} {_format_number(round(value[-1], 6))}")
+            lines.append(f"{name}_count{_format_labels(metric.labelnames, labels)} {cumulative}")
+
+    for name, (description, labelnames, collect) in sorted(_gauges.items()):
+        try:
+            samples = collect()
+        except Exception as e:
+            logging.error("Error sampling gauge %s: %s", name, e)
+            continue
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in sorted(samples.items()):
+            lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def access_allowed(request):
+    """/metrics is open unless METRICS_TOKEN is set, in which case it needs that bearer token."""
+    if not METRICS_TOKEN:
+        return True
+    return request.headers.get('Authorization') == f"Bearer {METRICS_TOKEN}"
+
+
+def _start_request():
+    from flask import g
+    g._metrics_started = time.perf_counter()
+    g._metrics_timings = []
+    g._metrics_token = _timings.set(g._metrics_timings)
+
+
+def _finish_request(response):
+    from flask import g, request
+    import query_stats
+
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    REQUEST_SECONDS.observe(elapsed, request.method, request.endpoint or 'unmatched', response.status_code)
+
+    stats = query_stats.current_stats()
+    response.headers['Server-Timing'] = server_timing(
+        g.get('_metrics_timings', []), elapsed * 1000, stats.total_ms if stats is not None else None)
+    return response
+
+
+def _end_request(exception=None):
+    from flask import g
+    token = g.pop('_metrics_token', None)
+    if token is not None:
+        try:
+            _timings.reset(token)
+        except (RuntimeError, ValueError):
+            # Streamed responses finish in a different context
+            pass
+
+
+def init_app(app):
+    """Time every request and return its stage timings in Server-Timing."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
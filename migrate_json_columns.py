@@ -0,0 +1,158 @@
+"""
+Move stored JSON payloads into their compressed columns.
+
+Usage:
+    python migrate_json_columns.py [--batch-size N] [--pause SECONDS]
+    python migrate_json_columns.py --report
+
+The compressed columns themselves are added by upgrade_db.py, which must run
+before a version that uses them is deployed; this also adds them, so it can
+run first. It converts saved_comparisons.results_json and slide_decks.slides_json into
+results_blob and slides_blob in batches of short transactions, so it can run
+while the application is serving traffic. The legacy column is emptied as
+each row is converted; rows written by the application already use the new
+columns, and the migration can be stopped and resumed at any point.
+
+--report prints the storage used by each column and the savings so far.
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import func, select, text
+
+import json_codec
+
+# (table, legacy text column, compressed column)
+COLUMNS = (
+    ('saved_comparisons', 'results_json', 'results_blob'),
+    ('slide_decks', 'slides_json', 'slides_blob'),
+)
+
+
+def ensure_columns(db):
+    """
+    Add the compressed columns to databases created before them.
+
+    Also lets the legacy columns be NULL, as new rows leave them empty. Run
+    by upgrade_db.py; safe to run more than once.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        for table, legacy, blob in COLUMNS:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {blob} BYTEA'))
+            conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN {legacy} DROP NOT NULL'))
+
+
+def migrate_table(db, table_name, legacy, blob, batch_size=500, pause=0.0):
+    """
+    Convert one table's rows in batches.
+
+    Returns:
+        tuple: (rows converted, legacy bytes, compressed bytes)
+    """
+    table = db.metadata.tables[table_name]
+    legacy_column = table.c[legacy]
+    blob_column = table.c[blob]
+
+    converted = legacy_bytes = compressed_bytes = 0
+    last_id = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, legacy_column)
+                .where(table.c.id > last_id, legacy_column.isnot(None), blob_column.is_(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            for row_id, value in rows:
+                encoded = json_codec.encode(value)
+                # Skip rows the application rewrote since we read them
+                conn.execute(
+                    table.update()
+                    .where(table.c.id == row_id, blob_column.is_(None))
+                    .values({blob: encoded, legacy: None})
+                )
+                legacy_bytes += len(value.encode('utf-8'))
+                compressed_bytes += len(encoded)
+            converted += len(rows)
+            last_id = rows[-1][0]
+
+        logging.info("%s: converted %d rows", table_name, converted)
+        if pause:
+            time.sleep(pause)
+
+    return converted, legacy_bytes, compressed_bytes
+
+
+def storage_report(db):
+    """
+    Measure the storage used by each payload column.
+
+    Returns:
+        dict: Per table, the rows and bytes still stored as text, the rows and
+        bytes stored compressed, the uncompressed size of the compressed rows
+        and the bytes saved
+    """
+    report = {}
+    length = func.octet_length if db.engine.dialect.name == 'postgresql' else func.length
+    with db.engine.connect() as conn:
+        for table_name, legacy, blob in COLUMNS:
+            table = db.metadata.tables[table_name]
+            legacy_rows, legacy_bytes = conn.execute(
+                select(func.count(), func.coalesce(func.sum(length(table.c[legacy])), 0))
+                .where(table.c[legacy].isnot(None))
+            ).one()
+
+            compressed_rows = compressed_bytes = raw_bytes = 0
+            # Only the five-byte header of each value is read
+            headers = conn.execute(
+                select(func.substr(table.c[blob], 1, 5), length(table.c[blob]))
+                .where(table.c[blob].isnot(None))
+            )
+            for header, size in headers:
+                compressed_rows += 1
+                compressed_bytes += size
+                raw_bytes += json_codec.raw_length(bytes(header))
+
+            report[table_name] = {
+                'text_rows': legacy_rows,
+                'text_bytes': int(legacy_bytes),
+                'compressed_rows': compressed_rows,
+                'compressed_bytes': compressed_bytes,
+                'uncompressed_bytes': raw_bytes,
+                'bytes_saved': raw_bytes - compressed_bytes,
+                'ratio': round(raw_bytes / compressed_bytes, 2) if compressed_bytes else None
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress stored JSON payloads")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows converted per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument("--report", action="store_true", help="Only print the storage report")
+    args = parser.parse_args()
+
+    from app import app, db
+    import models  # noqa: F401  registers the tables
+
+    with app.app_context():
+        if not args.report:
+            ensure_columns(db)
+            for table_name, legacy, blob in COLUMNS:
+                converted, legacy_bytes, compressed_bytes = migrate_table(
+                    db, table_name, legacy, blob, args.batch_size, args.pause)
+                print(f"{table_name}: converted {converted} rows, "
+                      f"{legacy_bytes} bytes -> {compressed_bytes} bytes")
+
+        for table_name, stats in storage_report(db).items():
+            print(f"{table_name}: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ from flask_login import UserMixin
 from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Text, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 import app as app_module
+from json_codec import CompressedJSON, CompressedJSONAttribute
 
 db = app_module.db
 
@@ -34,23 +35,145 @@ class SavedComparison(db.Model):
     document_b_type = db.Column(db.String, nullable=False)  # 'image' or 'pdf'
     document_a_url = db.Column(db.String, nullable=True)  # URL or path to stored file
     document_b_url = db.Column(db.String, nullable=True)  # URL or path to stored file
-    results_json = db.Column(db.Text, nullable=False)  # Stored as JSON string
+    document_a_hash = db.Column(db.String(64), db.ForeignKey('document_blobs.sha256'), nullable=True, index=True)  # Stored document (see blob_store.py)
+    document_b_hash = db.Column(db.String(64), db.ForeignKey('document_blobs.sha256'), nullable=True, index=True)  # Stored document (see blob_store.py)
+    results_blob = db.Column(CompressedJSON, nullable=True)  # Compressed JSON (see json_codec.py)
+    results_json_legacy = db.Column('results_json', db.Text, nullable=True)  # Uncompressed rows not yet migrated
+    results_json = CompressedJSONAttribute('results_blob', 'results_json_legacy')  # JSON string
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    # The dashboard lists a user's comparisons newest first
+    __table_args__ = (db.Index('ix_saved_comparisons_user_id_created_at', 'user_id', 'created_at'),)
 
 class SlideDeck(db.Model):
     __tablename__ = 'slide_decks'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=True)  # NULL for anonymous requests
     title = db.Column(db.String, nullable=False)
     description = db.Column(db.Text, nullable=True)
     video_url = db.Column(db.String, nullable=False)
     video_title = db.Column(db.String, nullable=True)
-    slides_json = db.Column(db.Text, nullable=True)  # Stored as JSON string
+    slides_blob = db.Column(CompressedJSON, nullable=True)  # Compressed JSON (see json_codec.py)
+    slides_json_legacy = db.Column('slides_json', db.Text, nullable=True)  # Uncompressed rows not yet migrated
+    slides_json = CompressedJSONAttribute('slides_blob', 'slides_json_legacy')  # JSON string
     slides_url = db.Column(db.String, nullable=True)  # URL to downloadable slides
     status = db.Column(db.String, default='pending', nullable=False)  # pending, processing, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    # Background job bookkeeping (see job_queue.py)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    locked_by = db.Column(db.String, nullable=True)  # ID of the worker currently processing the deck
+    locked_at = db.Column(db.DateTime, nullable=True)  # When the worker claimed the deck
+    error_message = db.Column(db.Text, nullable=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('slide_batches.id'), nullable=True, index=True)  # Set for decks submitted through the batch API
+    
+    # Workers scan for pending decks oldest first; the dashboard lists a
+    # user's decks newest first
+    __table_args__ = (db.Index('ix_slide_decks_status_created_at', 'status', 'created_at'),
+                      db.Index('ix_slide_decks_user_id_created_at', 'user_id', 'created_at'))
+
+class SlideBatch(db.Model):
+    """A group of slide decks submitted together (see batch_processor.py)."""
+    __tablename__ = 'slide_batches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=True)  # NULL for anonymous requests
+    title = db.Column(db.String, nullable=False)
+    playlist_url = db.Column(db.String, nullable=True)  # Set when the batch was expanded from a playlist
+    concurrency = db.Column(db.Integer, nullable=False)  # Maximum decks of this batch processed at once
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    decks = db.relationship('SlideDeck', backref='batch', lazy=True, order_by='SlideDeck.id')
+
+class VideoMetadata(db.Model):
+    """Shared cache of scraped YouTube metadata (see video_metadata.py)."""
+    __tablename__ = 'video_metadata'
+    
+    video_id = db.Column(db.String(11), primary_key=True)
+    info = db.Column(db.JSON, nullable=False)
+    fetched_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+class Transcript(db.Model):
+    """Stored YouTube transcripts, including negative entries (see transcript_store.py)."""
+    __tablename__ = 'transcripts'
+    
+    video_id = db.Column(db.String(11), primary_key=True)
+    language = db.Column(db.String(16), primary_key=True)
+    status = db.Column(db.String, nullable=False)  # available, missing, error
+    entries = db.Column(db.LargeBinary, nullable=True)  # zlib-compressed JSON list of entries
+    error_message = db.Column(db.Text, nullable=True)
+    fetched_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class CachedPresentation(db.Model):
+    """Generated presentations shared between workers (see presentation_cache.py)."""
+    __tablename__ = 'cached_presentations'
+    
+    cache_key = db.Column(db.String, primary_key=True)  # video ID and generator version
+    video_id = db.Column(db.String(11), nullable=False)
+    generator_version = db.Column(db.String, nullable=False, index=True)
+    presentation_json = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+class LLMResponse(db.Model):
+    """Cached chat completion responses (see llm_cache.py)."""
+    __tablename__ = 'llm_responses'
+    
+    cache_key = db.Column(db.String(64), primary_key=True)  # SHA-256 of model, messages and response format
+    model = db.Column(db.String, nullable=False)
+    response = db.Column(db.JSON, nullable=False)  # Parsed response content
+    prompt_tokens = db.Column(db.Integer, default=0, nullable=False)
+    completion_tokens = db.Column(db.Integer, default=0, nullable=False)
+    latency_ms = db.Column(db.Float, default=0, nullable=False)  # Wall-clock time of the original API call
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    last_hit_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class DocumentProfile(db.Model):
+    """Term and feature profiles of compared documents (see comparison_engine.py)."""
+    __tablename__ = 'document_profiles'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 of the document's bytes
+    profile_version = db.Column(db.Integer, nullable=False)
+    page_count = db.Column(db.Integer, nullable=False)
+    word_count = db.Column(db.Integer, nullable=False)
+    profile = db.Column(CompressedJSON, nullable=False)  # Term counts and features (see json_codec.py)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+class ImageDiff(db.Model):
+    """Pixel comparisons of image pairs (see image_diff.py)."""
+    __tablename__ = 'image_diffs'
+    
+    pair_key = db.Column(db.String(129), primary_key=True)  # SHA-256 of image A and of image B
+    diff_version = db.Column(db.Integer, nullable=False)
+    result = db.Column(CompressedJSON, nullable=False)  # SSIM, heatmap and regions (see json_codec.py)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+class DocumentBlob(db.Model):
+    """Uploaded documents, stored once per content hash (see blob_store.py)."""
+    __tablename__ = 'document_blobs'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)  # SHA-256 of the document's bytes
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String, nullable=False)  # Sniffed from the bytes, not the upload
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+class BlobUpload(db.Model):
+    """Chunked document uploads (see blob_store.py)."""
+    __tablename__ = 'blob_uploads'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=True, index=True)  # NULL for anonymous uploads
+    filename = db.Column(db.String, nullable=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, default=0, nullable=False)  # Bytes written so far
+    status = db.Column(db.String, default='uploading', nullable=False)  # uploading, complete
+    sha256 = db.Column(db.String(64), db.ForeignKey('document_blobs.sha256'), nullable=True, index=True)  # Set on completion
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
 
 class OAuth(db.Model):
     """OAuth token storage for Flask-Dance."""
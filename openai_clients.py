@@ -0,0 +1,121 @@
+"""
+Pooled OpenAI clients.
+
+Creating an OpenAI client per request means a new HTTP connection pool, and a
+new TLS handshake, for every slide deck. Instead, clients are cached per API
+key and all of them send their requests through one shared httpx client, so
+keep-alive connections to the API are reused across keys and requests.
+
+Clients are looked up by a SHA-256 hash of the API key; the raw key is never
+used as a cache key or logged. Clients that go unused for
+CLIENT_IDLE_TIMEOUT seconds are dropped, and at most CLIENT_CACHE_SIZE are
+kept, least recently used first out.
+"""
+import os
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Maximum number of per-key clients kept
+CLIENT_CACHE_SIZE = int(os.environ.get("OPENAI_CLIENT_CACHE_SIZE", "64"))
+# Seconds an unused client is kept before it is dropped
+CLIENT_IDLE_TIMEOUT = float(os.environ.get("OPENAI_CLIENT_IDLE_TIMEOUT", "900"))
+# Maximum open connections to the API, shared by every client
+MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+# Maximum idle keep-alive connections held open
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+# Seconds an idle keep-alive connection stays open
+KEEPALIVE_EXPIRY = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "60"))
+# Seconds to wait for a response from the API
+REQUEST_TIMEOUT = float(os.environ.get("OPENAI_REQUEST_TIMEOUT", "120"))
+# Seconds to wait for a connection to the API
+CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "10"))
+# Retries the OpenAI client makes for connection errors and 429/5xx responses
+MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+
+_http_client = None
+_clients = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+
+def key_fingerprint(api_key):
+    """Hash an API key for use as a cache key."""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        _http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                                keepalive_expiry=KEEPALIVE_EXPIRY),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+    return _http_client
+
+
+def _expire_idle(now):
+    """Drop clients idle for longer than CLIENT_IDLE_TIMEOUT. Caller holds _lock."""
+    # The dict is in least recently used order, so stop at the first live one
+    while _clients:
+        fingerprint, (last_used, _) = next(iter(_clients.items()))
+        if now - last_used < CLIENT_IDLE_TIMEOUT:
+            break
+        del _clients[fingerprint]
+        _stats["expirations"] += 1
+
+
+def get_client(api_key):
+    """
+    Return a cached OpenAI client for an API key, creating it if needed.
+
+    Args:
+        api_key (str): OpenAI API key
+
+    Returns:
+        OpenAI: Client that shares the process-wide connection pool
+    """
+    from openai import OpenAI
+
+    fingerprint = key_fingerprint(api_key)
+    now = time.monotonic()
+    with _lock:
+        _expire_idle(now)
+        entry = _clients.get(fingerprint)
+        if entry is not None:
+            _clients[fingerprint] = (now, entry[1])
+            _clients.move_to_end(fingerprint)
+            _stats["hits"] += 1
+            return entry[1]
+
+        _stats["misses"] += 1
+        client = OpenAI(api_key=api_key, http_client=_get_http_client(), max_retries=MAX_RETRIES)
+        _clients[fingerprint] = (now, client)
+        while len(_clients) > CLIENT_CACHE_SIZE:
+            # Clients don't own the shared pool, so evicting one closes nothing
+            _clients.popitem(last=False)
+            _stats["evictions"] += 1
+        logging.debug("Created OpenAI client for key %s", fingerprint[:8])
+        return client
+
+
+def discard(api_key):
+    """Forget the client for a key, e.g. after the API rejected it."""
+    with _lock:
+        _clients.pop(key_fingerprint(api_key), None)
+
+
+def get_stats():
+    """Client cache size and reuse rate."""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(_stats,
+                    size=len(_clients),
+                    max_size=CLIENT_CACHE_SIZE,
+                    reuse_rate=round(_stats["hits"] / lookups, 4) if lookups else 0.0)
@@ -1,57 +1,42 @@
 import os
 import json
-import requests
 import re
 import logging
-from pytube import YouTube
-from openai import OpenAI
+from video_metadata import UNAVAILABLE_INFO, extract_video_id, get_video_info
+import fetch_pool
+import image_proxy
+import openai_clients
+import llm_cache
+import summarizer
+import transcript_segmenter
+import transcript_store
 
-# Default OpenAI client using environment variable (fallback)
+# Default OpenAI API key from the environment (fallback)
 default_api_key = os.environ.get("OPENAI_API_KEY")
-default_client = OpenAI(api_key=default_api_key) if default_api_key else None
 
 # Function to get OpenAI client with user's API key
 def get_client(api_key=None):
-    """Get an OpenAI client instance with the provided API key or default"""
-    if api_key:
-        return OpenAI(api_key=api_key)
-    elif default_client:
-        return default_client
-    else:
+    """Get a pooled OpenAI client for the provided API key or the default one"""
+    api_key = api_key or default_api_key
+    if not api_key:
         raise ValueError("No API key provided and no default API key configured")
+    return openai_clients.get_client(api_key)
 
-def extract_video_id(youtube_url):
-    """Extract the YouTube video ID from a URL."""
-    # Regular expression to match YouTube video IDs
-    youtube_regex = r'(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'
-    match = re.search(youtube_regex, youtube_url)
-    return match.group(1) if match else None
+def _is_authentication_error(error):
+    """Whether an API call failed because the key was rejected."""
+    # openai is only imported once a call has been made, not when this module is
+    try:
+        from openai import AuthenticationError
+    except ImportError:
+        return False
+    return isinstance(error, AuthenticationError)
 
 def download_video_thumbnail(video_id):
     """Download and return the URL to a YouTube video thumbnail."""
     thumbnail_url = f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
     return thumbnail_url
 
-def get_video_info(youtube_url):
-    """Get basic information about a YouTube video."""
-    try:
-        yt = YouTube(youtube_url)
-        return {
-            "title": yt.title,
-            "author": yt.author,
-            "description": yt.description,
-            "length_seconds": yt.length,
-            "views": yt.views,
-            "thumbnail_url": yt.thumbnail_url
-        }
-    except Exception as e:
-        logging.error(f"Error getting video info: {str(e)}")
-        return {
-            "title": "Video information unavailable",
-            "thumbnail_url": None
-        }
-
-def analyze_video_content(video_url, api_key=None):
+def analyze_video_content(video_url, api_key=None, force_regenerate=False):
     """
     Analyze a YouTube video and extract key points for slides.
     This is a simplified version that would actually use frames and audio in production.
@@ -59,10 +44,39 @@ def analyze_video_content(video_url, api_key=None):
     Args:
         video_url (str): URL of the YouTube video to analyze
         api_key (str, optional): OpenAI API key. If not provided, uses default key.
+        force_regenerate (bool): Ignore any cached response for the same prompt
     """
-    # Get video basic info
-    video_info = get_video_info(video_url)
+    # Start the metadata scrape on the shared upstream pool; the client is
+    # set up while it runs. Invalid URLs never reach YouTube.
     video_id = extract_video_id(video_url)
+    # Metadata and transcript share one wait budget
+    deadline = fetch_pool.Deadline()
+    info_future = fetch_pool.submit(get_video_info, video_url) if video_id else None
+    transcript_future = None
+    if video_id and transcript_store.get_api():
+        transcript_future = fetch_pool.submit(transcript_store.get_transcript_entries, video_id)
+    
+    # Get OpenAI client with user's API key or default
+    try:
+        client = get_client(api_key)
+        client_error = None
+    except ValueError as e:
+        client = None
+        client_error = e
+    
+    if client_error is not None:
+        # Nothing will be generated, so use the metadata only if it's already here
+        if transcript_future is not None:
+            fetch_pool.cancel(transcript_future)
+        if info_future is not None and not info_future.done():
+            fetch_pool.cancel(info_future)
+            info_future = None
+    
+    if info_future is not None:
+        video_info = fetch_pool.wait_for(info_future, deadline.remaining(),
+                                         dict(UNAVAILABLE_INFO), "video metadata")
+    else:
+        video_info = dict(UNAVAILABLE_INFO)
     
     # Default presentation data in case of errors
     default_presentation = {
@@ -82,13 +96,16 @@ def analyze_video_content(video_url, api_key=None):
         }
     }
     
-    # Get OpenAI client with user's API key or default
-    try:
-        client = get_client(api_key)
-    except ValueError as e:
-        logging.error(f"API key error: {str(e)}")
+    if client_error is not None:
+        logging.error("API key error: %s", client_error)
         return default_presentation
     
+    transcript = None
+    if transcript_future is not None:
+        entries = fetch_pool.wait_for(transcript_future, deadline.remaining(), None, "transcript")
+        if entries:
+            transcript = transcript_segmenter.join_entries(entries)[0]
+    
     # In a full implementation, we would:
     # 1. Extract frames from the video at regular intervals
     # 2. Extract audio and transcribe it
@@ -98,8 +115,8 @@ def analyze_video_content(video_url, api_key=None):
     prompt = f"""
     Create a presentation based on the following YouTube video:
     
-    Title: {video_info['title']}
-    Description: {video_info['description']}
+    Title: {video_info.get('title', '')}
+    Description: {video_info.get('description', '')}
     
     Format the presentation as a JSON object with the following structure:
     {{
@@ -123,42 +140,45 @@ def analyze_video_content(video_url, api_key=None):
     """
     
     try:
-        # Call OpenAI API to generate presentation content
-        response = client.chat.completions.create(
-            model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
-            messages=[
-                {"role": "system", "content": "You are an expert at creating professional presentations based on video content."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
+        if transcript:
+            # Summarize the transcript in parallel chunks, then build the slides
+            # from the summaries in one call
+            presentation_data = summarizer.summarize_to_presentation(
+                client, video_info, transcript, bypass=force_regenerate)
+        else:
+            # Call OpenAI API to generate presentation content; the prompt only
+            # depends on the video, so repeat requests are served from the cache
+            presentation_data = llm_cache.cached_chat_completion(
+                client,
+                model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
+                messages=[
+                    {"role": "system", "content": "You are an expert at creating professional presentations based on video content."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                bypass=force_regenerate
+            )
         
-        # Parse the response
-        content = response.choices[0].message.content
+        # Add video metadata
+        presentation_data["video_metadata"] = {
+            "title": video_info.get("title", ""),
+            "author": video_info.get("author", ""),
+            "url": video_url,
+            "thumbnail_url": video_info.get("thumbnail_url", f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
+        }
         
-        if not content:
-            logging.error("No content returned from OpenAI API")
-            return default_presentation
-            
-        try:
-            presentation_data = json.loads(content)
-            
-            # Add video metadata
-            presentation_data["video_metadata"] = {
-                "title": video_info.get("title", ""),
-                "author": video_info.get("author", ""),
-                "url": video_url,
-                "thumbnail_url": video_info.get("thumbnail_url", f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
-            }
-            
-            return presentation_data
-            
-        except json.JSONDecodeError as json_err:
-            logging.error(f"JSON parse error: {str(json_err)}")
-            return default_presentation
+        return presentation_data
         
+    except json.JSONDecodeError as json_err:
+        logging.error("JSON parse error: %s", json_err)
+        return default_presentation
     except Exception as e:
-        logging.error(f"Error analyzing video content: {str(e)}")
+        if _is_authentication_error(e):
+            # Don't keep a client around for a key the API rejected
+            openai_clients.discard(api_key or default_api_key)
+            logging.error("OpenAI rejected the API key: %s", e)
+        else:
+            logging.error("Error analyzing video content: %s", e)
         return default_presentation
 
 def generate_slide_images(slides):
@@ -174,21 +194,23 @@ def generate_slide_images(slides):
     
     return slides
 
-def process_video(video_url, api_key=None):
+def process_video(video_url, api_key=None, force_regenerate=False):
     """
     Main function to process a video and generate a presentation.
     
     Args:
         video_url (str): URL of the YouTube video to analyze
         api_key (str, optional): OpenAI API key. If not provided, uses default key.
+        force_regenerate (bool): Ignore any cached LLM response for this video
     """
-    logging.info(f"Processing video: {video_url}")
+    logging.info("Processing video: %s", video_url)
     
     # Analyze video content with the provided API key
-    presentation_data = analyze_video_content(video_url, api_key)
+    presentation_data = analyze_video_content(video_url, api_key, force_regenerate)
     
     # Generate images for slides
     if "slides" in presentation_data:
         presentation_data["slides"] = generate_slide_images(presentation_data["slides"])
     
-    return presentation_data
\ No newline at end of file
+    # Serve the images through our proxy
+    return image_proxy.rewrite_presentation(presentation_data)
\ No newline at end of file
@@ -0,0 +1,411 @@
+"""
+Request coalescing and result cache for generated presentations.
+
+Presentations are cached per video ID and generator version. The generator
+version is a hash of GENERATOR_REVISION and of the source of every module
+that shapes the presentation, so deploying a change to them invalidates
+every cached presentation without any manual step.
+
+When several requests for the same uncached video arrive together, only one
+of them runs the generator and the rest wait for its result, whether they
+asked for the whole presentation (get_or_generate) or for its events as they
+are generated (iter_events):
+
+* within a process, through an in-flight table guarded by a lock;
+* across worker processes and nodes, through a PostgreSQL advisory lock (or a
+  file lock when running on another database), after which the waiter finds
+  the result in the shared cache.
+"""
+import os
+import hashlib
+import importlib.util
+import json
+import logging
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import metrics
+from video_metadata import TTLCache, UNAVAILABLE_INFO, extract_video_id
+
+# Modules whose source determines the generated presentation: the pipeline,
+# the metadata and transcript it reads, the image URLs it rewrites, and the
+# deadlines that decide which fetches make it in
+GENERATOR_MODULES = ('transcript_utils', 'transcript_segmenter', 'transcript_store', 'video_metadata',
+                     'image_proxy', 'fetch_pool')
+# Bump to invalidate cached presentations when something outside
+# GENERATOR_MODULES changes them, such as a library upgrade
+GENERATOR_REVISION = 1
+
+# Seconds a cached presentation stays valid
+PRESENTATION_TTL = int(os.environ.get("PRESENTATION_CACHE_TTL", "86400"))
+# Maximum number of presentations held in each worker's in-process cache
+LOCAL_CACHE_SIZE = int(os.environ.get("PRESENTATION_CACHE_SIZE", "256"))
+# Seconds to wait for an in-flight computation, in this worker or another,
+# before giving up and computing; with the computation itself, this stays
+# below the gunicorn timeout
+COALESCE_TIMEOUT = float(os.environ.get("PRESENTATION_COALESCE_TIMEOUT", "60"))
+# Directory for cross-process lock files when PostgreSQL advisory locks are unavailable
+LOCK_DIR = os.environ.get("PRESENTATION_LOCK_DIR", os.path.join(tempfile.gettempdir(), "presentation-locks"))
+
+
+def _compute_generator_version():
+    digest = hashlib.sha256(f"revision {GENERATOR_REVISION}".encode('utf-8'))
+    for name in GENERATOR_MODULES:
+        spec = importlib.util.find_spec(name)
+        if spec is None or not spec.origin:
+            digest.update(name.encode('utf-8'))
+            continue
+        with open(spec.origin, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+GENERATOR_VERSION = _compute_generator_version()
+
+_local_cache = TTLCache(LOCAL_CACHE_SIZE, PRESENTATION_TTL)
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def cache_key(video_id):
+    return f"{video_id}:{GENERATOR_VERSION}"
+
+
+def _store_available():
+    try:
+        from flask import has_app_context
+        return has_app_context()
+    except ImportError:
+        return False
+
+
+def _load_shared(key):
+    if not _store_available():
+        return None
+
+    from sqlalchemy import select
+    from app import db
+    from models import CachedPresentation
+
+    table = CachedPresentation.__table__
+    try:
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.presentation_json, table.c.created_at).where(table.c.cache_key == key)
+            ).first()
+    except Exception as e:
+        logging.error("Error reading presentation cache: %s", e)
+        return None
+
+    if row is None or row.created_at < datetime.now() - timedelta(seconds=PRESENTATION_TTL):
+        return None
+    return json.loads(row.presentation_json)
+
+
+def _store_shared(key, video_id, presentation):
+    if not _store_available():
+        return
+
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from models import CachedPresentation
+
+    table = CachedPresentation.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.cache_key == key))
+            conn.execute(table.insert().values(
+                cache_key=key,
+                video_id=video_id,
+                generator_version=GENERATOR_VERSION,
+                presentation_json=json.dumps(presentation),
+                created_at=datetime.now()
+            ))
+    except IntegrityError:
+        pass
+    except Exception as e:
+        logging.error("Error writing presentation cache: %s", e)
+
+
+def purge_stale_versions():
+    """Delete cached presentations built by other generator versions."""
+    if not _store_available():
+        return 0
+
+    from app import db
+    from models import CachedPresentation
+
+    table = CachedPresentation.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(table.delete().where(table.c.generator_version != GENERATOR_VERSION))
+    return result.rowcount
+
+
+def is_cacheable(presentation):
+    """Only cache presentations built from real metadata and a real transcript."""
+    metadata = presentation.get("video_metadata")
+    if not metadata:
+        return False
+    if metadata.get("title") == UNAVAILABLE_INFO["title"]:
+        return False
+    return metadata.get("has_transcript", True)
+
+
+def get_cached(video_url):
+    """Return the cached presentation for a video, or None."""
+    video_id = extract_video_id(video_url)
+    if not video_id:
+        return None
+
+    key = cache_key(video_id)
+    presentation = _local_cache.get(key)
+    if presentation is not None:
+        metrics.count_cache('presentations', 'local_hits')
+        return presentation
+    presentation = _load_shared(key)
+    if presentation is not None:
+        metrics.count_cache('presentations', 'shared_hits')
+        _local_cache.set(key, presentation)
+    else:
+        metrics.count_cache('presentations', 'misses')
+    return presentation
+
+
+def _lock_id(key):
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+@contextmanager
+def _cross_worker_lock(key):
+    """Hold a lock on key shared by all workers; yields False if it timed out."""
+    deadline = time.monotonic() + COALESCE_TIMEOUT
+
+    if _store_available():
+        from sqlalchemy import text
+        from app import db
+
+        if db.engine.dialect.name == 'postgresql':
+            lock_id = _lock_id(key)
+            with db.engine.connect() as conn:
+                acquired = False
+                while True:
+                    acquired = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}).scalar()
+                    if acquired or time.monotonic() > deadline:
+                        break
+                    time.sleep(0.1)
+                try:
+                    yield acquired
+                finally:
+                    if acquired:
+                        conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+                    conn.commit()
+            return
+
+    import fcntl
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(os.path.join(LOCK_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest()), 'w') as lock_file:
+        acquired = False
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    break
+                time.sleep(0.1)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _cache_presentation(key, video_id, presentation):
+    if is_cacheable(presentation):
+        _local_cache.set(key, presentation)
+        _store_shared(key, video_id, presentation)
+
+
+def _generate(key, video_id, video_url, generate):
+    presentation = generate(video_url)
+    _cache_presentation(key, video_id, presentation)
+    return presentation
+
+
+def _iter_generated(key, video_id, video_url):
+    """Yield the events of a newly generated presentation and cache it; returns the presentation."""
+    import transcript_utils
+
+    presentation = {'slides': []}
+    for event in transcript_utils.iter_presentation_events(video_url):
+        transcript_utils.add_presentation_event(presentation, event)
+        yield event
+    _cache_presentation(key, video_id, presentation)
+    return presentation
+
+
+def _compute(key, video_id, video_url, generate):
+    with _cross_worker_lock(key) as acquired:
+        if not acquired:
+            logging.warning("Timed out waiting for in-flight presentation %s; generating anyway", key)
+
+        # Another worker may have finished while we waited for the lock
+        presentation = _load_shared(key)
+        if presentation is not None:
+            _local_cache.set(key, presentation)
+            return presentation
+
+        return _generate(key, video_id, video_url, generate)
+
+
+def _join_inflight(key):
+    """Return (call, is_leader) for key; the leader must finish the call with _finish_inflight."""
+    with _inflight_lock:
+        call = _inflight.get(key)
+        if call is not None:
+            return call, False
+        call = _inflight[key] = _InFlightCall()
+        return call, True
+
+
+def _finish_inflight(key, call):
+    with _inflight_lock:
+        _inflight.pop(key, None)
+    call.event.set()
+
+
+def _wait_inflight(call):
+    """
+    Wait up to COALESCE_TIMEOUT for the leader's result.
+
+    Returns None if the leader gave up without a result, or if it is still
+    running when the time is up; call.event is set only in the first case.
+    """
+    if not call.event.wait(COALESCE_TIMEOUT):
+        return None
+    if call.error is not None:
+        raise call.error
+    return call.result
+
+
+def get_or_generate(video_url, generate):
+    """
+    Return the presentation for a video, generating it at most once.
+
+    Args:
+        video_url (str): URL of the YouTube video
+        generate (callable): Builds the presentation dict from video_url
+
+    Returns:
+        dict: Presentation data with slides
+    """
+    video_id = extract_video_id(video_url)
+    if not video_id:
+        return generate(video_url)
+
+    presentation = get_cached(video_url)
+    if presentation is not None:
+        return presentation
+
+    key = cache_key(video_id)
+    call, is_leader = _join_inflight(key)
+    if not is_leader:
+        presentation = _wait_inflight(call)
+        if presentation is not None:
+            return presentation
+        if call.event.is_set():
+            # The leader was a stream whose client went away
+            return get_or_generate(video_url, generate)
+        # Waiting on the cross-worker lock as well would overrun the gunicorn timeout
+        logging.warning("Timed out waiting for in-flight presentation %s; generating anyway", key)
+        return _generate(key, video_id, video_url, generate)
+
+    try:
+        call.result = _compute(key, video_id, video_url, generate)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        _finish_inflight(key, call)
+
+
+def iter_events(video_url):
+    """
+    Yield the events of a video's presentation, generating it at most once.
+
+    The streaming counterpart of get_or_generate: the request that generates
+    the presentation passes on the events of
+    transcript_utils.iter_presentation_events as they come, and caches the
+    presentation they add up to. Requests for the same video meanwhile, in
+    this process or another worker, wait for it and replay the finished
+    presentation. If the generating request's client disconnects, a waiting
+    request generates the presentation itself.
+
+    Args:
+        video_url (str): URL of the YouTube video
+
+    Yields:
+        dict: start, slide and end events
+    """
+    import transcript_utils
+
+    video_id = extract_video_id(video_url)
+    if not video_id:
+        yield from transcript_utils.iter_presentation_events(video_url)
+        return
+
+    presentation = get_cached(video_url)
+    if presentation is not None:
+        yield from transcript_utils.presentation_events_from_dict(presentation)
+        return
+
+    key = cache_key(video_id)
+    call, is_leader = _join_inflight(key)
+    if not is_leader:
+        presentation = _wait_inflight(call)
+        if presentation is not None:
+            yield from transcript_utils.presentation_events_from_dict(presentation)
+        elif call.event.is_set():
+            yield from iter_events(video_url)
+        else:
+            logging.warning("Timed out waiting for in-flight presentation %s; generating anyway", key)
+            yield from _iter_generated(key, video_id, video_url)
+        return
+
+    try:
+        with _cross_worker_lock(key) as acquired:
+            if not acquired:
+                logging.warning("Timed out waiting for in-flight presentation %s; generating anyway", key)
+
+            # Another worker may have finished while we waited for the lock
+            shared = _load_shared(key)
+            if shared is None:
+                call.result = yield from _iter_generated(key, video_id, video_url)
+                return
+            _local_cache.set(key, shared)
+            call.result = shared
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        # Also runs when the client disconnects mid-stream; waiters then
+        # find no result and generate it themselves
+        _finish_inflight(key, call)
+
+    # Replayed after releasing the waiters, so they don't wait on this client
+    yield from transcript_utils.presentation_events_from_dict(shared)
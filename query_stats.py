@@ -0,0 +1,212 @@
+"""
+Per-request SQL instrumentation.
+
+Engine events time every statement the application runs. For each request
+the stats record the number of queries, the total time spent in the database
+and the slowest statements, with their parameter values redacted. A
+statement shape that runs N_PLUS_ONE_THRESHOLD or more times in one request
+is flagged as an N+1 suspect, which is usually a lazy relationship or a
+per-row lookup inside a loop.
+
+The summary is returned in the X-Query-Stats response header and the most
+recent requests are kept for /api/debug/query-stats. Recording can be turned
+on and off at runtime; when off, the event handlers return immediately.
+"""
+import os
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache
+
+# Record query stats from startup
+ENABLED = os.environ.get("QUERY_STATS_ENABLED", "1") == "1"
+# Statements slower than this many milliseconds are logged
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+# Runs of one statement shape in a request that mark it as an N+1 suspect
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "5"))
+# Slowest statements kept per request
+SLOWEST_KEPT = 5
+# Requests kept for the debug endpoint
+RECENT_REQUESTS = int(os.environ.get("QUERY_STATS_RECENT", "50"))
+# Token required by the debug endpoint outside debug mode; unset disables it
+DEBUG_TOKEN = os.environ.get("QUERY_STATS_DEBUG_TOKEN")
+
+_enabled = ENABLED
+_recent = deque(maxlen=RECENT_REQUESTS)
+_recent_lock = threading.Lock()
+_listening = False
+
+
+class RequestStats:
+    """Queries run while handling one request."""
+
+    __slots__ = ('count', 'total_ms', 'shapes', 'slowest')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+        self.slowest = []  # min-heap of (elapsed_ms, statement, redacted parameters)
+
+    def record(self, statement, parameters, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[statement_shape(statement)] += 1
+        entry = (elapsed_ms, statement, redact(parameters))
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        elif elapsed_ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def n_plus_one_suspects(self):
+        return [{'statement': shape, 'count': count}
+                for shape, count in self.shapes.most_common()
+                if count >= N_PLUS_ONE_THRESHOLD]
+
+    def summary(self):
+        return {
+            'queries': self.count,
+            'db_time_ms': round(self.total_ms, 2),
+            'slowest': [{'ms': round(ms, 2), 'statement': statement, 'parameters': parameters}
+                        for ms, statement, parameters in sorted(self.slowest, reverse=True)],
+            'n_plus_one_suspects': self.n_plus_one_suspects()
+        }
+
+    def header_value(self):
+        return f"count={self.count};db_ms={self.total_ms:.1f};n_plus_one={len(self.n_plus_one_suspects())}"
+
+
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\([^)]*\)s|:\w+|__\[POSTCOMPILE_\w+\])(?:\s*,\s*(?:\?|%\([^)]*\)s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement):
+    """Reduce a statement to its shape, so the same query with different values compares equal."""
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def redact(parameters):
+    """Replace parameter values with their type names."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: describe the first row and how many there were
+            return {'rows': len(parameters), 'first': redact(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _current_stats():
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return None
+    if not has_request_context():
+        return None
+    return g.get('_query_stats')
+
+
+def current_stats():
+    """Stats of the request being handled, or None outside a request or while disabled."""
+    return _current_stats()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _enabled:
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_query_started')
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logging.warning("Slow query (%.1fms): %s %s", elapsed_ms, statement_shape(statement), redact(parameters))
+
+    stats = _current_stats()
+    if stats is not None:
+        stats.record(statement, parameters, elapsed_ms)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get('_query_started') if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def set_enabled(enabled):
+    """Turn recording on or off for this process."""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled
+
+
+def get_recent():
+    """Summaries of the most recent instrumented requests, newest first."""
+    with _recent_lock:
+        return list(reversed(_recent))
+
+
+def _start_request():
+    from flask import g
+    if _enabled:
+        g._query_stats = RequestStats()
+
+
+def _finish_request(response):
+    from flask import request
+    stats = _current_stats()
+    if stats is None:
+        return response
+
+    response.headers['X-Query-Stats'] = stats.header_value()
+    summary = stats.summary()
+    suspects = summary['n_plus_one_suspects']
+    if suspects:
+        logging.warning("Possible N+1 queries in %s %s: %s", request.method, request.path,
+                        ', '.join(str(s['count']) + 'x ' + s['statement'][:120] for s in suspects))
+
+    summary.update(method=request.method, path=request.path, status=response.status_code,
+                   at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    with _recent_lock:
+        _recent.append(summary)
+    return response
+
+
+def debug_access_allowed(request, app):
+    """The debug endpoint is open in debug mode, otherwise it needs DEBUG_TOKEN."""
+    if app.debug:
+        return True
+    return bool(DEBUG_TOKEN) and request.headers.get('X-Debug-Token') == DEBUG_TOKEN
+
+
+def init_app(app):
+    """Listen to engine events and attach per-request stats to app."""
+    global _listening
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -148,7 +148,7 @@ def require_login(f):
                         return redirect(url_for('replit_auth.login'))
         except Exception as e:
             # Log the error but continue - we don't want to block the user
-            app.logger.error(f"Error refreshing token: {str(e)}")
+            app.logger.error("Error refreshing token: %s", e)
 
         return f(*args, **kwargs)
 
@@ -0,0 +1,156 @@
+"""
+Startup timing and preloading.
+
+Worker boot time is mostly imports. record_imports times every module
+imported while it is active, the way `python -X importtime` does: each
+import's total time, and its self time excluding the imports it triggered.
+timed records named startup steps. wsgi.py uses both around importing and
+creating the app, and report() turns them into a breakdown by step, by
+package and by slowest module, which is logged at startup and exported as
+the app_startup_seconds gauge.
+
+Libraries only some requests need (pytube, youtube_transcript_api, openai,
+tiktoken) are imported on first use, so a worker that never needs them
+never pays for them. Under gunicorn --preload (see gunicorn.conf.py),
+preload() instead imports them and the app's lazily imported modules once
+in the master process, then freezes the garbage collector's view of those
+objects: workers forked afterwards share the pages copy-on-write, and the
+collector doesn't dirty them by touching reference counts and GC headers.
+
+This module only uses the standard library, so importing it costs nothing
+that is being measured.
+"""
+import builtins
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Slowest modules listed in the startup log
+STARTUP_LOG_MODULES = int(os.environ.get("STARTUP_LOG_MODULES", "10"))
+
+# Modules imported on first use by routes and jobs, and the libraries they
+# defer; preload() imports them before workers are forked
+PRELOAD_MODULES = (
+    'models', 'dashboard', 'blob_store', 'batch_processor', 'presentation_cache',
+    'transcript_utils', 'youtube_processor', 'openai_utils', 'comparison_engine',
+    'image_diff', 'export_engine', 'image_proxy',
+    'pytube', 'youtube_transcript_api', 'openai', 'httpx', 'requests', 'tiktoken',
+)
+
+_steps = {}
+# (module name, total seconds, self seconds) per import, in completion order
+_imports = []
+_original_import = None
+_recording_thread = None
+_child_seconds = []
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only first imports from the recording thread are timed; relative
+    # imports are counted in the module that made them
+    if level or name in sys.modules or threading.get_ident() != _recording_thread:
+        return _original_import(name, globals, locals, fromlist, level)
+    _child_seconds.append(0.0)
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        children = _child_seconds.pop()
+        if _child_seconds:
+            _child_seconds[-1] += elapsed
+        _imports.append((name, elapsed, elapsed - children))
+
+
+@contextmanager
+def record_imports():
+    """Time every module the current thread imports for the first time."""
+    global _original_import, _recording_thread
+    if _original_import is not None:
+        # Already recording
+        yield
+        return
+    _original_import = builtins.__import__
+    _recording_thread = threading.get_ident()
+    builtins.__import__ = _timed_import
+    try:
+        yield
+    finally:
+        builtins.__import__ = _original_import
+        _original_import = None
+        _recording_thread = None
+
+
+@contextmanager
+def timed(step):
+    """Record how long a startup step takes. Repeated steps add up."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _steps[step] = _steps.get(step, 0.0) + time.perf_counter() - started
+
+
+def step_seconds():
+    """Startup steps, for the app_startup_seconds gauge."""
+    return {(step,): round(seconds, 6) for step, seconds in _steps.items()}
+
+
+def report(top=STARTUP_LOG_MODULES):
+    """
+    Break startup time down by step, package and module.
+
+    Returns:
+        dict: steps and packages map names to milliseconds; modules lists
+        the top slowest imports by self time as {name, self_ms, total_ms}
+    """
+    packages = {}
+    for name, _, self_seconds in _imports:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + self_seconds
+    slowest = sorted(_imports, key=lambda record: record[2], reverse=True)[:top]
+    return {
+        'total_ms': round(sum(_steps.values()) * 1000, 1),
+        'steps': {step: round(seconds * 1000, 1) for step, seconds in _steps.items()},
+        'packages': {package: round(seconds * 1000, 1)
+                     for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)},
+        'modules': [{'name': name, 'self_ms': round(self_seconds * 1000, 1), 'total_ms': round(total * 1000, 1)}
+                    for name, total, self_seconds in slowest]
+    }
+
+
+def log_report():
+    """Log where startup time went."""
+    summary = report()
+    logging.info("Started in %.0fms (pid %d): %s", summary['total_ms'], os.getpid(),
+                 ", ".join(f"{step}={ms:.0f}ms" for step, ms in summary['steps'].items()))
+    if summary['modules']:
+        logging.info("Slowest imports: %s",
+                     ", ".join(f"{module['name']}={module['self_ms']:.0f}ms" for module in summary['modules']))
+
+
+def preload(modules=PRELOAD_MODULES):
+    """
+    Import modules that are otherwise imported on first use, then freeze them
+    out of garbage collection so forked workers share their memory.
+
+    Call in the gunicorn master, after the app is loaded and before workers
+    are forked. Modules that aren't installed are skipped.
+    """
+    with record_imports(), timed('preload'):
+        for name in modules:
+            try:
+                # Through __import__ so record_imports times it
+                builtins.__import__(name)
+            except ImportError as e:
+                logging.info("Not preloading %s: %s", name, e)
+        # Let the deferred loaders know their import already happened
+        if 'transcript_store' in sys.modules:
+            sys.modules['transcript_store'].get_api()
+    gc.collect()
+    gc.freeze()
+    log_report()
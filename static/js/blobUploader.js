@@ -0,0 +1,164 @@
+/**
+ * Blob Uploader class
+ * Uploads documents to the server's blob store in resumable chunks
+ */
+class BlobUploader {
+    constructor(options = {}) {
+        this.chunkSize = options.chunkSize || 4 * 1024 * 1024;
+        this.maxRetries = options.maxRetries || 5;
+    }
+    
+    /**
+     * Uploads a document, resuming an earlier interrupted upload of it
+     * @param {Blob} blob - File or downloaded document
+     * @param {string} name - File name or URL of the document
+     * @param {Function} onProgress - Optional callback receiving (bytes sent, total bytes)
+     * @returns {Promise} - Promise that resolves with the stored document ({sha256, size, contentType, url})
+     */
+    upload(blob, name, onProgress) {
+        const key = this.getResumeKey(blob, name);
+        return this.resume(key)
+            .then(upload => upload || this.createUpload(blob, name, key))
+            .then(upload => this.sendChunks(blob, upload, onProgress))
+            .then(upload => this.complete(upload, key));
+    }
+    
+    /**
+     * Key under which the upload ID of a document is kept for resuming
+     */
+    getResumeKey(blob, name) {
+        return `blobUpload:${name}:${blob.size}:${blob.lastModified || 0}`;
+    }
+    
+    /**
+     * Looks up an unfinished upload of the same document
+     * @returns {Promise} - Promise that resolves with the upload, or null
+     */
+    resume(key) {
+        let id = null;
+        try {
+            id = localStorage.getItem(key);
+        } catch (error) {
+            // Storage is disabled; start over
+        }
+        if (!id) {
+            return Promise.resolve(null);
+        }
+        return this.getOffset({ id: id })
+            .then(offset => ({ id: id, offset: offset, chunkSize: this.chunkSize }))
+            .catch(() => {
+                this.forget(key);
+                return null;
+            });
+    }
+    
+    createUpload(blob, name, key) {
+        return fetch('/api/blobs/uploads', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ size: blob.size, filename: name })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                throw new Error(data.error || 'Upload failed');
+            }
+            try {
+                localStorage.setItem(key, data.id);
+            } catch (error) {
+                // The upload still works, it just can't resume after a reload
+            }
+            return { id: data.id, offset: data.offset, chunkSize: data.chunkSize || this.chunkSize };
+        });
+    }
+    
+    /**
+     * Asks the server how many bytes of an upload it has
+     */
+    getOffset(upload) {
+        return fetch(`/api/blobs/uploads/${upload.id}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.error || 'Upload not found');
+                }
+                return data.offset;
+            });
+    }
+    
+    /**
+     * Sends the rest of a document one chunk at a time. After a failed chunk
+     * it waits, asks the server where the upload stands and carries on from there.
+     */
+    sendChunks(blob, upload, onProgress, attempt = 0) {
+        if (upload.offset >= blob.size) {
+            return Promise.resolve(upload);
+        }
+        const end = Math.min(upload.offset + upload.chunkSize, blob.size);
+        return fetch(`/api/blobs/uploads/${upload.id}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'Upload-Offset': String(upload.offset)
+            },
+            body: blob.slice(upload.offset, end)
+        })
+        .then(response => response.json().then(data => {
+            // A 409 means the server is at a different offset; continue from it
+            if (response.ok || (response.status === 409 && typeof data.offset === 'number')) {
+                return data.offset;
+            }
+            const error = new Error(data.error || 'Upload failed');
+            error.fatal = response.status < 500;
+            throw error;
+        }))
+        .then(offset => {
+            upload.offset = offset;
+            if (onProgress) {
+                onProgress(offset, blob.size);
+            }
+            return this.sendChunks(blob, upload, onProgress);
+        }, error => {
+            if (error.fatal || attempt >= this.maxRetries) {
+                throw error;
+            }
+            return this.delay(attempt)
+                .then(() => this.getOffset(upload))
+                .then(offset => {
+                    upload.offset = offset;
+                    return this.sendChunks(blob, upload, onProgress, attempt + 1);
+                });
+        });
+    }
+    
+    complete(upload, key) {
+        return fetch(`/api/blobs/uploads/${upload.id}/complete`, {
+            method: 'POST'
+        })
+        .then(response => response.json())
+        .then(data => {
+            this.forget(key);
+            if (!data.success) {
+                throw new Error(data.error || 'Upload failed');
+            }
+            return data;
+        });
+    }
+    
+    forget(key) {
+        try {
+            localStorage.removeItem(key);
+        } catch (error) {
+            // Storage is disabled; nothing was kept
+        }
+    }
+    
+    /**
+     * Waits before a retry, longer after each failure
+     */
+    delay(attempt) {
+        return new Promise(resolve => setTimeout(resolve, Math.min(1000 * 2 ** attempt, 15000)));
+    }
+}
@@ -0,0 +1,65 @@
+/**
+ * Export Handler class
+ * Downloads presentations rendered to PowerPoint or PDF by the server
+ */
+class ExportHandler {
+    /**
+     * Downloads a stored slide deck; the server serves its cached artifact
+     * @param {number} deckId - ID of the saved slide deck
+     * @param {string} format - 'pptx' or 'pdf'
+     */
+    downloadDeck(deckId, format) {
+        window.location.href = `/api/slide-deck/${deckId}/export/${format}`;
+    }
+    
+    /**
+     * Renders a presentation on the server and downloads the result
+     * @param {Object} presentation - Presentation with a title and slides
+     * @param {string} format - 'pptx' or 'pdf'
+     * @returns {Promise} - Promise that resolves once the download starts
+     */
+    downloadPresentation(presentation, format) {
+        return fetch(`/api/export/${format}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(presentation)
+        })
+        .then(response => {
+            if (!response.ok) {
+                return response.json().then(data => {
+                    throw new Error(data.error || 'Export failed');
+                });
+            }
+            const filename = this.getFilename(response, presentation.title, format);
+            return response.blob().then(blob => this.saveBlob(blob, filename));
+        });
+    }
+    
+    /**
+     * Reads the download name from Content-Disposition
+     */
+    getFilename(response, title, format) {
+        const disposition = response.headers.get('Content-Disposition') || '';
+        const match = disposition.match(/filename="?([^";]+)"?/);
+        if (match) {
+            return match[1];
+        }
+        return `${(title || 'presentation').replace(/\s+/g, '_')}.${format}`;
+    }
+    
+    /**
+     * Saves a blob through a temporary link
+     */
+    saveBlob(blob, filename) {
+        const url = URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        URL.revokeObjectURL(url);
+    }
+}
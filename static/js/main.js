@@ -26,11 +26,20 @@ document.addEventListener('DOMContentLoaded', function() {
         left: false,
         right: false
     };
+    // File objects, or URLs for documents loaded from a URL, sent to the server to compare
+    let documentSources = {
+        left: null,
+        right: null
+    };
     
     // Initialize handlers
     const imageHandler = new ImageHandler();
     const pdfHandler = new PDFHandler();
-    const comparisonMetrics = new ComparisonMetrics();
+    const exportHandler = new ExportHandler();
+    const blobUploader = new BlobUploader();
+    let currentResults = null;
+    // Hashes of documents already in the server's blob store, by source
+    const storedDocuments = new Map();
     
     // Tab switching
     imageTab.addEventListener('click', () => {
@@ -151,6 +160,10 @@ document.addEventListener('DOMContentLoaded', function() {
         documentsLoaded.left = documentsLoaded.right;
         documentsLoaded.right = leftLoaded;
         
+        const leftSource = documentSources.left;
+        documentSources.left = documentSources.right;
+        documentSources.right = leftSource;
+        
         // Update file info displays
         const leftFileInfo = document.getElementById('file-info-left');
         const rightFileInfo = document.getElementById('file-info-right');
@@ -175,8 +188,10 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Export PDF button
     exportPdfButton.addEventListener('click', () => {
-        alert('Export to PDF functionality would be implemented here');
-        // In a real implementation, this would generate a PDF of the comparison results
+        if (!currentResults) return;
+        
+        exportHandler.downloadPresentation(resultsToPresentation(currentResults), 'pdf')
+            .catch(error => alert('Error exporting results: ' + error.message));
     });
     
     // Share results button
@@ -238,6 +253,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Clear preview
         previewElement.innerHTML = '';
+        documentSources[side] = file;
         
         if (['pdf'].includes(fileExtension) && currentMode === 'pdf') {
             // Handle PDF
@@ -301,6 +317,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Check URL file type
         const fileExtension = url.split('.').pop().toLowerCase().split('?')[0];
+        documentSources[side] = url;
         
         if (currentMode === 'pdf' && fileExtension === 'pdf') {
             // Handle PDF URL
@@ -357,29 +374,162 @@ document.addEventListener('DOMContentLoaded', function() {
         compareButton.disabled = !(documentsLoaded.left && documentsLoaded.right);
     }
     
+    // Documents loaded from a URL are downloaded so the server only ever
+    // receives the bytes, never a URL to fetch
+    function getDocumentBlob(side) {
+        const source = documentSources[side];
+        if (typeof source !== 'string') {
+            return Promise.resolve(source);
+        }
+        return fetch(source).then(response => {
+            if (!response.ok) {
+                throw new Error(`Could not download ${source}`);
+            }
+            return response.blob();
+        });
+    }
+    
+    // Documents are uploaded once, in resumable chunks, then compared by hash
+    function storeDocument(side) {
+        const source = documentSources[side];
+        if (storedDocuments.has(source)) {
+            return Promise.resolve(storedDocuments.get(source));
+        }
+        return getDocumentBlob(side)
+            .then(blob => blobUploader.upload(blob, typeof source === 'string' ? source : source.name))
+            .then(stored => {
+                storedDocuments.set(source, stored.sha256);
+                return stored.sha256;
+            });
+    }
+    
+    function postComparison(url, hashA, hashB) {
+        const formData = new FormData();
+        formData.append('documentAHash', hashA);
+        formData.append('documentBHash', hashB);
+        return fetch(url, {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                throw new Error(data.error || 'Comparison failed');
+            }
+            return data;
+        });
+    }
+    
     function performComparison() {
         // Show loading state
         compareButton.disabled = true;
         compareButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Analyzing...';
         
-        // Simulate analysis delay
-        setTimeout(() => {
-            // Get comparison results
-            const results = comparisonMetrics.generateComparison();
-            
-            // Update comparison results UI
-            updateResultsDisplay(results);
-            
-            // Show results section
-            resultsSection.classList.remove('hidden');
-            
-            // Scroll to results
-            resultsSection.scrollIntoView({ behavior: 'smooth' });
-            
-            // Reset compare button
-            compareButton.disabled = false;
-            compareButton.innerHTML = '<i class="fas fa-balance-scale"></i> Compare';
-        }, 2000);
+        let documentHashes = null;
+        Promise.all([storeDocument('left'), storeDocument('right')])
+            .then(([hashA, hashB]) => {
+                documentHashes = { a: hashA, b: hashB };
+                const requests = [postComparison('/api/compare', hashA, hashB)];
+                // Images are also compared pixel by pixel
+                if (currentMode === 'image') {
+                    requests.push(postComparison('/api/compare/images', hashA, hashB));
+                }
+                return Promise.allSettled(requests);
+            })
+            .then(([textComparison, imageComparison]) => {
+                const imageDiff = imageComparison && imageComparison.status === 'fulfilled' ? imageComparison.value.diff : null;
+                if (textComparison.status === 'rejected' && !imageDiff) {
+                    throw textComparison.reason;
+                }
+                
+                // Text criteria need extractable text; images without it still get the pixel comparison
+                const hasTextResults = textComparison.status === 'fulfilled';
+                currentResults = hasTextResults ? textComparison.value.results : {};
+                // Saved comparisons reference the stored documents
+                currentResults.documentHashes = documentHashes;
+                setTextResultsVisible(hasTextResults);
+                if (hasTextResults) {
+                    updateResultsDisplay(currentResults);
+                }
+                
+                if (imageDiff) {
+                    currentResults.imageDiff = imageDiff;
+                    renderImageDiff(imageDiff);
+                } else {
+                    document.getElementById('visual-diff').classList.add('hidden');
+                }
+                
+                // Show results section
+                resultsSection.classList.remove('hidden');
+                
+                // Scroll to results
+                resultsSection.scrollIntoView({ behavior: 'smooth' });
+                
+                // Let other scripts (e.g. saving) use the results
+                document.dispatchEvent(new CustomEvent('comparison-complete', { detail: currentResults }));
+            })
+            .catch(error => {
+                console.error('Error comparing documents:', error);
+                alert('Error comparing documents: ' + error.message);
+            })
+            .finally(() => {
+                // Reset compare button
+                compareButton.disabled = false;
+                compareButton.innerHTML = '<i class="fas fa-balance-scale"></i> Compare';
+            });
+    }
+    
+    function setTextResultsVisible(visible) {
+        resultsSection.querySelectorAll('.result-summary, .detailed-criteria, .comparison-recommendations, .conclusion-section')
+            .forEach(element => element.classList.toggle('hidden', !visible));
+    }
+    
+    // Describe the pixel comparison and draw its heatmap over image B
+    function renderImageDiff(diff) {
+        const container = document.getElementById('visual-diff');
+        const summary = document.getElementById('visual-diff-summary');
+        const canvas = document.getElementById('visual-diff-canvas');
+        container.classList.remove('hidden');
+        
+        if (diff.identical) {
+            summary.textContent = 'The images are visually identical.';
+            canvas.classList.add('hidden');
+            return;
+        }
+        summary.textContent = `Structural similarity ${(diff.ssim * 100).toFixed(1)}%, ` +
+            `${(diff.changedFraction * 100).toFixed(1)}% of the image changed in ${diff.regions.length} ` +
+            `region${diff.regions.length === 1 ? '' : 's'} (perceptual hash distance ${diff.phash.distance} of 63).`;
+        
+        const image = document.querySelector('#preview-right img');
+        if (!image || !diff.heatmap) {
+            canvas.classList.add('hidden');
+            return;
+        }
+        canvas.classList.remove('hidden');
+        canvas.width = Math.min(image.naturalWidth, 1024);
+        canvas.height = Math.round(canvas.width * image.naturalHeight / image.naturalWidth);
+        const context = canvas.getContext('2d');
+        context.drawImage(image, 0, 0, canvas.width, canvas.height);
+        
+        // Tint each tile by how much it changed
+        const cellWidth = canvas.width / diff.heatmap.columns;
+        const cellHeight = canvas.height / diff.heatmap.rows;
+        diff.heatmap.values.forEach((row, rowIndex) => {
+            row.forEach((value, columnIndex) => {
+                if (value > 0.01) {
+                    context.fillStyle = `rgba(239, 68, 68, ${Math.min(value * 2, 0.6)})`;
+                    context.fillRect(columnIndex * cellWidth, rowIndex * cellHeight, cellWidth, cellHeight);
+                }
+            });
+        });
+        
+        // Outline the changed regions
+        context.strokeStyle = '#ef4444';
+        context.lineWidth = 2;
+        diff.regions.forEach(region => {
+            context.strokeRect(region.x * canvas.width, region.y * canvas.height,
+                               region.width * canvas.width, region.height * canvas.height);
+        });
     }
     
     function updateResultsDisplay(results) {
@@ -414,6 +564,54 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('conclusion-text-right').textContent = results.conclusionB;
     }
     
+    // Lay out comparison results as slides for the export engine
+    function resultsToPresentation(results) {
+        const slides = [];
+        
+        if (results.imageDiff) {
+            const diff = results.imageDiff;
+            slides.push({
+                title: 'Visual Differences',
+                content: diff.identical ? ['The images are visually identical'] : [
+                    `Structural similarity: ${(diff.ssim * 100).toFixed(1)}%`,
+                    `Changed area: ${(diff.changedFraction * 100).toFixed(1)}% in ${diff.regions.length} regions`,
+                    `Perceptual hash distance: ${diff.phash.distance} of 63`
+                ]
+            });
+        }
+        if (!results.overallScores) {
+            return {title: 'Image Comparison Results', slides: slides};
+        }
+        
+        slides.push({
+            title: 'Overall Scores',
+            content: [
+                `Document A: ${results.overallScores.averageA} (${getRatingLabel(results.overallScores.averageA)})`,
+                `Document B: ${results.overallScores.averageB} (${getRatingLabel(results.overallScores.averageB)})`
+            ]
+        });
+        
+        results.categories.forEach(category => {
+            slides.push({
+                title: category.name,
+                content: category.criteria.map(criterion =>
+                    `${criterion.name}: A ${criterion.scoreA}, B ${criterion.scoreB}`)
+            });
+        });
+        
+        slides.push({
+            title: 'Recommendations',
+            content: results.businessRecommendations
+                .concat(results.scientificRecommendations, results.humanitarianRecommendations)
+        });
+        slides.push({
+            title: 'Conclusions',
+            content: [`Document A: ${results.conclusionA}`, `Document B: ${results.conclusionB}`]
+        });
+        
+        return {title: 'Technology Comparison Results', slides: slides};
+    }
+    
     function getRatingLabel(score) {
         if (score >= 90) return "Exceptional";
         if (score >= 80) return "Excellent";
@@ -533,6 +731,8 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     function resetComparison() {
+        currentResults = null;
+        
         // Reset document previews
         document.getElementById('preview-left').innerHTML = `
             <div class="empty-state">
@@ -554,6 +754,9 @@ document.addEventListener('DOMContentLoaded', function() {
         // Reset loaded state
         documentsLoaded.left = false;
         documentsLoaded.right = false;
+        documentSources.left = null;
+        documentSources.right = null;
+        storedDocuments.clear();
         
         // Disable compare button
         updateCompareButtonState();
@@ -0,0 +1,291 @@
+"""
+Map-reduce summarization of long transcripts.
+
+A transcript too long for one prompt is split on sentence boundaries into
+chunks of at most CHUNK_TOKENS tokens. The chunks are summarized in parallel
+(map), and the summaries are combined into the slide JSON by a single final
+call (reduce). If the summaries themselves are too long for one prompt they
+are summarized again, in groups, until they fit.
+
+Every call goes through llm_cache, keyed on its own prompt, so each chunk
+summary is cached individually: retrying after a failure only recomputes
+the chunks that failed.
+
+Map calls run on a dedicated pool of SUMMARY_CONCURRENCY threads. When the
+API answers 429, every summarizer thread in the process backs off until the
+time the API asked for before sending its next request.
+"""
+import os
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fetch_pool
+import llm_cache
+import transcript_segmenter
+
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gpt-4o")
+# Maximum tokens of transcript text sent in one map call
+CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", "3000"))
+# Maximum tokens of summaries sent in the reduce call
+REDUCE_TOKENS = int(os.environ.get("SUMMARY_REDUCE_TOKENS", "12000"))
+# Maximum map calls in flight per process
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", "4"))
+# Attempts per call when the API rate-limits us
+RATE_LIMIT_ATTEMPTS = int(os.environ.get("SUMMARY_RATE_LIMIT_ATTEMPTS", "5"))
+# Seconds to back off after the first rate-limited attempt, doubling after each
+RATE_LIMIT_BACKOFF = float(os.environ.get("SUMMARY_RATE_LIMIT_BACKOFF", "2.0"))
+
+# Rough characters-per-token ratio for English text when tiktoken isn't installed
+CHARS_PER_TOKEN = 4
+
+# The tiktoken encoding, loaded by _get_encoding on first use
+_encoding = None
+_encoding_loaded = False
+
+MAP_SYSTEM_PROMPT = "You summarize sections of video transcripts for presentation writers."
+MAP_PROMPT = """
+Summarize part {index} of {total} of a video transcript.
+
+Respond with a JSON object of the form
+{{"summary": "One paragraph summary", "key_points": ["Key point", "Key point"]}}
+with 3-6 key points. Only include what this part says.
+
+Transcript:
+{text}
+"""
+
+REDUCE_SYSTEM_PROMPT = "You are an expert at creating professional presentations based on video content."
+REDUCE_PROMPT = """
+Create a presentation based on the following YouTube video.
+
+Title: {title}
+Description: {description}
+
+Summaries of the video's transcript, in order:
+{summaries}
+
+Format the presentation as a JSON object with the following structure:
+{{
+    "title": "Presentation title",
+    "slides": [
+        {{
+            "title": "Slide title",
+            "content": ["Bullet point 1", "Bullet point 2"],
+            "image_description": "Description of an appropriate image for this slide"
+        }}
+    ]
+}}
+
+The presentation should have:
+1. A title slide
+2. An agenda/overview slide
+3. 5-7 content slides covering the main points
+4. A conclusion slide
+
+Each slide should be concise with 2-5 bullet points. The image_description should be detailed enough that an AI image generator could create a relevant image.
+"""
+
+
+class SummarizationError(Exception):
+    """Raised when some transcript chunks could not be summarized."""
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__(f"Failed to summarize {len(failed)} transcript chunk(s)")
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Monotonic time before which no summarizer thread should call the API
+_resume_at = 0.0
+_resume_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY,
+                                               thread_name_prefix="summarize")
+    return _executor
+
+
+def _get_encoding():
+    """Load the tokenizer on first use; it takes a while and most processes never count tokens."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            logging.info("tiktoken not available; estimating token counts from text length")
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    """Count, or estimate, the tokens in text."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_text(source, max_tokens=CHUNK_TOKENS):
+    """
+    Split text on sentence boundaries into chunks of at most max_tokens.
+
+    A single sentence longer than the budget becomes a chunk of its own.
+
+    Returns:
+        list: Chunk strings, in order
+    """
+    chunks = []
+    chunk_start = chunk_end = None
+    chunk_tokens = 0
+    for start, end in transcript_segmenter.iter_sentences(source):
+        # Count the delimiter too, so the chunk totals match the joined text
+        sentence_tokens = count_tokens(source[start:end + len(transcript_segmenter.SENTENCE_DELIMITER)])
+        if chunk_start is not None and chunk_tokens + sentence_tokens > max_tokens:
+            chunks.append(source[chunk_start:chunk_end].strip())
+            chunk_start = None
+            chunk_tokens = 0
+        if chunk_start is None:
+            chunk_start = start
+        # Keep the delimiter that ended the sentence
+        chunk_end = min(end + 1, len(source))
+        chunk_tokens += sentence_tokens
+    if chunk_start is not None:
+        chunks.append(source[chunk_start:chunk_end].strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def _wait_for_rate_limit():
+    delay = _resume_at - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _back_off(error, attempt):
+    """Pause every summarizer thread for as long as the API asked, or exponentially."""
+    global _resume_at
+    delay = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            delay = None
+    if delay is None:
+        delay = RATE_LIMIT_BACKOFF * (2 ** attempt)
+    delay += random.uniform(0, RATE_LIMIT_BACKOFF)
+
+    with _resume_lock:
+        _resume_at = max(_resume_at, time.monotonic() + delay)
+    logging.warning("Rate limited by OpenAI; backing off %.1fs", delay)
+
+
+def _complete(client, messages, bypass=False):
+    """Run one cached JSON completion, backing off while rate limited."""
+    from openai import RateLimitError
+
+    for attempt in range(RATE_LIMIT_ATTEMPTS):
+        _wait_for_rate_limit()
+        try:
+            return llm_cache.cached_chat_completion(
+                client,
+                model=SUMMARY_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"},
+                bypass=bypass
+            )
+        except RateLimitError as e:
+            if attempt == RATE_LIMIT_ATTEMPTS - 1:
+                raise
+            _back_off(e, attempt)
+
+
+def summarize_chunk(client, text, index, total, bypass=False):
+    """
+    Summarize one chunk of a transcript.
+
+    Returns:
+        dict: summary (str) and key_points (list)
+    """
+    return _complete(client, [
+        {"role": "system", "content": MAP_SYSTEM_PROMPT},
+        {"role": "user", "content": MAP_PROMPT.format(index=index + 1, total=total, text=text)}
+    ], bypass=bypass)
+
+
+def _format_summary(result):
+    points = "\n".join(f"- {point}" for point in result.get("key_points", []))
+    return f"{result.get('summary', '')}\n{points}".strip()
+
+
+def map_chunks(client, chunks, bypass=False):
+    """
+    Summarize chunks in parallel.
+
+    Returns:
+        list: Formatted summaries, in chunk order
+
+    Raises:
+        SummarizationError: If any chunk failed; the ones that succeeded are cached
+    """
+    run = fetch_pool.in_app_context(summarize_chunk)
+    futures = [_get_executor().submit(run, client, chunk, index, len(chunks), bypass)
+               for index, chunk in enumerate(chunks)]
+
+    summaries = []
+    failed = []
+    for index, future in enumerate(futures):
+        try:
+            summaries.append(_format_summary(future.result()))
+        except Exception as e:
+            logging.error("Error summarizing transcript chunk %s/%s: %s", index + 1, len(chunks), e)
+            failed.append(index)
+
+    if failed:
+        raise SummarizationError(failed)
+    return summaries
+
+
+def summarize_to_presentation(client, video_info, transcript, bypass=False):
+    """
+    Build slide JSON from a transcript with a map-reduce over its chunks.
+
+    Args:
+        client (OpenAI): API client
+        video_info (dict): Video metadata with title and description
+        transcript (str): Full transcript text
+        bypass (bool): Regenerate every call instead of reading the cache
+
+    Returns:
+        dict: Presentation data with title and slides
+    """
+    summaries = map_chunks(client, chunk_text(transcript), bypass)
+    logging.info("Summarized transcript in %s chunks", len(summaries))
+
+    # Collapse the summaries until they fit in a single reduce prompt
+    while len(summaries) > 1 and count_tokens("\n\n".join(summaries)) > REDUCE_TOKENS:
+        collapsed = map_chunks(client, chunk_text("\n\n".join(summaries), CHUNK_TOKENS), bypass)
+        if len(collapsed) >= len(summaries):
+            # Summaries aren't getting shorter; reduce what we have
+            break
+        summaries = collapsed
+        logging.info("Collapsed transcript summaries to %s", len(summaries))
+
+    return _complete(client, [
+        {"role": "system", "content": REDUCE_SYSTEM_PROMPT},
+        {"role": "user", "content": REDUCE_PROMPT.format(
+            title=video_info.get("title", ""),
+            description=video_info.get("description", ""),
+            summaries="\n\n".join(f"Part {index + 1}:\n{summary}" for index, summary in enumerate(summaries))
+        )}
+    ], bypass=bypass)
@@ -0,0 +1,96 @@
+"""
+Tests for the redaction in log_pipeline.py.
+
+Run with:
+    python -m unittest discover tests
+"""
+import json
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_pipeline  # noqa: E402
+
+API_KEY = 'sk-' + 'a1B2c3D4' * 6
+
+
+class CapturingHandler(logging.Handler):
+    """Keeps each record as the JSON object log_pipeline would write."""
+
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(log_pipeline.JsonFormatter())
+        self.addFilter(log_pipeline.RedactingFilter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class RedactionTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = CapturingHandler()
+        self.logger = logging.getLogger('test_log_pipeline')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def written(self):
+        self.assertEqual(len(self.handler.lines), 1)
+        line = self.handler.lines[0]
+        self.assertNotIn(API_KEY, line)
+        self.assertNotIn('hunter2', line)
+        return json.loads(line)
+
+    def test_dict_argument(self):
+        data = {'videoUrl': 'https://youtu.be/abc', 'apiKey': API_KEY, 'options': {'password': 'hunter2'}}
+        self.logger.info("Received data: %s", data)
+        entry = self.written()
+        self.assertIn("'apiKey': '[REDACTED]'", entry['message'])
+        self.assertIn("'password': '[REDACTED]'", entry['message'])
+        self.assertIn('https://youtu.be/abc', entry['message'])
+        # The caller's dict is left alone
+        self.assertEqual(data['apiKey'], API_KEY)
+
+    def test_fields(self):
+        self.logger.info("Processing video", extra={'event': 'slide_deck.requested', 'fields': {
+            'video_url': 'https://youtu.be/abc', 'apiKey': API_KEY, 'request': {'api_key': 'hunter2'}}})
+        entry = self.written()
+        self.assertEqual(entry['apiKey'], log_pipeline.REDACTED)
+        self.assertEqual(entry['request'], {'api_key': log_pipeline.REDACTED})
+        self.assertEqual(entry['video_url'], 'https://youtu.be/abc')
+        self.assertEqual(entry['event'], 'slide_deck.requested')
+
+    def test_key_value_text(self):
+        self.logger.warning("Retrying with apiKey=%s password: hunter2 and Authorization: Bearer abc.def", API_KEY)
+        entry = self.written()
+        self.assertIn('apiKey=[REDACTED]', entry['message'])
+        self.assertIn('password: [REDACTED]', entry['message'])
+        self.assertIn('Bearer [REDACTED]', entry['message'])
+        self.assertNotIn('abc.def', entry['message'])
+
+    def test_traceback(self):
+        try:
+            raise ValueError(f"bad request: apiKey={API_KEY}, password='hunter2'")
+        except ValueError:
+            self.logger.exception("Request failed")
+        entry = self.written()
+        self.assertIn('ValueError', entry['exception'])
+        self.assertIn('apiKey=[REDACTED]', entry['exception'])
+        self.assertIn("password='[REDACTED]'", entry['exception'])
+
+    def test_redact_and_scrub(self):
+        self.assertEqual(log_pipeline.redact({'API-KEY': 'x', 'items': [{'token': 'y'}], 'n': 1}),
+                         {'API-KEY': log_pipeline.REDACTED, 'items': [{'token': log_pipeline.REDACTED}], 'n': 1})
+        self.assertEqual(log_pipeline.scrub(f"key {API_KEY} used"), f"key sk-{log_pipeline.REDACTED} used")
+        self.assertEqual(log_pipeline.scrub("nothing secret here"), "nothing secret here")
+
+
+if __name__ == '__main__':
+    unittest.main()
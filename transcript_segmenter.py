@@ -0,0 +1,335 @@
+"""
+Single-pass transcript segmentation.
+
+Splits a transcript into paragraphs of roughly PARAGRAPH_LENGTH characters,
+and each paragraph into bullets of SENTENCES_PER_BULLET sentences, using the
+same rules the slide generator has always used. Unlike splitting and joining
+strings, the segmenter walks the transcript once with str.find and yields
+Segments: character offsets into the source plus the timestamps of the
+transcript entries they cover. Text is only copied when a caller asks for it,
+and because segments are generated lazily a caller that stops after a few
+paragraphs never scans the rest of the transcript.
+
+iter_entry_paragraphs reads transcript entries directly, joining them a
+window at a time, so the whole transcript is never held as one string.
+"""
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate, islice, repeat
+from operator import add, itemgetter, sub
+
+SENTENCE_DELIMITER = '. '
+PARAGRAPH_LENGTH = 500
+SENTENCES_PER_BULLET = 2
+# Transcript entries iter_entry_paragraphs joins at a time
+WINDOW_ENTRIES = 1024
+
+
+class TimingIndex:
+    """Maps character offsets in a joined transcript back to entry timestamps."""
+
+    def __init__(self, offsets=None, starts=None, ends=None):
+        self.offsets = offsets if offsets is not None else array('q')
+        self.starts = starts if starts is not None else array('d')
+        self.ends = ends if ends is not None else array('d')
+
+    def _entry_at(self, offset):
+        return max(bisect_right(self.offsets, offset) - 1, 0)
+
+    def start_time(self, offset):
+        """Start time of the entry containing offset."""
+        return self.starts[self._entry_at(offset)] if self.offsets else None
+
+    def end_time(self, offset):
+        """End time of the entry containing offset."""
+        return self.ends[self._entry_at(offset)] if self.offsets else None
+
+
+class Segment(namedtuple('Segment', ['start', 'end', 'timing'])):
+    """
+    A span of the source transcript.
+
+    start and end are character offsets; the timestamps are looked up from
+    the TimingIndex only when asked for.
+    """
+    __slots__ = ()
+
+    def text(self, source):
+        return source[self.start:self.end]
+
+    @property
+    def start_time(self):
+        return self.timing.start_time(self.start) if self.timing is not None else None
+
+    @property
+    def end_time(self):
+        return self.timing.end_time(max(self.end - 1, self.start)) if self.timing is not None else None
+
+
+class Paragraph:
+    """
+    A paragraph of the source transcript and its bullets.
+
+    The bullets are only split out the first time they are asked for, so a
+    caller that reads a few paragraphs' bullets in a long transcript pays
+    for finding the paragraphs alone.
+    """
+    __slots__ = ('segment', '_source', '_limit', '_sentences_per_bullet', '_bullets')
+
+    def __init__(self, segment, source, limit, sentences_per_bullet):
+        self.segment = segment
+        self._source = source
+        self._limit = limit
+        self._sentences_per_bullet = sentences_per_bullet
+        self._bullets = None
+
+    @property
+    def bullets(self):
+        """List of bullet segments, each sentences_per_bullet sentences long."""
+        if self._bullets is None:
+            segment = self.segment
+            self._bullets = _bullets(self._source, segment.start, self._limit, segment.end,
+                                     self._sentences_per_bullet, segment.timing)
+            self._source = None
+        return self._bullets
+
+
+def join_entries(entries):
+    """
+    Join transcript entries into a single source string.
+
+    Args:
+        entries (list): Dicts with text, start and duration
+
+    Returns:
+        tuple: (source text, TimingIndex for that text)
+    """
+    texts = [entry['text'] for entry in entries]
+    starts = array('d', [entry['start'] for entry in entries])
+    durations = array('d', [entry['duration'] for entry in entries])
+    # Each entry starts one joining space after the end of the previous one
+    offsets = array('q', accumulate(map(len, texts[:-1]), lambda total, length: total + length + 1, initial=0)) if texts else array('q')
+    ends = array('d', map(add, starts, durations))
+    return ' '.join(texts), TimingIndex(offsets, starts, ends)
+
+
+def transcript_length(entries):
+    """Length of the source text join_entries builds from entries."""
+    return sum(map(len, map(itemgetter('text'), entries))) + max(len(entries) - 1, 0)
+
+
+def max_paragraphs(length, paragraph_length=PARAGRAPH_LENGTH):
+    """Most paragraphs a transcript of length characters can be split into."""
+    # Every paragraph but the last takes up more than paragraph_length
+    # characters, counting the delimiter after it
+    return length // (paragraph_length + 1) + 1
+
+
+def iter_sentences(source, start=0, end=None):
+    """Yield (start, end) offsets of each sentence between start and end."""
+    if end is None:
+        end = len(source)
+    delimiter_length = len(SENTENCE_DELIMITER)
+    position = start
+    while True:
+        boundary = source.find(SENTENCE_DELIMITER, position, end)
+        if boundary == -1:
+            yield position, end
+            return
+        yield position, boundary
+        position = boundary + delimiter_length
+
+
+def _bullets_by_sentence(source, start, limit, last_end, sentences_per_bullet, timing):
+    """Bullets of source[start:limit] found sentence by sentence; handles empty sentences."""
+    find = source.find
+    delimiter = SENTENCE_DELIMITER
+    delimiter_length = len(delimiter)
+
+    bullets = []
+    bullet_start = bullet_end = None
+    sentence_index = 0
+    sentence_start = start
+    while True:
+        boundary = find(delimiter, sentence_start, limit)
+        is_last = boundary == -1
+        sentence_end = limit if is_last else boundary
+
+        if sentence_index and sentence_index % sentences_per_bullet == 0 and bullet_start is not None:
+            bullets.append(Segment(bullet_start, bullet_end, timing))
+            bullet_start = None
+        if sentence_end > sentence_start:
+            if bullet_start is None:
+                bullet_start = sentence_start
+            bullet_end = sentence_end
+        sentence_index += 1
+
+        if is_last:
+            break
+        sentence_start = boundary + delimiter_length
+
+    if last_end != limit:
+        # The sentence that ends a paragraph keeps its full stop
+        if bullet_start is None:
+            bullet_start = limit
+        bullets.append(Segment(bullet_start, last_end, timing))
+    elif bullet_start is not None:
+        bullets.append(Segment(bullet_start, bullet_end, timing))
+    return bullets
+
+
+def _bullets(source, start, limit, last_end, sentences_per_bullet, timing):
+    """
+    Bullet segments of the sentences in source[start:limit].
+
+    The paragraph's sentences are split in C and their offsets added up with
+    accumulate, so the Python work is per bullet rather than per sentence.
+    Paragraphs with empty sentences, which rarely occur, take the
+    sentence-by-sentence path.
+    """
+    sentences = source[start:limit].split(SENTENCE_DELIMITER)
+    if '' in sentences:
+        return _bullets_by_sentence(source, start, limit, last_end, sentences_per_bullet, timing)
+    # Sentence i spans offsets[i] to offsets[i + 1] minus the delimiter
+    delimiter_length = len(SENTENCE_DELIMITER)
+    offsets = list(accumulate(map(add, map(len, sentences), repeat(delimiter_length)), initial=start))
+    count = len(sentences)
+    ends = list(map(sub, offsets[sentences_per_bullet:count:sentences_per_bullet], repeat(delimiter_length)))
+    ends.append(last_end)
+    return list(map(Segment, offsets[0:count:sentences_per_bullet], ends, repeat(timing)))
+
+
+def _scan(source, timing, paragraph_length, sentences_per_bullet, final=True):
+    """
+    Yield the paragraphs of source, in one pass.
+
+    If final is False, more text will follow source, so the paragraph after
+    the last complete one isn't yielded; the caller scans it again once it
+    has more text.
+    """
+    find = source.find
+    delimiter = SENTENCE_DELIMITER
+    delimiter_length = len(delimiter)
+    source_length = len(source)
+
+    position = 0
+    while True:
+        # Offsets reached by the original split-and-join loop: a paragraph
+        # closes once the sentences plus their delimiters exceed paragraph_length
+        close = find(delimiter, position + max(paragraph_length - delimiter_length + 1, 0))
+        if close == -1 and not final:
+            return
+        limit = source_length if close == -1 else close
+
+        # Paragraphs never start with whitespace
+        start = position
+        while start < limit and source[start].isspace():
+            start += 1
+
+        if close == -1:
+            # Final paragraph; skip it if only whitespace was left
+            if start < source_length:
+                yield Paragraph(Segment(start, source_length, timing), source, limit, sentences_per_bullet)
+            return
+
+        yield Paragraph(Segment(start, close + 1, timing), source, limit, sentences_per_bullet)
+        position = close + delimiter_length
+
+
+def iter_paragraphs(source, timing=None, paragraph_length=PARAGRAPH_LENGTH,
+                    sentences_per_bullet=SENTENCES_PER_BULLET):
+    """
+    Yield the paragraphs of a transcript, each with its bullets, in one pass.
+
+    A paragraph ends with the first sentence that takes it past
+    paragraph_length characters, so its end is found with a single str.find
+    from the length threshold; the paragraph's sentences are split and
+    grouped into bullets when its bullets are first read.
+
+    Args:
+        source (str): Transcript text
+        timing (TimingIndex, optional): Timestamps from join_entries
+        paragraph_length (int): Close a paragraph once it exceeds this many characters
+        sentences_per_bullet (int): Sentences grouped into each bullet
+
+    Yields:
+        Paragraph: The paragraph segment and its list of bullet segments
+    """
+    if timing is not None and not timing.offsets:
+        timing = None
+    yield from _scan(source, timing, paragraph_length, sentences_per_bullet)
+
+
+def _window_timing(timing, cut, entries, offset):
+    """
+    TimingIndex and text of the entries appended to a window.
+
+    The index covers the last window from offset cut onwards, rebased to
+    start at 0, followed by entries, the first of which starts at offset.
+    """
+    if timing is None:
+        offsets, starts, ends = array('q'), array('d'), array('d')
+    else:
+        # Keep the entry the new window starts inside, and those after it
+        first = max(bisect_right(timing.offsets, cut) - 1, 0)
+        offsets = array('q', map(sub, timing.offsets[first:], repeat(cut)))
+        starts = timing.starts[first:]
+        ends = timing.ends[first:]
+    texts = [entry['text'] for entry in entries]
+    entry_starts = array('d', [entry['start'] for entry in entries])
+    # Each entry starts one joining space after the end of the previous one
+    entry_offsets = array('q', accumulate(map(add, map(len, texts), repeat(1)), initial=offset))
+    offsets.extend(entry_offsets[:-1])
+    starts.extend(entry_starts)
+    ends.extend(map(add, entry_starts, [entry['duration'] for entry in entries]))
+    return TimingIndex(offsets, starts, ends), ' '.join(texts)
+
+
+def iter_entry_paragraphs(entries, paragraph_length=PARAGRAPH_LENGTH,
+                          sentences_per_bullet=SENTENCES_PER_BULLET, window_entries=WINDOW_ENTRIES):
+    """
+    Yield the paragraphs of transcript entries, joining the entries as needed.
+
+    Produces the same paragraphs as join_entries followed by iter_paragraphs,
+    without ever building the whole transcript: window_entries entries are
+    joined at a time, and only the text of the paragraph still being read is
+    carried into the next window. Memory stays flat however long the
+    transcript is, and a caller that stops after a few paragraphs only joins
+    the entries they cover.
+
+    Args:
+        entries (iterable): Dicts with text, start and duration
+        paragraph_length (int): Close a paragraph once it exceeds this many characters
+        sentences_per_bullet (int): Sentences grouped into each bullet
+        window_entries (int): Entries joined at a time
+
+    Yields:
+        tuple: (source, Paragraph), where the paragraph's segments are
+        offsets into source, a window of the transcript
+    """
+    entries = iter(entries)
+    delimiter_length = len(SENTENCE_DELIMITER)
+    window = None
+    timing = None
+    cut = 0
+    while True:
+        chunk = list(islice(entries, window_entries))
+        final = len(chunk) < window_entries
+
+        if window is None:
+            if not chunk:
+                return
+            timing, window = _window_timing(None, 0, chunk, 0)
+        else:
+            tail = window[cut:]
+            timing, text = _window_timing(timing, cut, chunk, len(tail) + 1)
+            window = tail + ' ' + text if chunk else tail
+
+        # The next window starts with the paragraph after the last complete one
+        cut = 0
+        for paragraph in _scan(window, timing, paragraph_length, sentences_per_bullet, final):
+            yield window, paragraph
+            cut = paragraph.segment.end - 1 + delimiter_length
+        if final:
+            return
@@ -0,0 +1,203 @@
+"""
+Persistent store for YouTube transcripts.
+
+Transcripts are fetched from YouTubeTranscriptApi once and kept, with their
+per-entry timing data, as zlib-compressed JSON in the transcripts table keyed
+by video ID and language. Re-processing or retrying a deck reads them back
+from the database instead of going to the network.
+
+Videos without a transcript, or whose fetch failed, are stored as negative
+entries with a short TTL so repeated requests for them fail fast.
+"""
+import os
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+
+import metrics
+
+# The transcript API and its errors, imported by get_api on first use
+YouTubeTranscriptApi = None
+MISSING_TRANSCRIPT_ERRORS = ()
+_api_loaded = False
+
+DEFAULT_LANGUAGES = ('en',)
+
+# Seconds a stored transcript stays valid
+TRANSCRIPT_TTL = int(os.environ.get("TRANSCRIPT_TTL", str(30 * 24 * 3600)))
+# Seconds to remember that a video has no transcript
+MISSING_TTL = int(os.environ.get("TRANSCRIPT_MISSING_TTL", "3600"))
+# Seconds to remember that fetching a transcript failed
+ERROR_TTL = int(os.environ.get("TRANSCRIPT_ERROR_TTL", "300"))
+
+STATUS_AVAILABLE = 'available'
+STATUS_MISSING = 'missing'
+STATUS_ERROR = 'error'
+
+
+def compress_entries(entries):
+    """Serialize transcript entries to compressed bytes."""
+    return zlib.compress(json.dumps(entries, separators=(',', ':')).encode('utf-8'))
+
+
+def decompress_entries(data):
+    """Inverse of compress_entries."""
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def _store_available():
+    try:
+        from flask import has_app_context
+        return has_app_context()
+    except ImportError:
+        return False
+
+
+def _load(video_id, language):
+    """Return (status, entries) for a fresh stored row, or None."""
+    if not _store_available():
+        return None
+
+    from sqlalchemy import select
+    from app import db
+    from models import Transcript
+
+    table = Transcript.__table__
+    try:
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.status, table.c.entries, table.c.expires_at)
+                .where(table.c.video_id == video_id, table.c.language == language)
+            ).first()
+    except Exception as e:
+        logging.error("Error reading transcript store: %s", e)
+        return None
+
+    if row is None or row.expires_at < datetime.now():
+        return None
+    if row.status != STATUS_AVAILABLE:
+        return row.status, None
+    return row.status, decompress_entries(row.entries)
+
+
+def _save(video_id, language, status, entries=None, error_message=None):
+    """Record the outcome of a transcript fetch."""
+    if not _store_available():
+        return
+
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from models import Transcript
+
+    ttl = {STATUS_AVAILABLE: TRANSCRIPT_TTL, STATUS_MISSING: MISSING_TTL}.get(status, ERROR_TTL)
+    now = datetime.now()
+    table = Transcript.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.video_id == video_id, table.c.language == language))
+            conn.execute(table.insert().values(
+                video_id=video_id,
+                language=language,
+                status=status,
+                entries=compress_entries(entries) if entries is not None else None,
+                error_message=error_message,
+                fetched_at=now,
+                expires_at=now + timedelta(seconds=ttl)
+            ))
+    except IntegrityError:
+        # Another worker stored the same transcript concurrently
+        pass
+    except Exception as e:
+        logging.error("Error writing transcript store: %s", e)
+
+
+def get_api():
+    """
+    Return YouTubeTranscriptApi, importing it on first use, or None if it isn't installed.
+
+    The import is deferred so processes that never fetch a transcript don't
+    pay for it at startup.
+    """
+    global YouTubeTranscriptApi, MISSING_TRANSCRIPT_ERRORS, _api_loaded
+    if YouTubeTranscriptApi is None and not _api_loaded:
+        try:
+            from youtube_transcript_api import YouTubeTranscriptApi as TranscriptApi
+            from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, VideoUnavailable
+            MISSING_TRANSCRIPT_ERRORS = (NoTranscriptFound, TranscriptsDisabled, VideoUnavailable)
+            YouTubeTranscriptApi = TranscriptApi
+        except ImportError:
+            logging.error("Could not import YouTubeTranscriptApi. Using simplified transcript extraction.")
+        _api_loaded = True
+    return YouTubeTranscriptApi
+
+
+def _fetch(video_id, languages):
+    """Fetch transcript entries from YouTube, returning (status, entries, error)."""
+    try:
+        entries = YouTubeTranscriptApi.get_transcript(video_id, languages=list(languages))
+    except MISSING_TRANSCRIPT_ERRORS as e:
+        logging.warning("No transcript for video %s: %s", video_id, type(e).__name__)
+        return STATUS_MISSING, None, type(e).__name__
+    except Exception as e:
+        metrics.count_upstream_error('youtube_transcript')
+        logging.error("Error getting transcript: %s", e)
+        return STATUS_ERROR, None, str(e)
+
+    # Keep only the fields we use
+    entries = [
+        {
+            'text': entry['text'],
+            'start': entry.get('start', 0.0),
+            'duration': entry.get('duration', 0.0)
+        }
+        for entry in entries
+    ]
+    return STATUS_AVAILABLE, entries, None
+
+
+@metrics.stage('video', 'transcript')
+def get_transcript_entries(video_id, languages=DEFAULT_LANGUAGES):
+    """
+    Get the timed transcript entries of a YouTube video.
+
+    Args:
+        video_id (str): Canonical YouTube video ID
+        languages (tuple): Preferred transcript languages, most preferred first
+
+    Returns:
+        list: Entries as dicts with text, start and duration, or None if the
+        video has no transcript or it could not be fetched
+    """
+    if not get_api():
+        logging.error("YouTubeTranscriptApi not available")
+        return None
+
+    language = languages[0]
+    stored = _load(video_id, language)
+    metrics.count_cache('transcripts', 'hits' if stored is not None else 'misses')
+    if stored is not None:
+        status, entries = stored
+        if status != STATUS_AVAILABLE:
+            logging.info("Transcript for video %s recently %s; not refetching", video_id, status)
+        return entries
+
+    status, entries, error_message = _fetch(video_id, languages)
+    _save(video_id, language, status, entries, error_message)
+    return entries
+
+
+def invalidate(video_id, language=None):
+    """Drop stored transcripts for a video, for one language or all."""
+    if not _store_available():
+        return
+
+    from app import db
+    from models import Transcript
+
+    table = Transcript.__table__
+    condition = table.c.video_id == video_id
+    if language is not None:
+        condition = condition & (table.c.language == language)
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(condition))
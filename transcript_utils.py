@@ -1,166 +1,222 @@
 import os
 import json
-import requests
 import re
 import logging
-from pytube import YouTube
+import time
+from video_metadata import UNAVAILABLE_INFO, extract_video_id, get_video_info
+import fetch_pool
+import image_proxy
+import metrics
+import transcript_segmenter
+import transcript_store
 
-# Add custom error handling for the transcript API
-YouTubeTranscriptApi = None
-try:
-    from youtube_transcript_api import YouTubeTranscriptApi as TranscriptApi
-    YouTubeTranscriptApi = TranscriptApi
-except ImportError:
-    logging.error("Could not import YouTubeTranscriptApi. Using simplified transcript extraction.")
+# Placeholder text used in place of a transcript that couldn't be fetched
+TRANSCRIPT_API_UNAVAILABLE = "Transcript not available. Using placeholder data for demonstration."
+TRANSCRIPT_MISSING = "No transcript available for this video. Using placeholder data for demonstration."
 
-def extract_video_id(youtube_url):
-    """Extract the YouTube video ID from a URL."""
-    # Regular expression to match YouTube video IDs
-    youtube_regex = r'(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'
-    match = re.search(youtube_regex, youtube_url)
-    return match.group(1) if match else None
+# Maximum number of content slides built from a transcript; longer transcripts
+# get several paragraphs per slide, and 0 gives every paragraph its own slide
+MAX_CONTENT_SLIDES = int(os.environ.get("MAX_CONTENT_SLIDES", "8"))
+# Bullet points on each content slide
+BULLETS_PER_SLIDE = 5
 
-def get_video_info(youtube_url):
-    """Get basic information about a YouTube video."""
-    try:
-        yt = YouTube(youtube_url)
-        return {
-            "title": yt.title,
-            "author": yt.author,
-            "description": yt.description,
-            "length_seconds": yt.length,
-            "views": yt.views,
-            "thumbnail_url": yt.thumbnail_url
-        }
-    except Exception as e:
-        logging.error(f"Error getting video info: {str(e)}")
-        return {
-            "title": "Video information unavailable",
-            "thumbnail_url": None
-        }
+def get_video_transcript_source(video_id):
+    """
+    Get the transcript of a YouTube video for segmentation.
+    
+    Returns:
+        list or str: The transcript entries, or placeholder text when no
+        transcript is available
+    """
+    if not transcript_store.get_api():
+        logging.error("YouTubeTranscriptApi not available")
+        return TRANSCRIPT_API_UNAVAILABLE
+    
+    transcript_list = transcript_store.get_transcript_entries(video_id)
+    if transcript_list is None:
+        return TRANSCRIPT_MISSING
+    
+    return transcript_list
 
 def get_video_transcript(video_id):
     """Get the transcript of a YouTube video."""
-    if not YouTubeTranscriptApi:
-        logging.error("YouTubeTranscriptApi not available")
-        return "Transcript not available. Using placeholder data for demonstration."
+    transcript = get_video_transcript_source(video_id)
+    if isinstance(transcript, str):
+        return transcript
+    return transcript_segmenter.join_entries(transcript)[0]
+
+def _iter_paragraph_runs(paragraphs, per_slide):
+    """
+    Group paragraphs into runs of per_slide, one run per slide.
+    
+    Yields (bullet points, first segment, last segment) for each run. The
+    bullet points come from paragraphs spread evenly across the run, so only
+    those paragraphs' bullets are ever split out.
+    """
+    sampled = min(BULLETS_PER_SLIDE, per_slide)
+    picks = {j * per_slide // sampled for j in range(sampled)}
+    bullets_each = -(-BULLETS_PER_SLIDE // sampled)
+    
+    bullet_points = first = last = None
+    for i, (source, paragraph) in enumerate(paragraphs):
+        position = i % per_slide
+        if position == 0:
+            if first is not None:
+                yield bullet_points[:BULLETS_PER_SLIDE], first, last
+            bullet_points, first = [], paragraph.segment
+        if position in picks:
+            bullet_points.extend(bullet.text(source) for bullet in paragraph.bullets[:bullets_each])
+        last = paragraph.segment
+    if first is not None:
+        yield bullet_points[:BULLETS_PER_SLIDE], first, last
+
+def _iter_content_slides(transcript):
+    """
+    Yield content slides from a transcript as its paragraphs are segmented.
     
+    The slides cover the whole transcript. When it has more paragraphs than
+    MAX_CONTENT_SLIDES, each slide covers a run of consecutive paragraphs.
+    """
+    if isinstance(transcript, str):
+        length = len(transcript)
+        paragraphs = ((transcript, paragraph) for paragraph in transcript_segmenter.iter_paragraphs(transcript))
+    else:
+        length = transcript_segmenter.transcript_length(transcript)
+        # Entries are joined a window at a time, never into one string
+        paragraphs = transcript_segmenter.iter_entry_paragraphs(transcript)
+    
+    per_slide = 1
+    if MAX_CONTENT_SLIDES > 0:
+        per_slide = -(-transcript_segmenter.max_paragraphs(length) // MAX_CONTENT_SLIDES)
+    
+    # Segmentation time, excluding the time the consumer spends on each slide
+    elapsed = 0.0
+    started = time.perf_counter()
     try:
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-        full_transcript = ' '.join([entry['text'] for entry in transcript_list])
-        return full_transcript
-    except Exception as e:
-        logging.error(f"Error getting transcript: {str(e)}")
-        return "No transcript available for this video. Using placeholder data for demonstration."
+        for i, (bullet_points, first, last) in enumerate(_iter_paragraph_runs(paragraphs, per_slide)):
+            if not bullet_points:
+                continue
+            
+            slide = {
+                "title": f"Point {i+1}",
+                "content": bullet_points,
+                "image_description": f"Visual representing content from slide {i+1}",
+                "image_url": "https://placehold.co/600x400?text=Slide+Image"
+            }
+            if first.start_time is not None:
+                slide["start_time"] = first.start_time
+                slide["end_time"] = last.end_time
+            elapsed += time.perf_counter() - started
+            started = None
+            yield slide
+            started = time.perf_counter()
+    finally:
+        if started is not None:
+            elapsed += time.perf_counter() - started
+        metrics.record_stage('video', 'segment', elapsed)
 
-def generate_slides_from_transcript(video_url, api_key=None):
+def iter_presentation_events(video_url):
     """
-    Generate slides from a YouTube video transcript.
+    Generate a presentation from a YouTube video transcript incrementally.
+    
+    Same as _iter_presentation_events, with images pointed at the local
+    image proxy so viewers never fetch them from third parties.
+    """
+    for event in _iter_presentation_events(video_url):
+        if event["event"] == "slide":
+            image_proxy.rewrite_slide(event["slide"])
+        elif event.get("video_metadata", {}).get("thumbnail_url"):
+            event["video_metadata"]["thumbnail_url"] = image_proxy.proxy_url(event["video_metadata"]["thumbnail_url"])
+        yield event
+
+def _iter_presentation_events(video_url):
+    """
+    Generate a presentation from a YouTube video transcript incrementally.
+    
+    Yields events as soon as the data behind them is available, so callers
+    can show the title slide while the transcript is still being fetched:
+    
+        {"event": "start", "title": ..., "video_metadata": {...}}
+        {"event": "slide", "index": n, "slide": {...}}  (one per slide)
+        {"event": "end", "title": ..., "video_metadata": {...}}
     
     Args:
         video_url (str): URL of the YouTube video
-        api_key (str, optional): OpenAI API key (not used in this implementation)
-    
-    Returns:
-        dict: Presentation data with slides
     """
-    # Get video ID and info
+    # Validate the URL before spending any upstream calls on it
     video_id = extract_video_id(video_url)
-    video_info = get_video_info(video_url)
     
     if not video_id:
         logging.error("Invalid YouTube URL")
-        return {
-            "title": "Error Processing Video",
-            "slides": [
-                {
-                    "title": "Invalid YouTube URL",
-                    "content": ["The provided URL is not a valid YouTube video URL."],
-                    "image_description": "Error icon"
-                }
-            ]
+        yield {"event": "start", "title": "Error Processing Video"}
+        yield {"event": "slide", "index": 0, "slide": {
+            "title": "Invalid YouTube URL",
+            "content": ["The provided URL is not a valid YouTube video URL."],
+            "image_description": "Error icon"
+        }}
+        yield {"event": "end", "title": "Error Processing Video"}
+        return
+    
+    # Metadata and transcript are independent, so fetch them concurrently
+    deadline = fetch_pool.Deadline()
+    info_future = fetch_pool.submit(get_video_info, video_url)
+    transcript_future = fetch_pool.submit(get_video_transcript_source, video_id)
+    try:
+        video_info = fetch_pool.wait_for(info_future, deadline.remaining(),
+                                         dict(UNAVAILABLE_INFO), "video metadata")
+        
+        title = video_info.get("title", "Presentation from YouTube")
+        thumbnail_url = video_info.get("thumbnail_url", f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
+        video_metadata = {
+            "title": video_info.get("title", ""),
+            "author": video_info.get("author", ""),
+            "url": video_url,
+            "thumbnail_url": thumbnail_url
         }
+        yield {"event": "start", "title": title, "video_metadata": dict(video_metadata)}
+        
+        # The title slide only needs metadata; send it before waiting on the transcript
+        slide_count = 0
+        yield {"event": "slide", "index": slide_count, "slide": {
+            "title": video_info.get("title", "Presentation"),
+            "content": [
+                f"by {video_info.get('author', 'Unknown author')}",
+                "Generated from YouTube transcript"
+            ],
+            "image_description": "Title slide with video thumbnail",
+            "image_url": thumbnail_url
+        }}
+        slide_count += 1
+        
+        transcript = fetch_pool.wait_for(transcript_future, deadline.remaining(),
+                                         TRANSCRIPT_MISSING, "video transcript")
+    finally:
+        fetch_pool.cancel(info_future, transcript_future)
+    
+    video_metadata["has_transcript"] = bool(transcript) and transcript not in (TRANSCRIPT_API_UNAVAILABLE, TRANSCRIPT_MISSING)
     
-    # Get transcript
-    transcript = get_video_transcript(video_id)
     if not transcript:
         logging.warning("No transcript available, using video info to create basic slides")
-        # Create basic slides from video info
-        return {
-            "title": video_info.get("title", "Video Presentation"),
-            "slides": [
-                {
-                    "title": video_info.get("title", "Video Title"),
-                    "content": [
-                        f"By: {video_info.get('author', 'Unknown')}",
-                        "Generated automatically from video metadata"
-                    ],
-                    "image_description": "Title slide with video thumbnail",
-                    "image_url": video_info.get("thumbnail_url", f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
-                },
-                {
-                    "title": "About This Video",
-                    "content": [
-                        "No transcript was available for this video.",
-                        f"Duration: {video_info.get('length_seconds', 0)} seconds",
-                        f"Views: {video_info.get('views', 'Unknown')}"
-                    ],
-                    "image_description": "Information slide",
-                    "image_url": "https://placehold.co/600x400?text=Video+Info"
-                }
-            ]
-        }
-    
-    # Process transcript locally to generate a basic presentation
-    slides = []
+        yield {"event": "slide", "index": slide_count, "slide": {
+            "title": "About This Video",
+            "content": [
+                "No transcript was available for this video.",
+                f"Duration: {video_info.get('length_seconds', 0)} seconds",
+                f"Views: {video_info.get('views', 'Unknown')}"
+            ],
+            "image_description": "Information slide",
+            "image_url": "https://placehold.co/600x400?text=Video+Info"
+        }}
+        yield {"event": "end", "title": title, "video_metadata": video_metadata}
+        return
     
-    # Add title slide
-    slides.append({
-        "title": video_info.get("title", "Presentation"),
-        "content": [
-            f"by {video_info.get('author', 'Unknown author')}",
-            "Generated from YouTube transcript"
-        ],
-        "image_description": "Title slide with video thumbnail",
-        "image_url": video_info.get("thumbnail_url", f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
-    })
-    
-    # Simple transcript processing - split by paragraphs or length
-    paragraphs = []
-    current_paragraph = ""
-    
-    # Break transcript into logical paragraphs
-    for sentence in transcript.split('. '):
-        current_paragraph += sentence + '. '
-        if len(current_paragraph) > 500:  # Create a new paragraph after ~500 chars
-            paragraphs.append(current_paragraph.strip())
-            current_paragraph = ""
-    
-    if current_paragraph:  # Add the last paragraph if not empty
-        paragraphs.append(current_paragraph.strip())
-    
-    # Create content slides - one per paragraph
-    for i, paragraph in enumerate(paragraphs[:8]):  # Limit to 8 content slides
-        # Create bullet points from paragraph
-        bullet_points = []
-        sentences = paragraph.split('. ')
-        
-        for j in range(0, len(sentences), 2):
-            combined = '. '.join([s for s in sentences[j:j+2] if s])
-            if combined:
-                bullet_points.append(combined)
-        
-        # Add slide
-        if bullet_points:
-            slides.append({
-                "title": f"Point {i+1}",
-                "content": bullet_points[:5],  # Limit to 5 bullet points per slide
-                "image_description": f"Visual representing content from slide {i+1}",
-                "image_url": "https://placehold.co/600x400?text=Slide+Image"
-            })
+    # Process transcript locally, sending each content slide as it is built
+    for slide in _iter_content_slides(transcript):
+        yield {"event": "slide", "index": slide_count, "slide": slide}
+        slide_count += 1
     
     # Add conclusion slide
-    slides.append({
+    yield {"event": "slide", "index": slide_count, "slide": {
         "title": "Conclusion",
         "content": [
             "Thank you for watching!",
@@ -169,19 +225,44 @@ def generate_slides_from_transcript(video_url, api_key=None):
         ],
         "image_description": "Conclusion slide with thank you message",
         "image_url": "https://placehold.co/600x400?text=Thank+You"
-    })
+    }}
+    yield {"event": "end", "title": title, "video_metadata": video_metadata}
+
+def presentation_events_from_dict(presentation):
+    """Replay a finished presentation dict as the events iter_presentation_events yields."""
+    start = {"event": "start", "title": presentation.get("title")}
+    end = {"event": "end", "title": presentation.get("title")}
+    if "video_metadata" in presentation:
+        start["video_metadata"] = presentation["video_metadata"]
+        end["video_metadata"] = presentation["video_metadata"]
+    yield start
+    for index, slide in enumerate(presentation.get("slides", [])):
+        yield {"event": "slide", "index": index, "slide": slide}
+    yield end
+
+def add_presentation_event(presentation, event):
+    """Add an event from iter_presentation_events to the presentation dict being built."""
+    if event["event"] == "slide":
+        presentation["slides"].append(event["slide"])
+    elif event["event"] == "end":
+        presentation["title"] = event["title"]
+        if "video_metadata" in event:
+            presentation["video_metadata"] = event["video_metadata"]
+
+def generate_slides_from_transcript(video_url, api_key=None):
+    """
+    Generate slides from a YouTube video transcript.
     
-    # Create final presentation
-    presentation = {
-        "title": video_info.get("title", "Presentation from YouTube"),
-        "slides": slides,
-        "video_metadata": {
-            "title": video_info.get("title", ""),
-            "author": video_info.get("author", ""),
-            "url": video_url,
-            "thumbnail_url": video_info.get("thumbnail_url", f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
-        }
-    }
+    Args:
+        video_url (str): URL of the YouTube video
+        api_key (str, optional): OpenAI API key (not used in this implementation)
+    
+    Returns:
+        dict: Presentation data with slides
+    """
+    presentation = {"slides": []}
+    for event in iter_presentation_events(video_url):
+        add_presentation_event(presentation, event)
     
     return presentation
 
@@ -196,6 +277,6 @@ def process_video_transcript(video_url, api_key=None):
     Returns:
         dict: Presentation data with slides
     """
-    logging.info(f"Processing video transcript: {video_url}")
+    logging.info("Processing video transcript: %s", video_url)
     presentation_data = generate_slides_from_transcript(video_url, api_key)
     return presentation_data
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Bring an existing database up to date with models.py.
+
+Usage:
+    python upgrade_db.py
+
+Run before deploying a new version, and before starting its web server or
+workers. db.create_all() only creates missing tables; this also adds the
+columns and indexes later versions added to existing tables and drops the
+NOT NULL constraints they relaxed. Every step is idempotent, so running it
+again, or on a freshly created database, changes nothing. Only PostgreSQL
+databases are altered.
+"""
+import logging
+
+
+def upgrade(db):
+    """Create missing tables, then bring existing ones up to date."""
+    import blob_store
+    import dashboard
+    import job_queue
+    import migrate_json_columns
+
+    # Creates the tables new columns refer to, such as slide_batches
+    db.create_all()
+    steps = (job_queue.ensure_columns, dashboard.ensure_indexes, migrate_json_columns.ensure_columns,
+             blob_store.ensure_columns)
+    for step in steps:
+        logging.info("Running %s.%s", step.__module__, step.__name__)
+        step(db)
+
+
+def main():
+    from app import app, db
+    import models  # noqa: F401  registers the tables
+
+    with app.app_context():
+        upgrade(db)
+    print("database is up to date")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,225 @@
+"""
+Cached YouTube video metadata lookups.
+
+Every metadata lookup in the app goes through get_video_info, which is backed
+by two cache tiers keyed on the canonical video ID:
+
+1. An in-process LRU with a TTL, so repeat lookups in a worker are free.
+2. The video_metadata table, shared by every gunicorn worker and node, so the
+   watch page is scraped at most once per TTL across the deployment.
+
+Failed scrapes are never cached.
+"""
+import os
+import re
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import metrics
+
+# How long scraped metadata stays valid, in seconds
+METADATA_TTL = int(os.environ.get("VIDEO_METADATA_TTL", "86400"))
+# Maximum number of videos held in each worker's in-process cache
+LOCAL_CACHE_SIZE = int(os.environ.get("VIDEO_METADATA_CACHE_SIZE", "1024"))
+
+UNAVAILABLE_INFO = {
+    "title": "Video information unavailable",
+    "thumbnail_url": None
+}
+
+
+def extract_video_id(youtube_url):
+    """Extract the YouTube video ID from a URL."""
+    # Regular expression to match YouTube video IDs
+    youtube_regex = r'(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'
+    match = re.search(youtube_regex, youtube_url)
+    return match.group(1) if match else None
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after a fixed TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry if full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_local_cache = TTLCache(LOCAL_CACHE_SIZE, METADATA_TTL)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "local_hits": 0,
+    "shared_hits": 0,
+    "misses": 0,
+    "errors": 0,
+}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+    metrics.count_cache('video_metadata', name)
+
+
+def get_cache_stats():
+    """Return hit/miss counters for this worker process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+    stats["lookups"] = lookups
+    stats["hit_rate"] = round((stats["local_hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+    stats["local_size"] = len(_local_cache)
+    return stats
+
+
+def _shared_cache_available():
+    try:
+        from flask import has_app_context
+        return has_app_context()
+    except ImportError:
+        return False
+
+
+def _load_shared(video_id):
+    """Read fresh metadata from the shared table, or None."""
+    if not _shared_cache_available():
+        return None
+
+    from sqlalchemy import select
+    from app import db
+    from models import VideoMetadata
+
+    table = VideoMetadata.__table__
+    try:
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.info, table.c.fetched_at).where(table.c.video_id == video_id)
+            ).first()
+    except Exception as e:
+        logging.error("Error reading shared video metadata cache: %s", e)
+        return None
+
+    if row is None or row.fetched_at < datetime.now() - timedelta(seconds=METADATA_TTL):
+        return None
+    return row.info
+
+
+def _store_shared(video_id, info):
+    """Write metadata to the shared table, replacing any stale row."""
+    if not _shared_cache_available():
+        return
+
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from models import VideoMetadata
+
+    table = VideoMetadata.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.video_id == video_id))
+            conn.execute(table.insert().values(video_id=video_id, info=info, fetched_at=datetime.now()))
+    except IntegrityError:
+        # Another worker stored the same video concurrently
+        pass
+    except Exception as e:
+        logging.error("Error writing shared video metadata cache: %s", e)
+
+
+def _fetch_video_info(video_id):
+    """Scrape metadata for a video from YouTube."""
+    from pytube import YouTube
+
+    yt = YouTube(f"https://www.youtube.com/watch?v={video_id}")
+    return {
+        "title": yt.title,
+        "author": yt.author,
+        "description": yt.description,
+        "length_seconds": yt.length,
+        "views": yt.views,
+        "thumbnail_url": yt.thumbnail_url
+    }
+
+
+@metrics.stage('video', 'metadata')
+def get_video_info(youtube_url):
+    """Get basic information about a YouTube video."""
+    video_id = extract_video_id(youtube_url)
+    if not video_id:
+        logging.error("Error getting video info: invalid YouTube URL %s", youtube_url)
+        return dict(UNAVAILABLE_INFO)
+
+    info = _local_cache.get(video_id)
+    if info is not None:
+        _count("local_hits")
+        return dict(info)
+
+    info = _load_shared(video_id)
+    if info is not None:
+        _count("shared_hits")
+        _local_cache.set(video_id, info)
+        return dict(info)
+
+    _count("misses")
+    try:
+        info = _fetch_video_info(video_id)
+    except Exception as e:
+        _count("errors")
+        metrics.count_upstream_error('youtube_metadata')
+        logging.error("Error getting video info: %s", e)
+        return dict(UNAVAILABLE_INFO)
+
+    _local_cache.set(video_id, info)
+    _store_shared(video_id, info)
+    return dict(info)
+
+
+def invalidate(video_id):
+    """Drop a video from both cache tiers."""
+    _local_cache.delete(video_id)
+    if not _shared_cache_available():
+        return
+
+    from app import db
+    from models import VideoMetadata
+
+    table = VideoMetadata.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.video_id == video_id))
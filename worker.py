@@ -0,0 +1,63 @@
+"""
+Entry point for slide deck worker processes.
+
+Usage:
+    python worker.py [--processes N]
+
+Run as many of these as needed, on as many nodes as needed; they coordinate
+through the database (see job_queue.py).
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+
+
+def _worker_main(stop_event):
+    # Each process builds its own app and connection pool
+    from app import create_app
+    import job_queue
+    import log_pipeline
+
+    import metrics
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    app = create_app()
+    try:
+        with app.app_context():
+            job_queue.run_worker(stop_event)
+    finally:
+        # Multiprocessing children exit without running atexit handlers
+        metrics.flush()
+        log_pipeline.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued slide decks")
+    parser.add_argument("--processes", type=int,
+                        default=int(os.environ.get("WORKER_PROCESSES", "2")),
+                        help="number of worker processes to run")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    processes = [ctx.Process(target=_worker_main, args=(stop_event,), name=f"slide-worker-{i}")
+                 for i in range(max(1, args.processes))]
+
+    def shutdown(signum, frame):
+        logging.info("Shutting down workers")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,17 @@
+"""
+WSGI entry point that builds the app with create_app and times its startup.
+
+    gunicorn -c gunicorn.conf.py        # uses wsgi:app
+
+Every module imported on the way is timed (see startup.py), and the
+breakdown is logged once the app is ready.
+"""
+import startup
+
+with startup.record_imports():
+    with startup.timed('import app'):
+        import app as app_module
+    with startup.timed('create_app'):
+        app = app_module.create_app()
+
+startup.log_report()
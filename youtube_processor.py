@@ -1,33 +1,9 @@
 import logging
 import re
 import json
-from pytube import YouTube
-
-def extract_video_id(youtube_url):
-    """Extract the YouTube video ID from a URL."""
-    # Regular expression to match YouTube video IDs
-    youtube_regex = r'(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'
-    match = re.search(youtube_regex, youtube_url)
-    return match.group(1) if match else None
-
-def get_video_info(youtube_url):
-    """Get basic information about a YouTube video."""
-    try:
-        yt = YouTube(youtube_url)
-        return {
-            "title": yt.title,
-            "author": yt.author,
-            "description": yt.description,
-            "length_seconds": yt.length,
-            "views": yt.views,
-            "thumbnail_url": yt.thumbnail_url
-        }
-    except Exception as e:
-        logging.error(f"Error getting video info: {str(e)}")
-        return {
-            "title": "Video information unavailable",
-            "thumbnail_url": None
-        }
+from video_metadata import UNAVAILABLE_INFO, extract_video_id, get_video_info
+import fetch_pool
+import image_proxy
 
 def generate_presentation_from_video(video_url):
     """
@@ -49,8 +25,10 @@ def generate_presentation_from_video(video_url):
             ]
         }
     
-    # Get video info
-    video_info = get_video_info(video_url)
+    # Get video info on the shared upstream pool so a hung scrape can't pin this worker
+    info_future = fetch_pool.submit(get_video_info, video_url)
+    video_info = fetch_pool.wait_for(info_future, fetch_pool.FETCH_TIMEOUT,
+                                     dict(UNAVAILABLE_INFO), "video metadata")
     
     # Create slides array
     slides = []
@@ -145,10 +123,10 @@ def process_video(video_url, api_key=None):
         dict: Presentation data with slides
     """
     try:
-        # Generate presentation from video metadata
-        return generate_presentation_from_video(video_url)
+        # Generate presentation from video metadata, with images served by our proxy
+        return image_proxy.rewrite_presentation(generate_presentation_from_video(video_url))
     except Exception as e:
-        logging.error(f"Error processing video: {str(e)}")
+        logging.error("Error processing video: %s", e)
         return {
             "title": "Error Processing Video",
             "slides": [